@@ -21,25 +21,40 @@
 #   POST http://localhost:8008/api/reconstruct/arabic
 #   POST http://localhost:8008/api/visualize-lines
 #   GET  http://localhost:8008/api/download?file=input_text_removed.pdf
+#   POST http://localhost:8008/api/tm/import
+#   GET  http://localhost:8008/api/tm/export?format=tmx
 
 import os
 import io
 import json
+import shutil
+import tempfile
 import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from typing import Optional
 
 from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Query
 from fastapi.responses import FileResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.background import BackgroundTask
 from pydantic import BaseModel, Field
 
 # === Your existing modules ===
 from text_extractor import extract_pdf_to_json
 from text_remover import remove_text
-from pdf_reconstructor import reconstruct_pdf
+from pdf_reconstructor import reconstruct_pdf, process_pool
 from ar_pdf_reconstructor import reconstruct_pdf_from_line_db
+from fitz_reconstructor import reconstruct_pdf_fitz, reconstruct_pdf_from_line_db_fitz
 from countour_mapper import PDFLineExtractor
+from translation_backends import BACKENDS, get_backend
+from translation_batcher import get_batching_backend
+from translation_memory import get_translation_memory
+from tm_io import import_file, export_file
+from glossary import load_glossary
+from entity_protector import get_entity_protector
+from language_id import get_language_identifier
+from font_registry import get_font_registry
 
 # ---------- Config ----------
 APP_TITLE = "PDF Text Replacement API"
@@ -52,6 +67,26 @@ AR_LINE_DB_NAME = "ar_line_db.json"
 EN_OUTPUT_PDF = "english_reconstructed_input.pdf"
 AR_OUTPUT_PDF = "arabic_reconstructed_input.pdf"
 VISUALIZED_PDF = "input_visualized.pdf"
+TRANSLATION_MEMORY_NAME = "translation_memory.sqlite"
+# Coalesce model calls from concurrent jobs into shared batches: auto (backends that translate a batch in
+# one engine call, i.e. ctranslate2 and http) | 1 (every backend) | 0
+CROSS_JOB_BATCHING = os.environ.get("TRANSLATION_CROSS_JOB_BATCHING", "auto")
+# Reuse earlier translations of identical or number-only-different lines unless disabled
+USE_TRANSLATION_MEMORY = os.environ.get("TRANSLATION_MEMORY", "1") == "1"
+# Keep person/organization names untranslated (needs spaCy and ENTITY_MODEL installed locally)
+PROTECT_ENTITIES = os.environ.get("ENTITY_PROTECTION", "1") == "1"
+# Route target-language, numeric and confidently non-English lines past the model (opt-in)
+LANGUAGE_ROUTING = os.environ.get("LANGUAGE_ROUTING", "0") == "1"
+# Worker processes for reconstructing fan-out outputs (reportlab/PyPDF2 are pure Python, so threads would serialize)
+RECONSTRUCT_WORKERS = int(os.environ.get("RECONSTRUCT_WORKERS", str(min(4, os.cpu_count() or 1))))
+LANGUAGE_ALIASES = {"arabic": "ar", "english": "en"}
+# reportlab builds an overlay and merges it; pymupdf writes text onto the text-removed PDF in one pass
+RECONSTRUCTION_ENGINES = {
+    "reportlab": (reconstruct_pdf, reconstruct_pdf_from_line_db),
+    "pymupdf": (reconstruct_pdf_fitz, reconstruct_pdf_from_line_db_fitz),
+}
+RECONSTRUCTION_ENGINE = os.environ.get("RECONSTRUCTION_ENGINE", "reportlab")
+reconstruct_pdf, reconstruct_pdf_from_line_db = RECONSTRUCTION_ENGINES[RECONSTRUCTION_ENGINE]
 
 os.makedirs(STORAGE_DIR, exist_ok=True)
 
@@ -66,6 +101,51 @@ def _safe_name(name: str) -> str:
     return os.path.basename((name or "").strip())
 
 
+def _translation_backend(name: Optional[str] = None, batching: Optional[bool] = None):
+    """Shared backend instance, behind the process-wide batcher when cross-job batching is on."""
+    backend = get_backend(name)
+    if batching is None:
+        # Per-text engines (argos, google) would only add the collector's wait to every line
+        batching = backend.native_batching if CROSS_JOB_BATCHING == "auto" else CROSS_JOB_BATCHING == "1"
+    if batching:
+        return get_batching_backend(backend)
+    return backend
+
+
+def _translation_memory(enabled: Optional[bool] = None):
+    """Shared translation memory in storage, or None when disabled."""
+    if USE_TRANSLATION_MEMORY if enabled is None else enabled:
+        return get_translation_memory(_p(TRANSLATION_MEMORY_NAME))
+    return None
+
+
+def _entity_protector(enabled: Optional[bool] = None):
+    """Shared spaCy entity stage, or None when disabled."""
+    if PROTECT_ENTITIES if enabled is None else enabled:
+        return get_entity_protector()
+    return None
+
+
+def _language_identifier(enabled: Optional[bool] = None, target_lang: str = "ar"):
+    """Shared language-ID router for en->target_lang, or None when disabled."""
+    if LANGUAGE_ROUTING if enabled is None else enabled:
+        return get_language_identifier("en", target_lang)
+    return None
+
+
+def _parse_languages(languages: str):
+    """'ar, fr,English' -> ['ar', 'fr', 'en'] (deduplicated, order kept)."""
+    codes = [LANGUAGE_ALIASES.get(code.strip().lower(), code.strip().lower()) for code in languages.split(",")]
+    return list(dict.fromkeys(code for code in codes if code))
+
+
+def _output_names(language: str):
+    """(line db, reconstructed PDF) filenames for a target language; Arabic keeps its historic names."""
+    if language == "ar":
+        return AR_LINE_DB_NAME, AR_OUTPUT_PDF
+    return f"{language}_line_db.json", f"{language}_reconstructed_input.pdf"
+
+
 def _json_ok(**payload):
     # Uniform JSON envelope
     return JSONResponse({"ok": True, **payload})
@@ -89,6 +169,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+def _warm_up_models():
+    # Load the entity model off the request path; a missing model only disables the stage
+    if PROTECT_ENTITIES:
+        get_entity_protector().warm_up()
+    # Parse the reconstruction fonts once, before the first request needs them
+    get_font_registry().warm_up(("Arial", "Arabic"), background=True)
+
 # put this anywhere after app = FastAPI(...)
 @app.get("/api/_routes")
 def _routes():
@@ -118,8 +206,19 @@ class ExtractLinesReq(BaseModel):
 class TranslateArabicReq(BaseModel):
     line_db_input: str = Field(default=LINE_DB_NAME)
     ar_line_db_output: str = Field(default=AR_LINE_DB_NAME)
-    max_workers: int = Field(default=2, ge=1, le=8)
-    timeout_seconds: int = Field(default=120, ge=30, le=600)
+    max_workers: int = Field(default=2, ge=1, le=8, description="Worker count, or the starting point in adaptive mode")
+    adaptive_concurrency: bool = Field(default=False, description="Let an AIMD controller grow/shrink workers from latency, CPU and errors")
+    max_workers_limit: Optional[int] = Field(default=None, ge=1, le=256, description="Adaptive mode ceiling; defaults to the backend's concurrency limit")
+    timeout_seconds: int = Field(default=120, ge=30, le=600, description="Per-line translation deadline")
+    hedge_percentile: float = Field(default=95, ge=50, le=99.9, description="Re-dispatch lines slower than this latency percentile")
+    hedge_backend: Optional[str] = Field(default=None, description="Backend for re-dispatched stragglers; defaults to the primary backend")
+    paragraph_mode: bool = Field(default=False, description="Translate whole paragraphs and redistribute over their lines")
+    cross_job_batching: Optional[bool] = Field(default=None, description="Share model batches with concurrent jobs; defaults to TRANSLATION_CROSS_JOB_BATCHING")
+    backend: Optional[str] = Field(default=None, description=f"Translation engine: one of {sorted(BACKENDS)}; defaults to TRANSLATION_BACKEND")
+    translation_memory: Optional[bool] = Field(default=None, description="Reuse stored translations of identical or near-identical lines; defaults to TRANSLATION_MEMORY")
+    glossary: Optional[str] = Field(default=None, description="Glossary file in storage (CSV with en/ar columns, or JSON) whose terms get their approved translations")
+    protect_entities: Optional[bool] = Field(default=None, description="Keep person and organization names untranslated; defaults to ENTITY_PROTECTION")
+    language_routing: Optional[bool] = Field(default=None, description="Skip lines that are already Arabic, have no letters or aren't English; defaults to LANGUAGE_ROUTING")
 
 class ReconstructArabicReq(BaseModel):
     ar_line_db_input: str = Field(default=AR_LINE_DB_NAME)
@@ -152,17 +251,26 @@ def _public_file_info(name: str):
 # ---------- Routes ----------
 
 @app.post("/api/workflow")
-def api_workflow(language: str = Form("en")):
+def api_workflow(language: str = Form("en"), backend: Optional[str] = Form(None),
+                 languages: Optional[str] = Form(None)):
     """
-    Unified workflow that handles both English and Arabic processing in one call
+    Unified workflow that handles both English and Arabic processing in one call.
+    With `languages` (comma-separated, e.g. "ar,fr,de") every language is produced in one fan-out run.
     """
     try:
+        if backend and backend.lower() not in BACKENDS:
+            return _json_err("Unknown translation backend", detail=f"Available: {sorted(BACKENDS)}", status_code=400)
+        if languages:
+            return _fan_out_workflow(_parse_languages(languages), backend)
+
         # Common steps
         remove_text(_p(INPUT_PDF_NAME), _p(TEXT_REMOVED_NAME))
         
         if language.lower() in ["ar", "arabic"]:
             # Arabic workflow
-            extractor = PDFLineExtractor()
+            extractor = PDFLineExtractor(backend=_translation_backend(backend), translation_memory=_translation_memory(),
+                                         entity_protector=_entity_protector(),
+                                         language_identifier=_language_identifier())
             line_db = extractor.extract_lines_from_pdf(_p(INPUT_PDF_NAME), _p(LINE_DB_NAME))
             ar_line_db = extractor.translate_to_arabic(line_db, _p(AR_LINE_DB_NAME))
             reconstruct_pdf_from_line_db(_p(AR_LINE_DB_NAME), _p(TEXT_REMOVED_NAME), _p(AR_OUTPUT_PDF))
@@ -181,6 +289,76 @@ def api_workflow(language: str = Form("en")):
     except Exception as e:
         return _json_err("Workflow failed", detail=str(e), status_code=500)
 
+def _fan_out_workflow(languages, backend: Optional[str] = None):
+    """
+    One text removal and one line extraction shared by all languages; translations run
+    concurrently (one extractor per language over the shared backend and its batcher) and
+    each output is reconstructed in a worker process as soon as its translation lands.
+    """
+    if not languages:
+        return _json_err("No languages given", status_code=400)
+    started = datetime.now()
+    remove_text(_p(INPUT_PDF_NAME), _p(TEXT_REMOVED_NAME))
+
+    targets = [language for language in languages if language != "en"]
+    shared_backend = _translation_backend(backend)
+    memory, protector = _translation_memory(), _entity_protector()
+    line_db = None
+    if targets:
+        line_db = PDFLineExtractor(backend=shared_backend).extract_lines_from_pdf(_p(INPUT_PDF_NAME), _p(LINE_DB_NAME))
+
+    def translate(language):
+        line_db_name, _ = _output_names(language)
+        extractor = PDFLineExtractor(backend=shared_backend, translation_memory=memory, entity_protector=protector,
+                                     language_identifier=_language_identifier(target_lang=language),
+                                     target_lang=language)
+        if not extractor.translation_installed:
+            raise RuntimeError(f"Backend cannot translate en->{language}")
+        extractor.translate_lines(line_db, _p(line_db_name))
+        return line_db_name
+
+    outputs, errors = {}, {}
+    with ThreadPoolExecutor(max_workers=max(1, len(languages))) as translators, \
+            process_pool(max(1, min(RECONSTRUCT_WORKERS, len(languages)))) as reconstructors:
+        translations = {translators.submit(translate, language): language for language in targets}
+        if "en" in languages:
+            translations[translators.submit(extract_pdf_to_json, _p(INPUT_PDF_NAME), _p(EN_JSON_NAME))] = "en"
+
+        reconstructions = {}
+        for future in as_completed(translations):
+            language = translations[future]
+            try:
+                future.result()
+            except Exception as e:
+                errors[language] = str(e)
+                continue
+            if language == "en":
+                job = reconstructors.submit(reconstruct_pdf, _p(EN_JSON_NAME), _p(TEXT_REMOVED_NAME), _p(EN_OUTPUT_PDF))
+                reconstructions[job] = (language, EN_OUTPUT_PDF)
+            else:
+                line_db_name, output_name = _output_names(language)
+                job = reconstructors.submit(reconstruct_pdf_from_line_db, _p(line_db_name), _p(TEXT_REMOVED_NAME),
+                                            _p(output_name))
+                reconstructions[job] = (language, output_name)
+
+        for job in as_completed(reconstructions):
+            language, output_name = reconstructions[job]
+            try:
+                job.result()
+                outputs[language] = _public_file_info(output_name)
+            except Exception as e:
+                errors[language] = str(e)
+
+    if not outputs:
+        return _json_err("Workflow failed", detail=json.dumps(errors, ensure_ascii=False), status_code=500)
+    return _json_ok(
+        message=f"Workflow completed for {len(outputs)}/{len(languages)} languages",
+        languages=languages,
+        outputs={language: outputs[language] for language in languages if language in outputs},
+        errors=errors,
+        seconds=round((datetime.now() - started).total_seconds(), 2)
+    )
+
 @app.delete("/api/cleanup")
 def api_cleanup(keep_original: bool = Query(True)):
     """
@@ -391,15 +569,32 @@ def api_translate_arabic(req: TranslateArabicReq):
                 status_code=400
             )
 
+        for backend_name in (req.backend, req.hedge_backend):
+            if backend_name and backend_name.lower() not in BACKENDS:
+                return _json_err("Unknown translation backend", detail=f"Available: {sorted(BACKENDS)}", status_code=400)
+
+        glossary = load_glossary(_assert_file_exists(req.glossary)) if req.glossary else None
+
         print("🚀 Starting Arabic translation...")
-        extractor = PDFLineExtractor()
+        extractor = PDFLineExtractor(
+            backend=_translation_backend(req.backend, req.cross_job_batching),
+            hedge_backend=get_backend(req.hedge_backend) if req.hedge_backend else None,
+            translation_memory=_translation_memory(req.translation_memory),
+            glossary=glossary,
+            entity_protector=_entity_protector(req.protect_entities),
+            language_identifier=_language_identifier(req.language_routing)
+        )
         
         # Call the translate_to_arabic method from PDFLineExtractor
         ar_db = extractor.translate_to_arabic(
             line_db,
             output_json_path=_p(ar_out_name),
             max_workers=req.max_workers,
-            timeout_seconds=req.timeout_seconds
+            timeout_seconds=req.timeout_seconds,
+            paragraph_mode=req.paragraph_mode,
+            hedge_percentile=req.hedge_percentile,
+            adaptive_concurrency=req.adaptive_concurrency,
+            max_workers_limit=req.max_workers_limit
         )
         
         print("✅ Arabic translation completed successfully")
@@ -408,7 +603,7 @@ def api_translate_arabic(req: TranslateArabicReq):
         summary = {
             "sentences": len(ar_db.get("sentences", [])),
             "target_language": "ar",
-            "translation_service": "GoogleTranslator"
+            "translation_service": extractor.backend.service_name
         }
 
         # Add metadata from the original translation if available
@@ -545,7 +740,9 @@ def api_visualize_lines(req: VisualizeLinesReq):
         else:
             print("Character data format detected, extracting lines first...")
             extractor = PDFLineExtractor()
-            line_db = extractor.extract_lines_from_pdf(input_pdf_path, "temp_line_db.json")
+            # Per-request directory: concurrent visualizations never share the intermediate line DB
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                line_db = extractor.extract_lines_from_pdf(input_pdf_path, os.path.join(tmp_dir, "line_db.json"))
             print(f"Extracted {len(line_db.get('sentences', []))} lines from PDF")
         
         output_path = _p(_safe_name(req.visualized_pdf))
@@ -585,10 +782,6 @@ def api_visualize_lines(req: VisualizeLinesReq):
                 reconstruction_error = str(e)
                 print(f"❌ Auto Arabic reconstruction failed: {e}")
         
-        # Clean up temporary file if created
-        if os.path.exists("temp_line_db.json"):
-            os.remove("temp_line_db.json")
-        
         # Return response with reconstruction status
         response_data = {
             "message": "Visualization created",
@@ -608,14 +801,63 @@ def api_visualize_lines(req: VisualizeLinesReq):
         error_trace = traceback.format_exc()
         print(f"Visualization ERROR: {error_trace}")
         
-        if os.path.exists("temp_line_db.json"):
-            os.remove("temp_line_db.json")
-            
         return _json_err("Visualization failed", detail=f"{e}\n{error_trace}", status_code=500)
 
 
 
 
+@app.post("/api/tm/import")
+def api_tm_import(file: UploadFile = File(...),
+                  source_lang: str = Form(default="en"),
+                  target_lang: str = Form(default="ar")):
+    """
+    Pre-seed the translation memory from a TMX or CSV corpus
+    """
+    file_format = os.path.splitext(file.filename or "")[1].lstrip(".").lower()
+    if file_format not in ("tmx", "csv"):
+        return _json_err("Unsupported translation memory format", detail="Upload a .tmx or .csv file", status_code=400)
+    try:
+        # Spool to disk so large corpora are parsed as a stream rather than held in memory
+        with tempfile.NamedTemporaryFile(suffix=f".{file_format}", dir=STORAGE_DIR, delete=False) as tmp:
+            shutil.copyfileobj(file.file, tmp, 1 << 20)
+        try:
+            memory = get_translation_memory(_p(TRANSLATION_MEMORY_NAME))
+            started = datetime.now()
+            imported = import_file(memory, tmp.name, source_lang, target_lang, file_format)
+        finally:
+            os.remove(tmp.name)
+        return _json_ok(
+            message="Translation memory imported",
+            imported=imported,
+            segments=memory.count(source_lang, target_lang),
+            seconds=round((datetime.now() - started).total_seconds(), 2)
+        )
+    except Exception as e:
+        return _json_err("Translation memory import failed", detail=str(e), status_code=500)
+
+@app.get("/api/tm/export")
+def api_tm_export(format: str = Query("tmx", pattern="^(tmx|csv)$"),
+                  source_lang: str = Query("en"),
+                  target_lang: str = Query("ar")):
+    """
+    Download the translation memory for a language pair as TMX or CSV
+    """
+    try:
+        filename = f"translation_memory_{_safe_name(source_lang)}_{_safe_name(target_lang)}.{format}"
+        # Each export gets its own private file, so concurrent downloads never read one another's output
+        fd, export_path = tempfile.mkstemp(prefix=".export_", suffix=f"_{filename}", dir=STORAGE_DIR)
+        os.close(fd)
+        try:
+            export_file(get_translation_memory(_p(TRANSLATION_MEMORY_NAME)), export_path, source_lang, target_lang, format)
+        except Exception:
+            os.remove(export_path)
+            raise
+        return FileResponse(export_path, filename=filename, media_type="application/octet-stream",
+                            background=BackgroundTask(os.remove, export_path))
+    except Exception as e:
+        return _json_err("Translation memory export failed", detail=str(e), status_code=500)
+
+
 @app.get("/api/download")
 def api_download(file: str = Query(..., description="Filename in storage")):
     try:
@@ -1,6 +1,5 @@
 from reportlab.pdfgen import canvas
 from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.lib.colors import Color
 from reportlab.lib.utils import simpleSplit
 from PyPDF2 import PdfReader, PdfWriter
@@ -8,77 +7,25 @@ import io
 import os
 import json
 import re
+from functools import lru_cache
 import arabic_reshaper
 from bidi.algorithm import get_display
+from pdf_reconstructor import render_overlay, join_overlay, merge_pdf_layers, reconstruct_overlaid
+from font_registry import get_font_registry
+from text_layout import get_text_layout
 
-def register_arabic_fonts():
-    """Register Arabic fonts for text rendering"""
-    arabic_font_paths = [
-        'fonts/noto/NotoNaskhArabic-Bold.ttf',
-        'fonts/noto/NotoNaskhArabic-Regular.ttf',
-    ]
-    
-    # Register Regular variant
-    regular_registered = False
-    for font_path in arabic_font_paths:
-        if 'Bold' not in font_path and os.path.exists(font_path):
-            try:
-                pdfmetrics.registerFont(TTFont('Arabic-Regular', font_path))
-                print(f"Arabic Regular registered from: {font_path}")
-                regular_registered = True
-                break
-            except Exception as e:
-                print(f"Error registering Arabic Regular: {e}")
-    
-    # Register Bold variant
-    bold_registered = False
-    for font_path in arabic_font_paths:
-        if 'Bold' in font_path and os.path.exists(font_path):
-            try:
-                pdfmetrics.registerFont(TTFont('Arabic-Bold', font_path))
-                print(f"Arabic Bold registered from: {font_path}")
-                bold_registered = True
-                break
-            except Exception as e:
-                print(f"Error registering Arabic Bold: {e}")
-    
-    return regular_registered, bold_registered
-
-def get_arabic_font_variant(is_bold, regular_available, bold_available):
-    """Get appropriate Arabic font variant"""
-    if is_bold and bold_available:
-        return "Arabic-Bold"
-    elif regular_available:
-        return "Arabic-Regular"
-    else:
-        # Fallback to any available font
-        try:
-            if bold_available:
-                return "Arabic-Bold"
-            elif regular_available:
-                return "Arabic-Regular"
-            else:
-                return "Helvetica"
-        except:
-            return "Helvetica"
-
-def set_arabic_font_and_color(c, is_bold, font_size, regular_available, bold_available):
-    """Set Arabic font and color with proper variant"""
-    try:
-        font_variant = get_arabic_font_variant(is_bold, regular_available, bold_available)
-        c.setFont(font_variant, font_size)
-    except Exception as e:
-        print(f"Error setting Arabic font: {e}")
-        c.setFont("Helvetica", font_size)
-    
-    # Set text color to black
-    c.setFillColorRGB(0, 0, 0)
+# Shaped lines kept per process (repeated headers, labels and table cells are shaped once); 0 disables it
+SHAPING_CACHE_SIZE = int(os.environ.get("ARABIC_SHAPING_CACHE_SIZE", "16384"))
+ARABIC_LETTER = re.compile('[\u0600-\u06FF]')
 
 def process_arabic_text(text):
     """Process Arabic text for proper RTL rendering"""
-    if not text or not any('\u0600' <= c <= '\u06FF' for c in text):
+    if not text or not ARABIC_LETTER.search(text):
         return text  # Return as-is if not Arabic text
-    
+    return _shape_cached(text)
+
+def _shape(text):
+    """Reshape Arabic letters into their joined forms and reorder the line for display"""
     try:
         # Reshape Arabic text
         reshaped_text = arabic_reshaper.reshape(text)
@@ -89,16 +36,14 @@ def process_arabic_text(text):
         print(f"Error processing Arabic text: {e}")
         return text
 
-def create_text_overlay_from_line_db(json_path, overlay_pdf_path, base_pdf_path):
-    """Create text overlay PDF from line database JSON"""
+_shape_cached = lru_cache(maxsize=SHAPING_CACHE_SIZE)(_shape) if SHAPING_CACHE_SIZE > 0 else _shape
+
+def load_line_pages(json_path, base_pdf_path):
+    """Sentences of each base page, with the page's (width, height)"""
     with open(json_path, 'r', encoding='utf-8') as json_file:
         line_db = json.load(json_file)
     
     base_pdf = PdfReader(base_pdf_path)
-    regular_available, bold_available = register_arabic_fonts()
-    
-    overlay_packet = io.BytesIO()
-    c = canvas.Canvas(overlay_packet)
     
     # Group sentences by page
     sentences_by_page = {}
@@ -108,101 +53,60 @@ def create_text_overlay_from_line_db(json_path, overlay_pdf_path, base_pdf_path)
             sentences_by_page[page_num] = []
         sentences_by_page[page_num].append(sentence)
     
-    # Process each page
-    for page_num in range(len(base_pdf.pages)):
-        if page_num not in sentences_by_page:
-            # Create empty page if no sentences
-            base_page = base_pdf.pages[page_num]
-            page_width = float(base_page.mediabox[2])
-            page_height = float(base_page.mediabox[3])
-            c.setPageSize((page_width, page_height))
-            c.showPage()
-            continue
-            
-        base_page = base_pdf.pages[page_num]
-        page_width = float(base_page.mediabox[2])
-        page_height = float(base_page.mediabox[3])
-        
+    pages = [sentences_by_page.get(page_num, []) for page_num in range(len(base_pdf.pages))]
+    page_sizes = [(float(page.mediabox[2]), float(page.mediabox[3])) for page in base_pdf.pages]
+    return pages, page_sizes
+
+def create_text_overlay_from_line_db(json_path, overlay_pdf_path, base_pdf_path, standard_fonts=None, workers=None):
+    """Create text overlay PDF from line database JSON and return it in memory; also written to overlay_pdf_path unless None"""
+    pages, page_sizes = load_line_pages(json_path, base_pdf_path)
+    fragments = render_overlay(draw_line_pages, pages, page_sizes, workers, standard_fonts=standard_fonts)
+    return join_overlay(fragments, overlay_pdf_path)
+
+def draw_line_pages(pages, page_sizes, standard_fonts=None):
+    """Overlay PDF bytes for a range of pages, each given as its list of sentences"""
+    registry = get_font_registry()
+    layout = get_text_layout()
+    
+    def chain_of(sentence):
+        # Script runs in the first font that has their glyphs: standard-14 (no embedding) for
+        # Latin-script text, Noto Naskh for Arabic, other embedded families for anything else
+        return registry.chain("Arabic", sentence.get('bold', False), False, sentence.get('font', ''), standard_fonts)
+    
+    overlay_packet = io.BytesIO()
+    c = canvas.Canvas(overlay_packet)
+    
+    for sentences, (page_width, page_height) in zip(pages, page_sizes):
         c.setPageSize((page_width, page_height))
         
-        current_bold = current_size = None
-        
-        for sentence in sentences_by_page[page_num]:
-            text = sentence['text']
-            if not text.strip():
-                continue
-                
-            # Process Arabic text for RTL rendering
-            processed_text = process_arabic_text(text)
-            
-            # Get coordinates (using top_left as reference point)
-            x = sentence['coordinates']['top_left']['x']
-            y = page_height - sentence['coordinates']['top_left']['y'] - sentence.get('size', 12) * 0.8  # Adjust for baseline
-            
-            font_size = sentence.get('size', 12)
-            is_bold = sentence.get('bold', False)
-            
-            # Set font and color if changed
-            if (is_bold != current_bold or font_size != current_size):
-                set_arabic_font_and_color(c, is_bold, font_size, regular_available, bold_available)
-                current_bold, current_size = is_bold, font_size
-            
-            try:
-                # Draw the text at the calculated position
-                c.drawString(x, y, processed_text)
-            except Exception as e:
-                print(f"Error drawing text '{text}': {e}")
-                try:
-                    # Try with simple text
-                    c.drawString(x, y, text[:50])  # Truncate if too long
-                except:
-                    # Fallback to simple text
-                    c.drawString(x, y, '...')
+        current_font = current_size = None
         
+        # Process Arabic text for RTL rendering and fit every line to its box, all of the page's lines at once
+        for font_size, lines in layout.layout_page(sentences, process_arabic_text, chain_of):
+            for x, baseline, segments in lines:
+                y = page_height - baseline
+                for font_name, segment in segments:
+                    # Set font and color if changed
+                    if (font_name != current_font or font_size != current_size):
+                        c.setFont(font_name, font_size)
+                        c.setFillColorRGB(0, 0, 0)
+                        current_font, current_size = font_name, font_size
+                    c.drawString(x, y, segment)
+                    x += pdfmetrics.stringWidth(segment, font_name, font_size)
         c.showPage()
     
     c.save()
-    overlay_packet.seek(0)
-    overlay_pdf = PdfReader(overlay_packet)
-    
-    with open(overlay_pdf_path, 'wb') as overlay_file:
-        overlay_writer = PdfWriter()
-        for page in overlay_pdf.pages:
-            overlay_writer.add_page(page)
-        overlay_writer.write(overlay_file)
-    
-    print(f"Text overlay created: {overlay_pdf_path}")
+    return overlay_packet.getvalue()
 
-def merge_pdf_layers(base_pdf_path, overlay_pdf_path, output_pdf_path):
-    """Merge base PDF with text overlay"""
-    base_pdf = PdfReader(base_pdf_path)
-    overlay_pdf = PdfReader(overlay_pdf_path)
-    
-    output_writer = PdfWriter()
-    
-    for i in range(len(base_pdf.pages)):
-        base_page = base_pdf.pages[i]
-        if i < len(overlay_pdf.pages):
-            base_page.merge_page(overlay_pdf.pages[i])
-        output_writer.add_page(base_page)
-    
-    with open(output_pdf_path, 'wb') as output_file:
-        output_writer.write(output_file)
-    
-    print(f"Merged PDF saved: {output_pdf_path}")
-
-def reconstruct_pdf_from_line_db(json_path, base_pdf_path, output_pdf_path):
-    """Main reconstruction function for line database JSON"""
-    overlay_pdf_path = "temp_line_overlay.pdf"
-    
-    create_text_overlay_from_line_db(json_path, overlay_pdf_path, base_pdf_path)
-    merge_pdf_layers(base_pdf_path, overlay_pdf_path, output_pdf_path)
-    
-    try:
-        os.remove(overlay_pdf_path)
-        print("Temporary overlay removed")
-    except:
-        pass
+def reconstruct_pdf_from_line_db(json_path, base_pdf_path, output_pdf_path, overlay_pdf_path=None, standard_fonts=None,
+                                 workers=None):
+    """
+    Main reconstruction function for line database JSON; the overlay stays in memory unless overlay_pdf_path is given.
+    Long documents are rendered and merged in page ranges by up to `workers` processes (default OVERLAY_WORKERS).
+    """
+    pages, page_sizes = load_line_pages(json_path, base_pdf_path)
+    reconstruct_overlaid(draw_line_pages, pages, page_sizes, base_pdf_path, output_pdf_path, overlay_pdf_path,
+                         workers, standard_fonts=standard_fonts)
     
     print(f"PDF reconstructed from line database: {output_pdf_path}")
 
@@ -0,0 +1,719 @@
+"""
+Performance benchmarks for the translation and reconstruction pipeline.
+
+Usage:
+    python benchmarks.py sentences --sizes 1000 10000
+    python benchmarks.py bucketing --lines 5000
+    python benchmarks.py ct2 --test-set testset.tmx --target-lang ar
+    python benchmarks.py overlay
+    python benchmarks.py reconstruct
+    python benchmarks.py subsets
+    python benchmarks.py standard-fonts
+    python benchmarks.py fallback --lines 5000
+    python benchmarks.py parallel --pages 500 --workers 1 2 4
+    python benchmarks.py shaping --lines 20000
+    python benchmarks.py fit
+"""
+import io
+import os
+import json
+import math
+import time
+import logging
+import argparse
+import random
+import tempfile
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+REPO_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+SAMPLE_PDF = os.path.join(REPO_DIR, "raw_files", "input.pdf")
+
+
+def _timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def bench_sentences(args):
+    """Serial one-sentence-per-request loop vs batched concurrent translate_sentences against the mock server"""
+    from mock_translation_server import start_mock_server
+    from sentence_translator import translate_sentences
+    from translation_backends import HTTPBackend
+
+    server, url = start_mock_server(request_latency=args.request_latency, item_latency=args.item_latency)
+    print(f"Mock server: {url} (request latency {args.request_latency * 1000:.0f}ms, "
+          f"item latency {args.item_latency * 1000:.1f}ms)")
+    print(f"{'sentences':>10} {'serial (s)':>12} {'batched (s)':>12} {'speedup':>9} {'requests':>9}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.sizes:
+            sentences = [{"text": f"Sentence number {i} of the benchmark corpus.", "page": i // 40 + 1}
+                         for i in range(n)]
+
+            # The old loop made one request per sentence with nothing else in flight;
+            # time it on at most --baseline-limit sentences and scale linearly
+            baseline_n = min(n, args.baseline_limit)
+            baseline_path = os.path.join(tmp, f"baseline_{n}.json")
+            with open(baseline_path, "w", encoding="utf-8") as f:
+                json.dump(sentences[:baseline_n], f)
+            serial_time, _ = _timed(translate_sentences, baseline_path, os.path.join(tmp, "out_serial.json"),
+                                    backend=HTTPBackend(url=url, max_concurrency=1), batch_size=1, max_in_flight=1)
+            serial_time *= n / baseline_n
+
+            input_path = os.path.join(tmp, f"sentences_{n}.json")
+            with open(input_path, "w", encoding="utf-8") as f:
+                json.dump(sentences, f)
+            requests_before = server.stats["requests"]
+            batched_time, result = _timed(translate_sentences, input_path, os.path.join(tmp, "out_batched.json"),
+                                          backend=HTTPBackend(url=url, max_concurrency=args.max_in_flight),
+                                          batch_size=args.batch_size, max_in_flight=args.max_in_flight)
+            assert len(result) == n and result[-1]["original_text"] == sentences[-1]["text"]
+
+            extrapolated = "*" if baseline_n < n else " "
+            print(f"{n:>10} {serial_time:>11.2f}{extrapolated} {batched_time:>12.2f} "
+                  f"{serial_time / batched_time:>8.1f}x {server.stats['requests'] - requests_before:>9}")
+
+    print("* serial time extrapolated from the first --baseline-limit sentences")
+    server.shutdown()
+
+
+def mixed_document_lines(n, seed=7):
+    """Synthetic line DB texts alternating table blocks (short cells) and prose blocks (long lines)"""
+    rng = random.Random(seed)
+    words = ("revenue growth market share quarter total region product customer service annual report "
+             "operating margin forecast segment performance increase decrease compared previous year").split()
+    lines = []
+    while len(lines) < n:
+        if rng.random() < 0.5:
+            # Table block: header and numeric cells, one to three tokens each
+            for _ in range(rng.randint(20, 60)):
+                cell = rng.choice([f"{rng.randint(1, 9999):,}", f"{rng.uniform(0, 100):.1f}%",
+                                   " ".join(rng.choices(words, k=rng.randint(1, 2)))])
+                lines.append(cell)
+        else:
+            # Prose block: full-width wrapped lines of 120-200 characters
+            for _ in range(rng.randint(5, 25)):
+                line = ""
+                target = rng.randint(120, 200)
+                while len(line) < target:
+                    line += rng.choice(words) + " "
+                lines.append(line.strip().capitalize() + ".")
+    return lines[:n]
+
+
+def bench_bucketing(args):
+    """Document-order 20-line batches vs length-bucketed batches on a mixed table/prose document"""
+    from mock_translation_server import start_mock_server
+    from sentence_translator import translate_sentences
+    from translation_backends import HTTPBackend
+    from translation_batcher import length_bucketed_batches, padding_efficiency
+
+    texts = mixed_document_lines(args.lines)
+    doc_order = [texts[i:i + args.batch_size] for i in range(0, len(texts), args.batch_size)]
+    bucketed = [[texts[i] for i in batch] for batch in length_bucketed_batches(
+        texts, args.batch_size, chunk_size=args.batch_size * args.max_in_flight * 4)]
+    short = sum(1 for text in texts if len(text) < 30)
+    print(f"Mixed document: {len(texts)} lines ({short} table cells, {len(texts) - short} prose lines)")
+
+    server, url = start_mock_server(request_latency=args.request_latency, token_latency=args.token_latency)
+    print(f"{'scheduling':>14} {'padding eff.':>13} {'time (s)':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        input_path = os.path.join(tmp, "lines.json")
+        with open(input_path, "w", encoding="utf-8") as f:
+            json.dump([{"text": text, "page": 1} for text in texts], f)
+
+        for label, bucketing, batches in (("document order", False, doc_order), ("length buckets", True, bucketed)):
+            elapsed, result = _timed(translate_sentences, input_path, os.path.join(tmp, "out.json"),
+                                     backend=HTTPBackend(url=url, max_concurrency=args.max_in_flight),
+                                     batch_size=args.batch_size, max_in_flight=args.max_in_flight,
+                                     length_bucketing=bucketing)
+            assert [r["original_text"] for r in result] == texts
+            print(f"{label:>14} {padding_efficiency(batches):>12.1%} {elapsed:>9.2f}")
+
+    server.shutdown()
+
+
+def corpus_bleu(hypotheses, references, max_order=4):
+    """Corpus BLEU (0-100) over whitespace tokens with one reference per hypothesis"""
+    matches, totals = [0] * max_order, [0] * max_order
+    hyp_length = ref_length = 0
+    for hypothesis, reference in zip(hypotheses, references):
+        hyp, ref = hypothesis.split(), reference.split()
+        hyp_length += len(hyp)
+        ref_length += len(ref)
+        for n in range(1, max_order + 1):
+            hyp_ngrams = Counter(tuple(hyp[i:i + n]) for i in range(len(hyp) - n + 1))
+            ref_ngrams = Counter(tuple(ref[i:i + n]) for i in range(len(ref) - n + 1))
+            matches[n - 1] += sum((hyp_ngrams & ref_ngrams).values())
+            totals[n - 1] += max(len(hyp) - n + 1, 0)
+    if not hyp_length or not all(matches):
+        return 0.0
+    log_precision = sum(math.log(m / t) for m, t in zip(matches, totals)) / max_order
+    brevity = min(0.0, 1 - ref_length / hyp_length)
+    return 100 * math.exp(log_precision + brevity)
+
+
+def bench_ct2(args):
+    """Throughput and BLEU of CTranslate2 engine settings on a local TMX/CSV test set"""
+    from tm_io import iter_csv_pairs, iter_tmx_pairs
+    from translation_backends import CTranslate2Backend
+
+    read = iter_tmx_pairs if args.test_set.lower().endswith(".tmx") else iter_csv_pairs
+    pairs = list(read(args.test_set, args.source_lang, args.target_lang))[:args.limit]
+    if not pairs:
+        raise SystemExit(f"No {args.source_lang}->{args.target_lang} pairs in {args.test_set}")
+    sources = [source for source, _ in pairs]
+    references = [target for _, target in pairs]
+    print(f"Test set: {len(pairs)} segments, {sum(map(len, sources))} source characters")
+    print(f"{'compute type':>13} {'beam':>5} {'inter':>6} {'intra':>6} {'load (s)':>9} {'time (s)':>9} "
+          f"{'sent/s':>8} {'BLEU':>6} {'delta':>7}")
+
+    baseline_bleu = None
+    for config in args.configs:
+        compute_type, beam_size, inter_threads, intra_threads = config.split("/")
+        backend = CTranslate2Backend(compute_type=compute_type, beam_size=int(beam_size),
+                                     inter_threads=int(inter_threads), intra_threads=int(intra_threads),
+                                     max_batch_size=args.batch_size, max_loaded_models=1)
+        load_time, supported = _timed(backend.supports, args.source_lang, args.target_lang)
+        if not supported:
+            raise SystemExit(f"No Argos model installed for {args.source_lang}->{args.target_lang}")
+
+        # One batch per CTranslate2 worker in flight, as the pipeline's dispatcher would keep it
+        batches = [sources[i:i + args.batch_size] for i in range(0, len(sources), args.batch_size)]
+        with ThreadPoolExecutor(max_workers=backend.max_concurrency) as pool:
+            elapsed, results = _timed(lambda: list(pool.map(
+                lambda batch: backend.translate_batch(batch, args.source_lang, args.target_lang), batches)))
+        hypotheses = [text for batch in results for text in batch]
+
+        bleu = corpus_bleu(hypotheses, references)
+        baseline_bleu = bleu if baseline_bleu is None else baseline_bleu
+        print(f"{compute_type:>13} {beam_size:>5} {inter_threads:>6} {intra_threads:>6} {load_time:>9.2f} "
+              f"{elapsed:>9.2f} {len(sources) / elapsed:>8.1f} {bleu:>6.2f} {bleu - baseline_bleu:>+7.2f}")
+    print("delta: BLEU change against the first configuration")
+
+
+def glyph_origins(pdf_path):
+    """Sorted (page, char, x, y) baseline origins of every rendered glyph, as MuPDF lays them out"""
+    import fitz
+    origins = []
+    with fitz.open(pdf_path) as doc:
+        for page_number, page in enumerate(doc):
+            for block in page.get_text("rawdict")["blocks"]:
+                for line in block.get("lines", []):
+                    for span in line["spans"]:
+                        origins.extend((page_number, char["c"], *char["origin"]) for char in span["chars"])
+    return sorted(origins)
+
+
+def max_glyph_shift(origins, reference):
+    """Largest distance (pt) from any glyph to the nearest same glyph on the same page of the reference"""
+    by_glyph = {}
+    for page, char, x, y in reference:
+        by_glyph.setdefault((page, char), []).append((x, y))
+    return max((min(max(abs(x - rx), abs(y - ry)) for rx, ry in by_glyph.get((page, char), [(float("inf"), 0)]))
+                for page, char, x, y in origins), default=0)
+
+
+def content_stats(pdf_path):
+    """(text objects, uncompressed content stream bytes) over all pages"""
+    from PyPDF2 import PdfReader
+    text_objects = content_bytes = 0
+    for page in PdfReader(pdf_path).pages:
+        data = page.get_contents().get_data()
+        text_objects += data.count(b"BT ")
+        content_bytes += len(data)
+    return text_objects, content_bytes
+
+
+def per_char_overlay(json_path, overlay_pdf_path, base_pdf_path):
+    """The overlay as it was first built: one drawString (a text object with its own matrix) per character"""
+    from reportlab.pdfgen import canvas
+    from font_registry import get_font_registry
+    from pdf_reconstructor import load_character_pages, set_fill_color
+
+    registry = get_font_registry()
+    pages_data, page_sizes = load_character_pages(json_path, base_pdf_path)
+    c = canvas.Canvas(overlay_pdf_path)
+    for page_data, (page_width, page_height) in zip(pages_data, page_sizes):
+        c.setPageSize((page_width, page_height))
+        current = None
+        for char_data in page_data['characters']:
+            if not char_data['text'].strip() or not char_data.get('size', 12):
+                continue
+            chain = registry.chain("Arial", char_data.get('bold', False), char_data.get('italic', False),
+                                   char_data.get('original_font', ''))
+            font_name, text = chain.pick(char_data['text'])
+            style = (font_name, char_data.get('size', 12), char_data.get('color', (0, 0, 0)))
+            if style != current:
+                c.setFont(font_name, style[1])
+                set_fill_color(c, style[2])
+                current = style
+            c.drawString(char_data['x0'], page_height - char_data['bottom'], text)
+        c.showPage()
+    c.save()
+
+
+def bench_overlay(args):
+    """English overlay build: one text object per character vs glyph runs with TJ positioning"""
+    import contextlib
+    from text_extractor import extract_pdf_to_json
+    from text_remover import remove_text
+    from pdf_reconstructor import create_text_overlay
+
+    with tempfile.TemporaryDirectory() as tmp:
+        chars_path, base_path = os.path.join(tmp, "chars.json"), os.path.join(tmp, "base.pdf")
+        with contextlib.redirect_stdout(io.StringIO()):
+            pages = extract_pdf_to_json(args.pdf, chars_path)
+            remove_text(args.pdf, base_path)
+        print(f"{args.pdf}: {len(pages)} pages, {sum(len(page['characters']) for page in pages)} characters")
+        print(f"{'layout':>11} {'build (s)':>10} {'file (KB)':>10} {'content (KB)':>13} {'text objects':>13} "
+              f"{'max shift (pt)':>15}")
+
+        reference = None
+        for label, build in (("per-char", per_char_overlay), ("glyph runs", create_text_overlay)):
+            overlay_path = os.path.join(tmp, f"overlay_{label.replace(' ', '_')}.pdf")
+            timings = []
+            for _ in range(args.repeat):
+                with contextlib.redirect_stdout(io.StringIO()):
+                    elapsed, _ = _timed(build, chars_path, overlay_path, base_path)
+                timings.append(elapsed)
+            text_objects, content_bytes = content_stats(overlay_path)
+            origins = glyph_origins(overlay_path)
+            reference = reference or origins
+            shift = max_glyph_shift(origins, reference)
+            print(f"{label:>11} {sorted(timings)[len(timings) // 2]:>10.3f} {os.path.getsize(overlay_path) / 1024:>10.1f} "
+                  f"{content_bytes / 1024:>13.1f} {text_objects:>13} {shift:>15.3f}")
+
+
+def bench_reconstruct(args):
+    """reportlab overlay + PyPDF2 merge vs single-pass PyMuPDF, for the character and line-database paths"""
+    import contextlib
+    from text_extractor import extract_pdf_to_json
+    from text_remover import remove_text
+    from countour_mapper import PDFLineExtractor
+    from pdf_reconstructor import reconstruct_pdf
+    from ar_pdf_reconstructor import reconstruct_pdf_from_line_db
+    from fitz_reconstructor import reconstruct_pdf_fitz, reconstruct_pdf_from_line_db_fitz
+    from translation_backends import HTTPBackend
+
+    with tempfile.TemporaryDirectory() as tmp:
+        chars_path, base_path = os.path.join(tmp, "chars.json"), os.path.join(tmp, "base.pdf")
+        line_db_path = args.line_db or os.path.join(tmp, "line_db.json")
+        with contextlib.redirect_stdout(io.StringIO()):
+            pages = extract_pdf_to_json(args.pdf, chars_path)
+            remove_text(args.pdf, base_path)
+            if not args.line_db:
+                # The untranslated line database exercises the same drawing path as a translated one
+                PDFLineExtractor(backend=HTTPBackend()).extract_lines_from_pdf(args.pdf, line_db_path)
+        with open(line_db_path, encoding="utf-8") as f:
+            lines = len(json.load(f)["sentences"])
+        print(f"{args.pdf}: {len(pages)} pages, {sum(len(page['characters']) for page in pages)} characters, "
+              f"{lines} lines")
+        print(f"{'input':>10} {'engine':>10} {'time (s)':>9} {'output (KB)':>12} {'max shift (pt)':>15}")
+
+        for label, source, engines in (
+                ("characters", chars_path, (("reportlab", reconstruct_pdf), ("pymupdf", reconstruct_pdf_fitz))),
+                ("lines", line_db_path, (("reportlab", reconstruct_pdf_from_line_db),
+                                         ("pymupdf", reconstruct_pdf_from_line_db_fitz)))):
+            reference = None
+            for engine, reconstruct in engines:
+                output_path = os.path.join(tmp, f"{label}_{engine}.pdf")
+                timings = []
+                for _ in range(args.repeat):
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        elapsed, _ = _timed(reconstruct, source, base_path, output_path)
+                    timings.append(elapsed)
+                # MuPDF inserts synthetic spaces from glyph widths, so only inked glyphs are compared
+                origins = [origin for origin in glyph_origins(output_path) if origin[1].strip()]
+                reference = reference or origins
+                shift = max_glyph_shift(origins, reference)
+                print(f"{label:>10} {engine:>10} {sorted(timings)[len(timings) // 2]:>9.3f} "
+                      f"{os.path.getsize(output_path) / 1024:>12.1f} {shift:>15.3f}")
+
+
+def embedded_font_bytes(pdf_path):
+    """Total uncompressed size of the font programs embedded in a PDF"""
+    import fitz
+    with fitz.open(pdf_path) as doc:
+        xrefs = {font[0] for page in doc for font in page.get_fonts() if font[1] != "n/a"}
+        return sum(len(doc.extract_font(xref)[3]) for xref in xrefs)
+
+
+def pseudo_arabic(text, letters="ابتثجحخدذرزسشصضطظعغفقكلمنهوي"):
+    """Deterministic Arabic-letter stand-in for a translation, so Arabic font subsets are realistic"""
+    return "".join(letters[ord(char) % len(letters)] if char.isalpha() else char for char in text)
+
+
+def bench_subsets(args):
+    """Line-database reconstruction with a cold and a warm font subset cache, per engine"""
+    import contextlib
+    from text_remover import remove_text
+    from countour_mapper import PDFLineExtractor
+    from ar_pdf_reconstructor import reconstruct_pdf_from_line_db
+    from fitz_reconstructor import reconstruct_pdf_from_line_db_fitz
+    from font_registry import get_font_registry
+    from translation_backends import HTTPBackend
+
+    registry = get_font_registry()
+    with tempfile.TemporaryDirectory() as tmp:
+        base_path, line_db_path = os.path.join(tmp, "base.pdf"), os.path.join(tmp, "line_db.json")
+        with contextlib.redirect_stdout(io.StringIO()):
+            remove_text(args.pdf, base_path)
+            if args.line_db:
+                with open(args.line_db, encoding="utf-8") as f:
+                    line_db = json.load(f)
+            else:
+                line_db = PDFLineExtractor(backend=HTTPBackend()).extract_lines_from_pdf(args.pdf, line_db_path)
+                for sentence in line_db["sentences"]:
+                    sentence["text"] = pseudo_arabic(sentence["text"])
+        with open(line_db_path, "w", encoding="utf-8") as f:
+            json.dump(line_db, f, ensure_ascii=False)
+        base_size = os.path.getsize(base_path)
+        print(f"{args.pdf}: {len(line_db['sentences'])} lines")
+        print(f"{'engine':>10} {'cold (s)':>9} {'warm (s)':>9} {'added (KB)':>11} {'fonts (KB)':>11} "
+              f"{'builds':>7} {'hits':>5}")
+
+        for engine, reconstruct in (("reportlab", reconstruct_pdf_from_line_db),
+                                    ("pymupdf", reconstruct_pdf_from_line_db_fitz)):
+            output_path = os.path.join(tmp, f"{engine}.pdf")
+            registry.clear_subsets()
+            stats = dict(registry.stats)
+            timings = []
+            for _ in range(args.repeat + 1):
+                with contextlib.redirect_stdout(io.StringIO()):
+                    elapsed, _ = _timed(reconstruct, line_db_path, base_path, output_path)
+                timings.append(elapsed)
+            warm = sorted(timings[1:])[len(timings[1:]) // 2]
+            print(f"{engine:>10} {timings[0]:>9.3f} {warm:>9.3f} "
+                  f"{(os.path.getsize(output_path) - base_size) / 1024:>11.1f} "
+                  f"{embedded_font_bytes(output_path) / 1024:>11.1f} "
+                  f"{registry.stats['subset_builds'] - stats['subset_builds']:>7} "
+                  f"{registry.stats['subset_hits'] - stats['subset_hits']:>5}")
+
+
+def bench_standard_fonts(args):
+    """English reconstruction with every run in the embedded face vs standard-14 fonts where they cover the run"""
+    import contextlib
+    from text_extractor import extract_pdf_to_json
+    from text_remover import remove_text
+    from pdf_reconstructor import reconstruct_pdf
+    from fitz_reconstructor import reconstruct_pdf_fitz
+    from font_registry import get_font_registry
+
+    registry = get_font_registry()
+    if args.english_font:
+        # Arial Unicode MS is not shipped in fonts/; any TTF/OTF stands in for the embedded face
+        registry.faces.update({"Arial": args.english_font, "Arial-Bold": args.english_font})
+    with tempfile.TemporaryDirectory() as tmp:
+        chars_path, base_path = os.path.join(tmp, "chars.json"), os.path.join(tmp, "base.pdf")
+        with contextlib.redirect_stdout(io.StringIO()):
+            pages = extract_pdf_to_json(args.pdf, chars_path)
+            remove_text(args.pdf, base_path)
+        base_size = os.path.getsize(base_path)
+        print(f"{args.pdf}: {sum(len(page['characters']) for page in pages)} characters, "
+              f"embedded face {registry.path(registry.resolve('Arial'))}")
+        print(f"{'engine':>10} {'fonts':>9} {'time (s)':>9} {'added (KB)':>11} {'fonts (KB)':>11} {'max shift (pt)':>15}")
+        # Shift against the source glyph positions. MuPDF keeps simple-font widths as integers when reading,
+        # so runs in reportlab's embedded TrueType subsets (exact fractional /Widths) show a small reader-side drift.
+        reference = [(number, char['text'], char['x0'], char['bottom']) for number, page in enumerate(pages)
+                     for char in page['characters'] if char['text'].strip() and char.get('size', 12)]
+
+        for engine, reconstruct in (("reportlab", reconstruct_pdf), ("pymupdf", reconstruct_pdf_fitz)):
+            for label, standard_fonts in (("embedded", False), ("standard", True)):
+                output_path = os.path.join(tmp, f"{engine}_{label}.pdf")
+                timings = []
+                for _ in range(args.repeat):
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        elapsed, _ = _timed(reconstruct, chars_path, base_path, output_path,
+                                            standard_fonts=standard_fonts)
+                    timings.append(elapsed)
+                origins = [origin for origin in glyph_origins(output_path) if origin[1].strip()]
+                print(f"{engine:>10} {label:>9} {sorted(timings)[len(timings) // 2]:>9.3f} "
+                      f"{(os.path.getsize(output_path) - base_size) / 1024:>11.1f} "
+                      f"{embedded_font_bytes(output_path) / 1024:>11.1f} "
+                      f"{max_glyph_shift(origins, reference):>15.3f}")
+
+
+def bench_fallback(args):
+    """Per-run font fallback on mixed-script lines: missing glyphs with one font per line vs the font chain"""
+    from font_registry import get_font_registry, STANDARD_COVERAGE
+
+    registry = get_font_registry()
+    rng = random.Random(11)
+    symbols = ("\u2192", "\u2713", "\u20ac", "\u00a9", "\u4e2d")
+    lines = []
+    for line in mixed_document_lines(args.lines):
+        words = [pseudo_arabic(word) if rng.random() < 0.4 else word for word in line.split()]
+        if rng.random() < 0.3:
+            words.insert(rng.randrange(len(words) + 1), rng.choice(symbols))
+        lines.append(" ".join(words))
+    characters = sum(map(len, lines))
+
+    elapsed, chain = _timed(registry.chain, "Arabic")
+    print(f"{len(lines)} lines, {characters} characters; chain {list(chain.coverage)} built in {elapsed * 1000:.1f} ms")
+    print(f"{'policy':>16} {'us/char':>8} {'runs/line':>10} {'missing glyphs':>15}")
+    # Before: the whole line in a standard-14 font if it covers every character, else in Noto Naskh
+    arabic = registry.coverage(registry.resolve("Arabic"))
+    start = time.perf_counter()
+    missing = 0
+    for line in lines:
+        coverage = STANDARD_COVERAGE if all(ord(char) in STANDARD_COVERAGE for char in line) else arabic
+        missing += sum(1 for char in line if ord(char) not in coverage)
+    print(f"{'font per line':>16} {(time.perf_counter() - start) * 1e6 / characters:>8.2f} {1:>10.2f} {missing:>15}")
+
+    start = time.perf_counter()
+    segmented = [chain.segment_text(line) for line in lines]
+    elapsed = time.perf_counter() - start
+    replaced = sum(text.count("?") for runs in segmented for _, text in runs) - sum(line.count("?") for line in lines)
+    print(f"{'font chain':>16} {elapsed * 1e6 / characters:>8.2f} "
+          f"{sum(map(len, segmented)) / len(lines):>10.2f} {replaced:>15}")
+
+
+def bench_parallel(args):
+    """reportlab reconstruction of a long document (the sample repeated) with overlay page ranges in 1..N processes"""
+    import copy
+    import contextlib
+    import fitz
+    from text_extractor import extract_pdf_to_json
+    from text_remover import remove_text
+    from countour_mapper import PDFLineExtractor
+    from pdf_reconstructor import reconstruct_pdf
+    from ar_pdf_reconstructor import reconstruct_pdf_from_line_db
+    from translation_backends import HTTPBackend
+
+    with tempfile.TemporaryDirectory() as tmp:
+        chars_path, base_path = os.path.join(tmp, "chars.json"), os.path.join(tmp, "base.pdf")
+        line_db_path = os.path.join(tmp, "line_db.json")
+        with contextlib.redirect_stdout(io.StringIO()):
+            pages = extract_pdf_to_json(args.pdf, os.path.join(tmp, "sample_chars.json"))
+            remove_text(args.pdf, os.path.join(tmp, "sample_base.pdf"))
+            line_db = PDFLineExtractor(backend=HTTPBackend()).extract_lines_from_pdf(
+                args.pdf, os.path.join(tmp, "sample_line_db.json"))
+        copies = math.ceil(args.pages / len(pages))
+        with fitz.open() as base, fitz.open(os.path.join(tmp, "sample_base.pdf")) as sample:
+            for _ in range(copies):
+                base.insert_pdf(sample)
+            base.save(base_path)
+        sentences = []
+        for copy_number in range(copies):
+            for sentence in copy.deepcopy(line_db["sentences"]):
+                sentence["page"] += copy_number * len(pages)
+                sentences.append(sentence)
+        with open(chars_path, "w", encoding="utf-8") as f:
+            json.dump(pages * copies, f, ensure_ascii=False)
+        with open(line_db_path, "w", encoding="utf-8") as f:
+            json.dump({**line_db, "sentences": sentences}, f, ensure_ascii=False)
+        print(f"{args.pdf} x{copies}: {len(pages) * copies} pages, "
+              f"{sum(len(page['characters']) for page in pages) * copies} characters, {len(sentences)} lines, "
+              f"{os.cpu_count()} CPUs")
+        print(f"{'input':>10} {'workers':>8} {'time (s)':>9} {'speedup':>8} {'output (KB)':>12} {'max shift (pt)':>15}")
+
+        for label, source, reconstruct in (("characters", chars_path, reconstruct_pdf),
+                                           ("lines", line_db_path, reconstruct_pdf_from_line_db)):
+            serial_time = reference = serial_size = None
+            for workers in args.workers:
+                output_path = os.path.join(tmp, f"{label}_{workers}.pdf")
+                with contextlib.redirect_stdout(io.StringIO()):
+                    elapsed, _ = _timed(reconstruct, source, base_path, output_path, workers=workers)
+                origins = [origin for origin in glyph_origins(output_path) if origin[1].strip()]
+                serial_time = serial_time or elapsed
+                reference = reference or origins
+                size = os.path.getsize(output_path)
+                serial_size = serial_size or size
+                print(f"{label:>10} {workers:>8} {elapsed:>9.2f} {serial_time / elapsed:>7.2f}x "
+                      f"{size / 1024:>12.1f} {max_glyph_shift(origins, reference):>15.3f}")
+                # Assembling ranges must not duplicate what they share (fonts, images) in the output
+                assert size <= serial_size * 1.02, f"{workers} workers: {size} bytes vs {serial_size} serial"
+
+
+def bench_shaping(args):
+    """Arabic reshaping + bidi reordering in sentences/sec: per line and memoised"""
+    import ar_pdf_reconstructor
+    from ar_pdf_reconstructor import process_arabic_text, _shape, _shape_cached
+
+    # Table cells repeat, prose lines mostly do not, like a translated line database
+    lines = [pseudo_arabic(line) for line in mixed_document_lines(args.lines)]
+    print(f"{len(lines)} lines, {len(set(lines))} distinct")
+    print(f"{'shaping':>18} {'time (s)':>9} {'sentences/s':>12} {'cache hits':>11}")
+
+    def report(label, fn):
+        cached = hasattr(_shape_cached, "cache_info")
+        if cached and label != "memoised (warm)":
+            _shape_cached.cache_clear()
+        hits = _shape_cached.cache_info().hits if cached else 0
+        elapsed, shaped = _timed(fn)
+        hits = _shape_cached.cache_info().hits - hits if cached else 0
+        print(f"{label:>18} {elapsed:>9.3f} {len(lines) / elapsed:>12.0f} {hits:>11}")
+        return shaped
+
+    # Untimed pass so the reshaper's configuration and the bidi module are loaded before the first row
+    for line in lines[:500]:
+        _shape(line)
+    reference = report("per line", lambda: [_shape(line) if ar_pdf_reconstructor.ARABIC_LETTER.search(line) else line
+                                            for line in lines])
+    assert report("memoised (cold)", lambda: [process_arabic_text(line) for line in lines]) == reference
+    assert report("memoised (warm)", lambda: [process_arabic_text(line) for line in lines]) == reference
+
+
+def bench_fit(args):
+    """Fitting translated lines to their boxes: stringWidth size search per line vs the layout engine's page pass"""
+    import contextlib
+    from reportlab.pdfbase import pdfmetrics
+    from countour_mapper import PDFLineExtractor
+    from ar_pdf_reconstructor import process_arabic_text
+    from font_registry import get_font_registry
+    from text_layout import TextLayout, MIN_FIT_SCALE
+    from translation_backends import HTTPBackend
+
+    with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(io.StringIO()):
+        line_db = PDFLineExtractor(backend=HTTPBackend()).extract_lines_from_pdf(args.pdf, os.path.join(tmp, "lines.json"))
+    # Stand-in translations up to 40% longer than the source, as Arabic often runs, and a few run-on lines
+    # three times as long that stay too wide even at the size floor
+    rng = random.Random(5)
+
+    def stand_in(text):
+        if rng.random() < 0.03:
+            return pseudo_arabic(" ".join([text] * 3))
+        return pseudo_arabic(text + text[:int(len(text) * rng.uniform(0, 0.4))])
+
+    sentences = [dict(sentence, text=stand_in(sentence["text"])) for sentence in line_db["sentences"] for _ in range(args.repeat)]
+    pages = {}
+    for sentence in sentences:
+        pages.setdefault(sentence["page"], []).append(sentence)
+    registry = get_font_registry()
+
+    def chain_of(sentence):
+        return registry.chain("Arabic", sentence.get("bold", False), False, sentence.get("font", ""))
+
+    def box_width(sentence):
+        return sentence["coordinates"]["bottom_right"]["x"] - sentence["coordinates"]["top_left"]["x"]
+
+    def drawn_width(text, sentence, size):
+        return sum(pdfmetrics.stringWidth(segment, font_name, size) for font_name, segment in chain_of(sentence).segment_text(text))
+
+    def search(sentence, text):
+        # Bisect the size with stringWidth, as a per-line fitter would
+        low, high = sentence["size"] * MIN_FIT_SCALE, sentence["size"]
+        if drawn_width(text, sentence, high) <= box_width(sentence):
+            return high
+        for _ in range(args.steps):
+            middle = (low + high) / 2
+            low, high = (middle, high) if drawn_width(text, sentence, middle) <= box_width(sentence) else (low, middle)
+        return low
+
+    for sentence in sentences:
+        process_arabic_text(sentence["text"])
+    elapsed, searched = _timed(lambda: [search(sentence, process_arabic_text(sentence["text"]))
+                                        for page in pages.values() for sentence in page])
+    layout = TextLayout(registry)
+
+    def fit_pages():
+        return [placement for page in pages.values() for placement in layout.layout_page(page, process_arabic_text, chain_of)]
+
+    cold, _ = _timed(fit_pages)
+    warm, placements = _timed(fit_pages)
+
+    ordered = [sentence for page in pages.values() for sentence in page]
+    texts = [process_arabic_text(sentence["text"]) for sentence in ordered]
+    overflow = sum(drawn_width(text, sentence, sentence["size"]) > box_width(sentence) + 0.01
+                   for sentence, text in zip(ordered, texts))
+    still_over = sum(sum(pdfmetrics.stringWidth(segment, font_name, size) for font_name, segment in segments)
+                     > box_width(sentence) + 0.01
+                     for sentence, (size, lines) in zip(ordered, placements) for _, _, segments in lines)
+    print(f"{len(sentences)} lines on {len(pages)} pages; {overflow} overflow their box at the source size, "
+          f"{still_over} after fitting (only below the {MIN_FIT_SCALE:.0%} size floor)")
+    # Lines overflowing at the floor may wrap instead; the bisection only sizes single lines
+    print(f"max size difference vs the bisection: "
+          f"{max(abs(size - best) for (size, lines), best in zip(placements, searched) if len(lines) == 1):.3f} pt")
+    print(f"{'fitter':>22} {'time (s)':>9} {'lines/s':>9}")
+    print(f"{'stringWidth bisection':>22} {elapsed:>9.3f} {len(sentences) / elapsed:>9.0f}")
+    print(f"{'layout, first pass':>22} {cold:>9.3f} {len(sentences) / cold:>9.0f}")
+    print(f"{'layout, tables built':>22} {warm:>9.3f} {len(sentences) / warm:>9.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EffiLayouter performance benchmarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    sentences = subparsers.add_parser("sentences", help="translate_sentences throughput against the mock server")
+    sentences.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    sentences.add_argument("--batch-size", type=int, default=25)
+    sentences.add_argument("--max-in-flight", type=int, default=8)
+    sentences.add_argument("--request-latency", type=float, default=0.02)
+    sentences.add_argument("--item-latency", type=float, default=0.0005)
+    sentences.add_argument("--baseline-limit", type=int, default=1000)
+    sentences.set_defaults(func=bench_sentences)
+
+    bucketing = subparsers.add_parser("bucketing", help="padding waste of document-order vs length-bucketed batches")
+    bucketing.add_argument("--lines", type=int, default=5000)
+    bucketing.add_argument("--batch-size", type=int, default=20)
+    bucketing.add_argument("--max-in-flight", type=int, default=4)
+    bucketing.add_argument("--request-latency", type=float, default=0.005)
+    bucketing.add_argument("--token-latency", type=float, default=0.00005)
+    bucketing.set_defaults(func=bench_bucketing)
+
+    ct2 = subparsers.add_parser("ct2", help="CTranslate2 compute type/threads/beam throughput and BLEU delta")
+    ct2.add_argument("--test-set", required=True, help="TMX or CSV file with reference translations")
+    ct2.add_argument("--source-lang", default="en")
+    ct2.add_argument("--target-lang", default="ar")
+    ct2.add_argument("--limit", type=int, default=1000)
+    ct2.add_argument("--batch-size", type=int, default=32)
+    ct2.add_argument("--configs", nargs="+", metavar="TYPE/BEAM/INTER/INTRA",
+                     default=["float32/4/1/0", "int8_float32/4/1/0", "int8/4/1/0", "int8/1/1/0", "int8/1/2/0"],
+                     help="Engine settings to compare; the first one is the quality baseline")
+    ct2.set_defaults(func=bench_ct2)
+
+    overlay = subparsers.add_parser("overlay", help="overlay size and build time, per-char vs glyph-run text objects")
+    overlay.add_argument("--pdf", default=SAMPLE_PDF)
+    overlay.add_argument("--repeat", type=int, default=5)
+    overlay.set_defaults(func=bench_overlay)
+
+    reconstruct = subparsers.add_parser("reconstruct", help="reportlab overlay + merge vs single-pass PyMuPDF")
+    reconstruct.add_argument("--pdf", default=SAMPLE_PDF)
+    reconstruct.add_argument("--line-db", help="Translated line database to draw (default: the PDF's own lines)")
+    reconstruct.add_argument("--repeat", type=int, default=5)
+    reconstruct.set_defaults(func=bench_reconstruct)
+
+    subsets = subparsers.add_parser("subsets", help="font subset build time and output size, cold vs warm cache")
+    subsets.add_argument("--pdf", default=SAMPLE_PDF)
+    subsets.add_argument("--line-db", help="Translated line database to draw (default: pseudo-Arabic of the PDF's lines)")
+    subsets.add_argument("--repeat", type=int, default=5)
+    subsets.set_defaults(func=bench_subsets)
+
+    standard = subparsers.add_parser("standard-fonts", help="English output with embedded vs standard-14 fonts")
+    standard.add_argument("--pdf", default=SAMPLE_PDF)
+    standard.add_argument("--english-font", default=os.path.join(REPO_DIR, "fonts", "inter", "static", "Inter_18pt-Regular.ttf"),
+                          help="Font file standing in for Arial Unicode MS (empty to use the registry's Arial)")
+    standard.add_argument("--repeat", type=int, default=5)
+    standard.set_defaults(func=bench_standard_fonts)
+
+    fallback = subparsers.add_parser("fallback", help="per-run font fallback on mixed-script lines")
+    fallback.add_argument("--lines", type=int, default=5000)
+    fallback.set_defaults(func=bench_fallback)
+
+    parallel = subparsers.add_parser("parallel", help="long-document reconstruction with page-parallel overlays")
+    parallel.add_argument("--pdf", default=SAMPLE_PDF)
+    parallel.add_argument("--pages", type=int, default=500)
+    parallel.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parallel.set_defaults(func=bench_parallel)
+
+    shaping = subparsers.add_parser("shaping", help="Arabic shaping/bidi sentences per second, per line vs memoised")
+    shaping.add_argument("--lines", type=int, default=20000)
+    shaping.set_defaults(func=bench_shaping)
+
+    fit = subparsers.add_parser("fit", help="fit translated lines to their boxes, stringWidth search vs layout engine")
+    fit.add_argument("--pdf", default=SAMPLE_PDF)
+    fit.add_argument("--repeat", type=int, default=20, help="copies of each line, for a line database of realistic size")
+    fit.add_argument("--steps", type=int, default=12, help="bisection steps of the baseline fitter")
+    fit.set_defaults(func=bench_fit)
+
+    args = parser.parse_args()
+    # Configure first so the modules' own basicConfig calls are no-ops
+    logging.basicConfig(level=logging.WARNING)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
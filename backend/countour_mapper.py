@@ -4,16 +4,23 @@ import os
 import re
 import fitz  # PyMuPDF
 import uuid
+import hashlib
 from datetime import datetime
-from collections import defaultdict
+from collections import defaultdict, deque
 import logging
 import time
 import sys
 import random
-import argostranslate.package
-import argostranslate.translate
+import itertools
 import wordninja
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from paragraph_units import group_lines_into_paragraphs, split_text_across_lines
+from translation_backends import get_backend
+from translation_dispatch import AdaptiveConcurrency, HedgedDispatcher
+from translation_batcher import estimate_tokens
+from glossary import PLACEHOLDER_RE, Glossary, protect_spans
+from language_id import LanguageIdentifier
+from pdf_reconstructor import atomic_output
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -22,49 +29,49 @@ logger = logging.getLogger(__name__)
 class PDFLineExtractor:
     """Optimized PDF line extraction with bounding boxes"""
     
-    def __init__(self):
+    def __init__(self, backend=None, hedge_backend=None, translation_memory=None, glossary=None,
+                 entity_protector=None, language_identifier=None, target_lang="ar"):
         self.line_cache = {}
-        self.translation_installed = False
-        self._install_translation_package()
+        # Source text is English; every translation unit goes to this language
+        self.target_lang = target_lang
+        # Translation engine is chosen by config (TRANSLATION_BACKEND) or passed in per request
+        self.backend = backend if backend is not None else get_backend()
+        # Stragglers are re-dispatched to this backend (or the primary one when unset)
+        self.hedge_backend = hedge_backend
+        # Previously translated units are reused (exactly or with new numbers) instead of calling the model
+        self.translation_memory = translation_memory
+        # Glossary terms are protected from the model and replaced with their approved translations
+        self.glossary = glossary
+        # Person and organization names found by this spaCy stage are kept untranslated
+        self.entity_protector = entity_protector
+        # Lines already in the target language, without letters, or in another language are routed past the model
+        self.language_identifier = language_identifier
+        self.dispatch_stats = {}
+        self.memory_stats = {}
+        self.glossary_stats = {}
+        self.entity_stats = {}
+        self.language_stats = {}
+        self._dropped_terms = []
     
-    def _install_translation_package(self):
-        """Install Argos Translate English to Arabic package"""
-        try:
-            logger.info("Checking for Argos Translate English to Arabic package...")
-            
-            # Update package index
-            argostranslate.package.update_package_index()
-            
-            # Get available packages
-            available_packages = argostranslate.package.get_available_packages()
-            
-            # Find English to Arabic package
-            package_to_install = next(
-                filter(
-                    lambda x: x.from_code == "en" and x.to_code == "ar", 
-                    available_packages
-                ),
-                None
-            )
-            
-            if package_to_install:
-                logger.info(f"Installing English to Arabic translation package...")
-                argostranslate.package.install_from_path(package_to_install.download())
-                self.translation_installed = True
-                logger.info("Translation package installed successfully!")
-            else:
-                logger.warning("English to Arabic package not found. Translation will be disabled.")
-                self.translation_installed = False
-                
-        except Exception as e:
-            logger.error(f"Failed to install translation package: {e}")
-            self.translation_installed = False
+    @property
+    def translation_installed(self):
+        """Whether the configured backend can translate English to the target language"""
+        return self.backend.supports("en", self.target_lang)
     
     def _preprocess_for_translation(self, text):
         """Preprocess text for better translation: lowercase and split concatenated words"""
         if not text or not text.strip():
             return text
         
+        # Glossary placeholders must reach the model untouched
+        if PLACEHOLDER_RE.search(text):
+            pieces = PLACEHOLDER_RE.split(text)
+            tokens = PLACEHOLDER_RE.findall(text) + [""]
+            return "".join(
+                (self._preprocess_for_translation(piece) if piece.strip() else piece) + (f" {token} " if token else "")
+                for piece, token in zip(pieces, tokens)
+            ).strip()
+        
         # Convert to lowercase
         processed_text = text.lower()
         
@@ -142,19 +149,28 @@ class PDFLineExtractor:
             logger.error(f"Error processing PDF: {e}")
             raise
 
-    def translate_to_arabic(self, line_db, output_json_path=None, max_workers=2, timeout_seconds=120):
-        """Translate English text to Arabic with rate limiting and human-like behavior"""
+    def translate_to_arabic(self, line_db, output_json_path=None, **options):
+        """Translate English text to Arabic, keeping document order and resuming from a checkpoint"""
+        if self.target_lang != "ar":
+            raise ValueError(f"Extractor targets '{self.target_lang}'; use translate_lines()")
+        return self.translate_lines(line_db, output_json_path, **options)
+
+    def translate_lines(self, line_db, output_json_path=None, max_workers=2, timeout_seconds=120,
+                        paragraph_mode=False, checkpoint_every=25, hedge_percentile=95,
+                        adaptive_concurrency=False, max_workers_limit=None):
+        """Translate English text to the target language, keeping document order and resuming from a checkpoint"""
         if not self.translation_installed:
-            logger.error("Translation package not installed. Cannot translate to Arabic.")
+            logger.error(f"Translation package not installed. Cannot translate to '{self.target_lang}'.")
             return line_db
         
         if output_json_path is None:
             base_name = line_db["metadata"]["pdf_file"].replace(".pdf", "")
-            output_json_path = f"{base_name}_ar_line_db.json"
+            output_json_path = f"{base_name}_{self.target_lang}_line_db.json"
+        checkpoint_path = f"{os.path.splitext(output_json_path)[0]}.checkpoint.json"
         
-        logger.info(f"Starting Arabic translation...")
+        logger.info(f"Starting en->{self.target_lang} translation...")
         
-        # Create a copy of the line database for Arabic
+        # Create a copy of the line database for the target language
         ar_line_db = {
             "metadata": line_db["metadata"].copy(),
             "sentences": []
@@ -162,79 +178,296 @@ class PDFLineExtractor:
         
         # Add translation metadata
         ar_line_db["metadata"]["translation"] = {
-            "target_language": "ar",
+            "target_language": self.target_lang,
             "translation_date": datetime.now().isoformat(),
-            "translation_service": "ArgosTranslate",
-            "preprocessing": "lowercase + wordninja"
+            "translation_service": self.backend.service_name,
+            "preprocessing": "lowercase + wordninja",
+            "paragraph_mode": paragraph_mode
         }
         
-        # Prepare sentences for translation
-        sentences_to_translate = []
-        for sentence in line_db["sentences"]:
-            if sentence["text"].strip():  # Only translate non-empty text
-                sentences_to_translate.append(sentence)
+        units = self._build_translation_units(line_db, paragraph_mode)
+        ar_line_db["metadata"]["translation"]["translation_units"] = len(units)
         
-        # Translate in batches to avoid timeout issues
-        batch_size = 20
         translated_count = 0
-        total_to_translate = len(sentences_to_translate)
+        total_to_translate = sum(len(unit["lines"]) for unit in units)
+        
+        controller = self._concurrency_controller(max_workers, adaptive_concurrency, max_workers_limit)
+        for line_id, ar_sentence in self._translate_units_stream(
+                units, checkpoint_path, max_workers, timeout_seconds, checkpoint_every, hedge_percentile,
+                controller=controller):
+            ar_line_db["sentences"].append(ar_sentence)
+            if "translation_error" not in ar_sentence:
+                translated_count += 1
+                if translated_count % 10 == 0:
+                    logger.info(f"Translated {translated_count}/{total_to_translate} sentences")
+        
+        ar_line_db["metadata"]["translation"]["dispatch"] = dict(self.dispatch_stats, hedge_percentile=hedge_percentile,
+                                                                 item_deadline_seconds=timeout_seconds)
+        ar_line_db["metadata"]["translation"]["concurrency"] = (
+            controller.snapshot() if controller else {"mode": "static", "workers": max_workers}
+        )
+        if self.translation_memory is not None:
+            ar_line_db["metadata"]["translation"]["memory"] = self.memory_stats
+        if self.glossary is not None:
+            ar_line_db["metadata"]["translation"]["glossary"] = self.glossary_stats
+        if self.entity_protector is not None:
+            ar_line_db["metadata"]["translation"]["entities"] = self.entity_stats
+        if self.language_identifier is not None:
+            ar_line_db["metadata"]["translation"]["language_routing"] = self.language_stats
+        ar_line_db["metadata"]["translation"]["backend"] = self.backend.describe()
+        
+        # Save translated line database; the checkpoint is only needed until the full result is on disk
+        self._save_optimized_json(ar_line_db, output_json_path)
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        logger.info(f"en->{self.target_lang} translation complete. Translated {translated_count}/{total_to_translate} sentences "
+                    f"in {len(units)} translation units")
         
-        for i in range(0, len(sentences_to_translate), batch_size):
-            batch = sentences_to_translate[i:i + batch_size]
-            logger.info(f"Processing batch {i//batch_size + 1}/{(len(sentences_to_translate)-1)//batch_size + 1}")
+        return ar_line_db
+
+    def translate_to_arabic_stream(self, line_db, checkpoint_path=None, max_workers=2, timeout_seconds=120,
+                                   paragraph_mode=False, checkpoint_every=25, hedge_percentile=95,
+                                   adaptive_concurrency=False, max_workers_limit=None):
+        """Yield (line_id, Arabic sentence) pairs in document order as translations complete"""
+        if not self.translation_installed:
+            logger.error("Translation package not installed. Cannot translate to Arabic.")
+            return
+        
+        units = self._build_translation_units(line_db, paragraph_mode)
+        controller = self._concurrency_controller(max_workers, adaptive_concurrency, max_workers_limit)
+        yield from self._translate_units_stream(units, checkpoint_path, max_workers, timeout_seconds,
+                                                checkpoint_every, hedge_percentile, controller=controller)
+    
+    def _concurrency_controller(self, max_workers, adaptive_concurrency, max_workers_limit):
+        """AIMD controller for adaptive mode (None for a fixed max_workers)"""
+        if not adaptive_concurrency:
+            return None
+        # Adaptive mode starts at max_workers and lets the controller find the right level; the ceiling
+        # is what the engine itself runs at once (a batching front's queue depth is not)
+        return AdaptiveConcurrency(initial=max_workers,
+                                   max_limit=max_workers_limit or max(max_workers, self.backend.engine_concurrency))
+
+    def _build_translation_units(self, line_db, paragraph_mode):
+        """Build translation units: whole paragraphs in paragraph mode, otherwise one unit per line"""
+        sentences_to_translate = [sentence for sentence in line_db["sentences"] if sentence["text"].strip()]
+        if paragraph_mode:
+            return group_lines_into_paragraphs(sentences_to_translate)
+        return [{"text": sentence["text"], "lines": [sentence]} for sentence in sentences_to_translate]
+
+    def _translate_units_stream(self, units, checkpoint_path, max_workers, timeout_seconds, checkpoint_every,
+                                hedge_percentile, controller=None):
+        """Translate units with a bounded in-flight window and yield their lines in input order"""
+        checkpoint = self._load_checkpoint(checkpoint_path)
+        if checkpoint:
+            logger.info(f"Resuming from checkpoint with {len(checkpoint)} translated lines")
+        if self.language_identifier is not None:
+            self._route_by_language(units)
+        if self.glossary is not None or self.entity_protector is not None:
+            self._protect_terms([unit for unit in units if "skip_reason" not in unit])
+        
+        unsaved = 0
+        to_remember = []
+        memory_stats = {"exact": 0, "masked": 0, "fuzzy": 0, "misses": 0, "stored": 0}
+        pending_units = iter(units)
+        in_flight = deque()
+        
+        hedge_fn = None
+        if self.hedge_backend is not None:
+            hedge_fn = lambda unit: self._translate_sentence_with_delay(unit, backend=self.hedge_backend)
+        
+        # Each unit gets its own deadline; stragglers past the latency percentile are hedged
+        dispatcher = HedgedDispatcher(self._translate_sentence_with_delay, max_workers=max_workers,
+                                      deadline_seconds=timeout_seconds, hedge_fn=hedge_fn,
+                                      hedge_percentile=hedge_percentile, controller=controller)
+        try:
+            def fill_window():
+                # Refill in groups dispatched shortest-first, so units of similar length run (and are
+                # batched) together; in_flight itself stays in document order. The window follows the
+                # adaptive controller's current limit rather than its ceiling.
+                window = (int(controller.limit) if controller else max_workers) * 4
+                if len(in_flight) > window // 2:
+                    return
+                group = list(itertools.islice(pending_units, window - len(in_flight)))
+                cached = [self._untranslated_lines(unit) if "skip_reason" in unit
+                          else self._checkpointed_lines(unit, checkpoint) for unit in group]
+                futures = {}
+                for k in sorted(range(len(group)), key=lambda k: estimate_tokens(group[k]["text"])):
+                    if not cached[k]:
+                        futures[k] = self._memory_future(group[k], memory_stats) or dispatcher.submit(group[k])
+                for k, unit in enumerate(group):
+                    in_flight.append((unit, futures.get(k), cached[k]))
             
-            with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                # Submit translation tasks for this batch
-                future_to_sentence = {
-                    executor.submit(self._translate_sentence_with_delay, sentence): sentence 
-                    for sentence in batch
-                }
-                
-                # Process completed translations with longer timeout per batch
-                try:
-                    for future in as_completed(future_to_sentence, timeout=timeout_seconds):
-                        original_sentence = future_to_sentence[future]
-                        try:
-                            translated_text = future.result()
-                            if translated_text:
-                                # Create Arabic sentence with same structure
-                                ar_sentence = original_sentence.copy()
-                                ar_sentence["text"] = translated_text
-                                ar_sentence["language"] = "ar"
-                                # Store original text for reference
-                                ar_sentence["original_text"] = original_sentence["text"]
-                                ar_line_db["sentences"].append(ar_sentence)
-                                
-                                translated_count += 1
-                                if translated_count % 10 == 0:
-                                    logger.info(f"Translated {translated_count}/{total_to_translate} sentences")
-                            
-                        except Exception as e:
-                            logger.warning(f"Failed to translate sentence: {e}")
-                            # Keep original text if translation fails
-                            ar_sentence = original_sentence.copy()
-                            ar_sentence["translation_error"] = str(e)
-                            ar_line_db["sentences"].append(ar_sentence)
-                            
-                except TimeoutError:
-                    logger.warning(f"Batch {i//batch_size + 1} timed out. Continuing with next batch.")
-                    # Add untranslated sentences from this batch
-                    for sentence in batch:
-                        ar_sentence = sentence.copy()
-                        ar_sentence["translation_error"] = "timeout"
-                        ar_line_db["sentences"].append(ar_sentence)
+            def remember():
+                if to_remember:
+                    memory_stats["stored"] += self.translation_memory.add_many(to_remember, "en", self.target_lang)
+                    to_remember.clear()
             
-            # Small delay between batches to avoid overwhelming the system
-            time.sleep(1)
+            fill_window()
+            while in_flight:
+                # Waiting on the oldest unit keeps output in document order
+                unit, future, ar_sentences = in_flight.popleft()
+                if future is not None:
+                    ar_sentences = self._collect_unit_result(unit, future)
+                    for ar_sentence in ar_sentences:
+                        if "translation_error" not in ar_sentence:
+                            checkpoint[self._checkpoint_key(ar_sentence, ar_sentence["original_text"])] = ar_sentence
+                            unsaved += 1
+                    if (self.translation_memory is not None and not getattr(future, "from_memory", False)
+                            and ar_sentences and "translation_error" not in ar_sentences[0]
+                            and future.result() != unit["text"].strip()):
+                        to_remember.append((unit["text"], future.result()))
+                    if checkpoint_path and unsaved >= checkpoint_every:
+                        self._save_checkpoint(checkpoint, checkpoint_path)
+                        unsaved = 0
+                    if self.translation_memory is not None and len(to_remember) >= checkpoint_every:
+                        remember()
+                
+                for ar_sentence in ar_sentences:
+                    yield ar_sentence["id"], ar_sentence
+                fill_window()
+            if self.translation_memory is not None:
+                remember()
+        finally:
+            dispatcher.close()
+            self.dispatch_stats = dict(dispatcher.stats)
+            self.memory_stats = memory_stats
+            if self.glossary is not None:
+                self.glossary_stats["dropped_placeholders"] = len(self._dropped_terms)
+        
+        if checkpoint_path and unsaved:
+            self._save_checkpoint(checkpoint, checkpoint_path)
+
+    def _route_by_language(self, units):
+        """Detect every unit's language in one pass and mark the ones the translation model should not see"""
+        routes = self.language_identifier.route(unit["text"] for unit in units)
+        for unit, (language, reason) in zip(units, routes):
+            unit["language"] = language
+            if reason:
+                unit["skip_reason"] = reason
+        self.language_stats = LanguageIdentifier.summarize(routes)
+        logger.info(f"Language routing: {self.language_stats}")
+
+    def _untranslated_lines(self, unit):
+        """Target line objects for a unit routed past the model: original text, detected language"""
+        return [dict(line, original_text=line["text"], language=unit["language"],
+                     translation_skipped=unit["skip_reason"]) for line in unit["lines"]]
+
+    def _protect_terms(self, units):
+        """Swap glossary terms and person/organization names for placeholders before translation"""
+        texts = [unit["text"] for unit in units]
+        spans_per_unit = [[] for _ in units]
+        self._dropped_terms = []
+        
+        if self.glossary is not None:
+            # One pass over the whole document for all glossary terms
+            matches_per_unit = self.glossary.scan(texts)
+            for spans, matches in zip(spans_per_unit, matches_per_unit):
+                spans.extend((start, end, self.glossary.targets[term_id]) for start, end, term_id in matches)
+            self.glossary_stats = {
+                "terms": len(self.glossary),
+                "matches": sum(len(matches) for matches in matches_per_unit),
+                "units_with_terms": sum(1 for matches in matches_per_unit if matches)
+            }
+            logger.info(f"Glossary: {self.glossary_stats['matches']} term matches in "
+                        f"{self.glossary_stats['units_with_terms']} translation units")
+        
+        if self.entity_protector is not None:
+            protected = skipped = 0
+            for text, spans, entities in zip(texts, spans_per_unit, self.entity_protector.entities(texts)):
+                # Names keep their original spelling; glossary entries take precedence where they overlap
+                names = [(start, end, text[start:end]) for start, end, _ in entities
+                         if not any(start < g_end and g_start < end for g_start, g_end, _ in spans)]
+                spans.extend(names)
+                protected += len(names)
+                if len(names) == 1 and not text[:names[0][0]].strip() and not text[names[0][1]:].strip():
+                    skipped += 1
+            self.entity_stats = dict(self.entity_protector.describe(), protected=protected, units_skipped=skipped)
+            logger.info(f"Entities: {protected} names protected, {skipped} units left untranslated")
+        
+        for unit, spans in zip(units, spans_per_unit):
+            if spans:
+                unit["protected_text"], unit["term_translations"] = protect_spans(unit["text"], sorted(spans))
+
+    def _memory_future(self, unit, memory_stats):
+        """Return an already-resolved Future when the translation memory can supply the unit"""
+        if self.translation_memory is None:
+            return None
+        translated, match = self.translation_memory.lookup(unit["text"], "en", self.target_lang)
+        if translated is None:
+            memory_stats["misses"] += 1
+            return None
+        memory_stats[match.split(":")[0]] += 1
+        future = Future()
+        future.from_memory = True
+        future.set_result(translated)
+        return future
+
+    def _collect_unit_result(self, unit, future):
+        """Turn a finished (or timed out) unit translation into Arabic line objects"""
+        try:
+            translated_text = future.result()
+        except FutureTimeoutError:
+            logger.warning(f"Translation timed out for '{unit['text'][:50]}...'")
+            return [dict(line, translation_error="timeout") for line in unit["lines"]]
+        except Exception as e:
+            logger.warning(f"Failed to translate sentence: {e}")
+            # Keep original text if translation fails
+            return [dict(line, translation_error=str(e)) for line in unit["lines"]]
         
-        # Save Arabic line database
-        self._save_optimized_json(ar_line_db, output_json_path)
-        logger.info(f"Arabic translation complete. Translated {translated_count}/{total_to_translate} sentences")
+        if not translated_text:
+            return []
         
-        return ar_line_db
+        # Create Arabic sentences with same structure
+        ar_sentences = []
+        line_texts = split_text_across_lines(translated_text, unit["lines"])
+        for original_sentence, line_text in zip(unit["lines"], line_texts):
+            ar_sentence = original_sentence.copy()
+            ar_sentence["text"] = line_text
+            ar_sentence["language"] = self.target_lang
+            # Store original text for reference
+            ar_sentence["original_text"] = original_sentence["text"]
+            ar_sentences.append(ar_sentence)
+        return ar_sentences
 
-    def _translate_sentence_with_delay(self, sentence):
+    @staticmethod
+    def _checkpoint_key(line, text):
+        """Key of a line that survives re-extraction: its page, box and source text (line IDs are random)"""
+        source = json.dumps([line.get("page"), line.get("bbox"), text], ensure_ascii=False)
+        return hashlib.sha1(source.encode("utf-8")).hexdigest()[:16]
+
+    def _checkpointed_lines(self, unit, checkpoint):
+        """Return the unit's Arabic lines from the checkpoint if every line is already translated"""
+        cached = []
+        for line in unit["lines"]:
+            ar_sentence = checkpoint.get(self._checkpoint_key(line, line["text"]))
+            if ar_sentence is None:
+                return None
+            # The checkpoint may come from an earlier extraction, whose line IDs differ
+            cached.append(dict(ar_sentence, id=line["id"]))
+        return cached
+
+    def _load_checkpoint(self, checkpoint_path):
+        """Load completed translations keyed by line position and source text from a checkpoint file"""
+        if not checkpoint_path or not os.path.exists(checkpoint_path):
+            return {}
+        try:
+            with open(checkpoint_path, 'r', encoding='utf-8') as f:
+                return json.load(f).get("translations", {})
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable checkpoint {checkpoint_path}: {e}")
+            return {}
+
+    def _save_checkpoint(self, checkpoint, checkpoint_path):
+        """Atomically write completed translations so a crash never leaves a torn checkpoint"""
+        tmp_path = f"{checkpoint_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"updated": datetime.now().isoformat(), "translations": checkpoint}, f, ensure_ascii=False)
+        os.replace(tmp_path, checkpoint_path)
+        logger.info(f"Checkpoint saved: {len(checkpoint)} translated lines")
+
+    def _translate_sentence_with_delay(self, sentence, backend=None):
         """Translate a single sentence with human-like delays and error handling"""
+        backend = backend or self.backend
         original_text = sentence["text"].strip()
         if not original_text:
             return ""
@@ -243,25 +476,33 @@ class PDFLineExtractor:
         if len(original_text) < 2 or original_text.isdigit() or all(not c.isalnum() for c in original_text):
             return original_text
         
+        term_translations = sentence.get("term_translations")
+        if term_translations:
+            # Nothing but glossary terms left: no model call needed
+            protected_text = sentence["protected_text"].strip()
+            if not any(c.isalnum() for c in PLACEHOLDER_RE.sub("", protected_text)):
+                return Glossary.restore(protected_text, term_translations)[0]
+        
         # Preprocess text for better translation
-        processed_text = self._preprocess_for_translation(original_text)
+        processed_text = self._preprocess_for_translation(sentence["protected_text"] if term_translations else original_text)
         
-        # Human-like delay (0.1-0.5 seconds - much faster since it's local)
-        delay = random.uniform(0.1, 0.5)
-        time.sleep(delay)
+        # Human-like delay for rate-limited remote services (zero for local engines)
+        min_delay, max_delay = backend.request_delay
+        if max_delay:
+            time.sleep(random.uniform(min_delay, max_delay))
         
         try:
-            # No character limit needed for Argos Translate (handles long text well)
             # Translate the text with retry logic
             max_retries = 2
             for attempt in range(max_retries):
                 try:
-                    translated = argostranslate.translate.translate(processed_text, "en", "ar")
-                    
-                    # Additional short delay after successful translation
-                    time.sleep(random.uniform(0.1, 0.3))
-                    
-                    return translated
+                    translated_text = backend.translate(processed_text, "en", self.target_lang)
+                    if term_translations:
+                        translated_text, dropped = Glossary.restore(translated_text, term_translations)
+                        if dropped:
+                            logger.warning(f"Model dropped protected-term placeholders {dropped} in '{original_text[:50]}...'")
+                            self._dropped_terms.extend(dropped)
+                    return translated_text
                     
                 except Exception as e:
                     if attempt < max_retries - 1:
@@ -274,8 +515,8 @@ class PDFLineExtractor:
             
         except Exception as e:
             logger.error(f"Translation error for '{original_text[:50]}...': {e}")
-            # Return empty string to indicate failure
-            return ""
+            # Raise so a racing hedge attempt can still win; the line keeps its original text otherwise
+            raise
     
     def _group_words_into_lines(self, words, page_num):
         """Efficiently group words into lines using vertical clustering"""
@@ -486,7 +727,8 @@ class PDFLineExtractor:
         # Create directory if it doesn't exist
         os.makedirs(os.path.dirname(os.path.abspath(file_path)), exist_ok=True)
         
-        with open(file_path, 'w', encoding='utf-8') as f:
+        # Readers never see a half-written file when several jobs share an output name
+        with atomic_output(file_path) as temp_path, open(temp_path, 'w', encoding='utf-8') as f:
             # Use separators to minimize file size but keep it readable
             json.dump(data, f, indent=2, ensure_ascii=False)
     
@@ -520,7 +762,8 @@ class PDFLineExtractor:
                     page.draw_rect(rect, color=(0, 1, 0), fill=None, width=1.0, overlay=True)
             
             # Save with optimized compression
-            pdf_document.save(output_path, garbage=4, deflate=True)
+            with atomic_output(output_path) as temp_path:
+                pdf_document.save(temp_path, garbage=4, deflate=True)
             pdf_document.close()
             
             logger.info(f"Visualization saved: {output_path}")
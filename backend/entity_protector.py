@@ -0,0 +1,127 @@
+import os
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# en_core_web_sm is ~15x smaller and faster to load than en_core_web_lg with similar PERSON/ORG recall
+DEFAULT_ENTITY_MODEL = os.environ.get("ENTITY_MODEL", "en_core_web_sm")
+PROTECTED_LABELS = ("PERSON", "ORG")
+# Only the entity recognizer is needed; these components are never loaded
+EXCLUDED_COMPONENTS = ["tagger", "parser", "attribute_ruler", "lemmatizer", "senter", "morphologizer"]
+
+
+class EntityProtector:
+    """
+    Finds person and organization names with a spaCy pipeline so they can bypass translation.
+    The model loads once (lazily, never downloading anything), texts are processed with
+    nlp.pipe in batches, and results are memoised per text.
+    """
+
+    def __init__(self, model_name=None, labels=PROTECTED_LABELS, batch_size=256, cache_size=100000):
+        self.model_name = model_name or DEFAULT_ENTITY_MODEL
+        self.labels = set(labels)
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self._nlp = None
+        self._load_error = None
+        self._loaded = threading.Event()
+        self._load_lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.stats = {"texts": 0, "cache_hits": 0}
+
+    @property
+    def available(self):
+        """Whether the model is installed and loaded"""
+        return self._get_nlp() is not None
+
+    def warm_up(self):
+        """Start loading the model in the background so the first request doesn't pay for it"""
+        threading.Thread(target=self._get_nlp, daemon=True).start()
+
+    def _get_nlp(self):
+        if self._loaded.is_set():
+            return self._nlp
+        with self._load_lock:
+            if not self._loaded.is_set():
+                self._nlp = self._load()
+                self._loaded.set()
+        return self._nlp
+
+    def _load(self):
+        """Load the installed model; a missing spaCy or model disables protection instead of installing it"""
+        try:
+            import spacy
+            nlp = spacy.load(self.model_name, exclude=EXCLUDED_COMPONENTS)
+            logger.info(f"Loaded entity model {self.model_name} with pipes {nlp.pipe_names}")
+            return nlp
+        except ImportError:
+            self._load_error = "spaCy is not installed"
+        except OSError:
+            self._load_error = (f"spaCy model '{self.model_name}' is not installed "
+                                f"(install it with: python -m spacy download {self.model_name})")
+        logger.warning(f"Entity protection disabled: {self._load_error}")
+        return None
+
+    def describe(self):
+        """Entity stage summary for job metadata"""
+        return {"model": self.model_name, "labels": sorted(self.labels), "available": self._nlp is not None,
+                "error": self._load_error, **self.stats}
+
+    def entities(self, texts):
+        """Protected-label entity spans [(start, end, label), ...] for each text"""
+        texts = list(texts)
+        results = [None] * len(texts)
+        missing = {}
+        with self._cache_lock:
+            self.stats["texts"] += len(texts)
+            for index, text in enumerate(texts):
+                cached = self._cache.get(text)
+                if cached is not None:
+                    self._cache.move_to_end(text)
+                    self.stats["cache_hits"] += 1
+                    results[index] = cached
+                else:
+                    missing.setdefault(text, []).append(index)
+
+        nlp = self._get_nlp() if missing else None
+        if nlp is None:
+            for indexes in missing.values():
+                for index in indexes:
+                    results[index] = []
+            return results
+
+        unique_texts = list(missing)
+        found = []
+        for doc in nlp.pipe(unique_texts, batch_size=self.batch_size):
+            found.append([(ent.start_char, ent.end_char, ent.label_) for ent in doc.ents if ent.label_ in self.labels])
+
+        with self._cache_lock:
+            for text, spans in zip(unique_texts, found):
+                self._cache[text] = spans
+                for index in missing[text]:
+                    results[index] = spans
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return results
+
+    def is_name(self, text):
+        """Whether the whole text is a single protected entity"""
+        stripped = text.strip()
+        spans = self.entities([stripped])[0]
+        return len(spans) == 1 and spans[0][0] == 0 and spans[0][1] == len(stripped)
+
+
+_protectors = {}
+_protectors_lock = threading.Lock()
+
+
+def get_entity_protector(model_name=None):
+    """Shared protector per model, so the model is loaded once per process"""
+    model_name = model_name or DEFAULT_ENTITY_MODEL
+    with _protectors_lock:
+        if model_name not in _protectors:
+            _protectors[model_name] = EntityProtector(model_name)
+        return _protectors[model_name]
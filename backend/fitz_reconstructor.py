@@ -0,0 +1,270 @@
+"""
+Single-pass reconstruction with PyMuPDF.
+
+Text is written straight into a new content stream on each page of the opened
+text-removed document, which is then saved once. The reportlab engines instead
+build an overlay PDF, re-read it, write it to disk and merge it page by page.
+"""
+import json
+import math
+import fitz  # PyMuPDF
+from ar_pdf_reconstructor import process_arabic_text
+from text_layout import get_text_layout
+from pdf_reconstructor import BASELINE_TOLERANCE, atomic_output
+from font_registry import get_font_registry
+
+# MuPDF names of the Base-14 text fonts (not embedded, WinAnsi encoded)
+STANDARD_FONT_CODES = {
+    "Helvetica": "helv", "Helvetica-Bold": "hebo", "Helvetica-Oblique": "heit", "Helvetica-BoldOblique": "hebi",
+    "Times-Roman": "tiro", "Times-Bold": "tibo", "Times-Italic": "tiit", "Times-BoldItalic": "tibi",
+    "Courier": "cour", "Courier-Bold": "cobo", "Courier-Oblique": "coit", "Courier-BoldOblique": "cobi",
+}
+
+
+class PageFont:
+    """A font as used in content streams: resource name, metrics and encoding"""
+
+    def __init__(self, name, buffer=None, codec="cp1252", substitutes=()):
+        self.name = name
+        self.buffer = buffer
+        self.metrics = fitz.Font(fontbuffer=buffer) if buffer else fitz.Font(name)
+        # Base-14 fonts are simple fonts encoded with `codec`; font files are embedded as Identity-H CID fonts
+        self.simple = buffer is None
+        self.codec = codec
+        # Base-14 fonts tried for characters outside the codec (reportlab substitutes Symbol/ZapfDingbats the same way)
+        self.substitutes = substitutes
+        # char -> (font, hex code, advance at size 1); MuPDF metric lookups are slow enough to matter per glyph
+        self._glyphs = {}
+
+    def _glyph(self, char):
+        if not self.simple:
+            # MuPDF writes CID widths truncated to whole thousandths; advance the pen as readers will
+            advance = math.floor(self.metrics.glyph_advance(ord(char)) * 1000 + 1e-6) / 1000
+            return self, f"{self.metrics.has_glyph(ord(char)):04x}", advance
+        for font in (self,) + self.substitutes:
+            try:
+                return font, char.encode(font.codec).hex(), font.metrics.glyph_advance(ord(char))
+            except UnicodeEncodeError:
+                continue
+        return self, b"?".hex(), self.metrics.glyph_advance(ord("?"))
+
+    def characters(self):
+        """Characters drawn with this font so far (substitute-font characters excluded)"""
+        return [char for char, glyph in self._glyphs.items() if glyph[0] is self]
+
+    def encode(self, text):
+        """[(font, hex string, advance at size 1), ...] segments for text, split where a substitute font takes over"""
+        glyphs = self._glyphs
+        segments = []
+        for char in text:
+            glyph = glyphs.get(char)
+            if glyph is None:
+                glyph = glyphs[char] = self._glyph(char)
+            font, code, advance = glyph
+            if segments and segments[-1][0] is font:
+                segments[-1][1].append(code)
+                segments[-1][2] += advance
+            else:
+                segments.append([font, [code], advance])
+        return [(font, "".join(codes), advance) for font, codes, advance in segments]
+
+
+class FontSet:
+    """
+    Fonts used by one reconstruction. Faces are embedded when the document is saved, as one
+    cached subset of the glyphs actually drawn, shared by every page that uses them.
+    """
+
+    def __init__(self, standard_fonts=None):
+        self.registry = get_font_registry()
+        self.standard_fonts = standard_fonts
+        self._fonts = {}
+        # PageFont -> page numbers using it
+        self._pages = {}
+        self._substitutes = (PageFont("symb", codec="symbol"), PageFont("zadb", codec="zapfdingbats"))
+
+    def font(self, font_name):
+        """PageFont for a registry font name; font files come from the registry's memory, never from disk"""
+        if font_name not in self._fonts:
+            if font_name in STANDARD_FONT_CODES:
+                self._fonts[font_name] = PageFont(STANDARD_FONT_CODES[font_name], substitutes=self._substitutes)
+            else:
+                self._fonts[font_name] = PageFont(f"ELF{len(self._fonts)}", self.registry.font_buffer(font_name))
+        return self._fonts[font_name]
+
+    def english(self, is_bold, is_italic, source_font=""):
+        """Font chain for English runs: the standard-14 face, then Arial, then the other embedded families"""
+        return self.registry.chain("Arial", is_bold, is_italic, source_font, self.standard_fonts)
+
+    def arabic(self, is_bold, source_font=""):
+        """Font chain for translated lines: the standard-14 face for Latin-script text, then Noto Naskh"""
+        return self.registry.chain("Arabic", is_bold, False, source_font, self.standard_fonts)
+
+    def use(self, page, font):
+        """Note the font as used on the page; returns its resource name"""
+        self._pages.setdefault(font, set()).add(page.number)
+        return font.name
+
+    def embed(self, doc):
+        """Add every used font to its pages' resources; PyMuPDF stores identical font buffers once"""
+        font_names = {font: font_name for font_name, font in self._fonts.items()}
+        for font, page_numbers in self._pages.items():
+            buffer = None
+            if not font.simple:
+                buffer = self.registry.cid_subset(font_names[font], map(ord, font.characters()))
+            for page_number in sorted(page_numbers):
+                xref = doc[page_number].insert_font(fontname=font.name, fontbuffer=buffer)
+                if font.simple and font.codec != "cp1252":
+                    # MuPDF declares WinAnsiEncoding for every Base-14 font; Symbol and ZapfDingbats need their own
+                    doc.xref_set_key(xref, "Encoding", "null")
+
+
+def _color_operator(color):
+    """PDF fill color operator for an RGB or CMYK tuple (clamped), black otherwise"""
+    try:
+        if color and len(color) in (3, 4):
+            values = " ".join(f"{max(0, min(1, float(v))):g}" for v in color)
+            return f"{values} {'rg' if len(color) == 3 else 'k'}"
+    except (TypeError, ValueError):
+        pass
+    return "0 0 0 rg"
+
+
+class PageText:
+    """Text operators for one page, appended to it as a single new content stream"""
+
+    def __init__(self, page, fonts):
+        self.page = page
+        self.fonts = fonts
+        # PyMuPDF (top-down) page coordinates to PDF user space, honoring mediabox offsets and rotation
+        self.to_pdf = ~page.transformation_matrix
+        self.operators = []
+        self.color = None
+
+    def set_color(self, color):
+        operator = _color_operator(color)
+        if operator != self.color:
+            self.operators.append(operator)
+            self.color = operator
+
+    def run(self, font, font_size, pieces):
+        """
+        One text object for [(x, baseline_y, text), ...] in page coordinates; every piece starts
+        exactly at its x through TJ positioning numbers computed against the running pen.
+        """
+        origin = fitz.Point(pieces[0][0], pieces[0][1]) * self.to_pdf
+        code = [f"BT 1 0 0 1 {origin.x:g} {origin.y:g} Tm"]
+        current_font = None
+        items = []
+        pen = pieces[0][0]
+        for x, _, text in pieces:
+            adjustment = round((pen - x) * 1000 / font_size, 2)
+            for number, (segment_font, encoded, advance) in enumerate(font.encode(text)):
+                if segment_font is not current_font:
+                    if items:
+                        code.append(f"[{' '.join(items)}] TJ")
+                        items = []
+                    code.append(f"/{self.fonts.use(self.page, segment_font)} {font_size:g} Tf")
+                    current_font = segment_font
+                if adjustment and not number:
+                    items.append(f"{adjustment:g}")
+                    pen -= adjustment * font_size / 1000
+                items.append(f"<{encoded}>")
+                pen += advance * font_size
+        code.append(f"[{' '.join(items)}] TJ ET")
+        self.operators.append(" ".join(code))
+
+    def flush(self):
+        if not self.operators:
+            return
+        doc = self.page.parent
+        # Isolate the existing content's graphics state, then append ours after it
+        self.page.wrap_contents()
+        xref = doc.get_new_xref()
+        doc.update_object(xref, "<<>>")
+        doc.update_stream(xref, "\n".join(["q"] + self.operators + ["Q"]).encode("latin-1"))
+        kind, contents = doc.xref_get_key(self.page.xref, "Contents")
+        existing = contents.strip("[]") if kind == "array" else contents
+        doc.xref_set_key(self.page.xref, "Contents", f"[{existing} {xref} 0 R]")
+
+
+def _save(doc, fonts, output_pdf_path):
+    """Embed the used font subsets and write the document once"""
+    fonts.embed(doc)
+    with atomic_output(output_pdf_path) as temp_path:
+        doc.save(temp_path, garbage=1, deflate=True)
+    doc.close()
+
+
+def reconstruct_pdf_fitz(json_path, text_removed_pdf_path, output_pdf_path, standard_fonts=None):
+    """Write extracted characters straight onto the text-removed PDF and save it once"""
+    with open(json_path, 'r', encoding='utf-8') as json_file:
+        pages_data = json.load(json_file)
+
+    fonts = FontSet(standard_fonts)
+
+    def draw_run(text, run, style):
+        is_bold, is_italic, source_font, font_size, _ = style
+        for font_name, pieces in fonts.english(is_bold, is_italic, source_font).segment(run):
+            text.run(fonts.font(font_name), font_size, pieces)
+
+    doc = fitz.open(text_removed_pdf_path)
+    for page, page_data in zip(doc, pages_data):
+        text = PageText(page, fonts)
+        run, run_style = [], None
+        for char_data in page_data['characters']:
+            char = char_data['text']
+            font_size = char_data.get('size', 12)
+            if not char.strip() or not font_size:
+                continue
+
+            color = char_data.get('color', (0, 0, 0))
+            style = (bool(char_data.get('bold', False)), bool(char_data.get('italic', False)),
+                     char_data.get('original_font', ''), font_size, tuple(color) if color else None)
+            # pdfplumber's bottom is the baseline in top-down page coordinates
+            baseline = char_data['bottom']
+            if run and (style != run_style or abs(baseline - run[0][1]) > BASELINE_TOLERANCE):
+                draw_run(text, run, run_style)
+                run = []
+            if not run:
+                run_style = style
+                text.set_color(color)
+            run.append((char_data['x0'], baseline, char))
+        if run:
+            draw_run(text, run, run_style)
+        text.flush()
+
+    _save(doc, fonts, output_pdf_path)
+    print(f"PDF reconstructed: {output_pdf_path}")
+
+
+def reconstruct_pdf_from_line_db_fitz(json_path, base_pdf_path, output_pdf_path, standard_fonts=None):
+    """Write line database text straight onto the text-removed PDF and save it once"""
+    with open(json_path, 'r', encoding='utf-8') as json_file:
+        line_db = json.load(json_file)
+
+    sentences_by_page = {}
+    for sentence in line_db['sentences']:
+        sentences_by_page.setdefault(sentence['page'] - 1, []).append(sentence)
+
+    fonts = FontSet(standard_fonts)
+    layout = get_text_layout()
+    doc = fitz.open(base_pdf_path)
+    for page_num, sentences in sentences_by_page.items():
+        if not 0 <= page_num < len(doc):
+            continue
+        text = PageText(doc[page_num], fonts)
+        text.set_color((0, 0, 0))
+        # Same sizes, line breaks and positions as the reportlab overlay
+        placements = layout.layout_page(sentences, process_arabic_text,
+                                        lambda sentence: fonts.arabic(sentence.get('bold', False), sentence.get('font', '')))
+        for font_size, lines in placements:
+            for x, y, segments in lines:
+                for font_name, segment in segments:
+                    font = fonts.font(font_name)
+                    text.run(font, font_size, [(x, y, segment)])
+                    x += sum(advance for _, _, advance in font.encode(segment)) * font_size
+        text.flush()
+
+    _save(doc, fonts, output_pdf_path)
+    print(f"PDF reconstructed from line database: {output_pdf_path}")
@@ -0,0 +1,341 @@
+import io
+import os
+import logging
+import threading
+from collections import OrderedDict
+from fontTools import subset as font_subset
+from fontTools.ttLib import TTFont as FontToolsFont
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfbase.rl_codecs import RL_Codecs
+
+# "symbol" and "zapfdingbats" codecs for the standard substitute fonts
+RL_Codecs.register()
+
+logger = logging.getLogger(__name__)
+
+# Font files are looked up relative to this directory (the working directory's fonts/ by default)
+FONTS_DIR = os.environ.get("FONTS_DIR", "fonts")
+# Font subsets kept per process, keyed by (font, glyph set); the same document or language reuses its subsets
+SUBSET_CACHE_SIZE = int(os.environ.get("FONT_SUBSET_CACHE_SIZE", "256"))
+# Draw runs that the standard-14 fonts fully cover without embedding anything (0 = always embed)
+USE_STANDARD_FONTS = os.environ.get("STANDARD_FONTS", "1") == "1"
+
+# Registered font name -> font file under FONTS_DIR; names are the ones the reconstructors always used
+FONT_FACES = {
+    "Arial": "arial_ms/Arial Unicode MS.otf",
+    "Arial-Bold": "arial_ms/Arial Unicode MS Bold.otf",
+    "Arabic-Regular": "noto/NotoNaskhArabic-Regular.ttf",
+    "Arabic-Bold": "noto/NotoNaskhArabic-Bold.ttf",
+    "Inter": "inter/static/Inter_18pt-Regular.ttf",
+    "Inter-Bold": "inter/static/Inter_18pt-Bold.ttf",
+    "Inter-Italic": "inter/static/Inter_18pt-Italic.ttf",
+    "Inter-BoldItalic": "inter/static/Inter_18pt-BoldItalic.ttf",
+    "Poppins": "poppins/Poppins-Regular.ttf",
+    "Poppins-Bold": "poppins/Poppins-Bold.ttf",
+    "Poppins-Italic": "poppins/Poppins-Italic.ttf",
+    "Poppins-BoldItalic": "poppins/Poppins-BoldItalic.ttf",
+}
+
+# Family -> {(bold, italic): font name}; Helvetica is built into every PDF reader and never loaded
+FONT_FAMILIES = {
+    "Arial": {(False, False): "Arial", (True, False): "Arial-Bold",
+              (False, True): "Arial-Italic", (True, True): "Arial-BoldItalic"},
+    "Arabic": {(False, False): "Arabic-Regular", (True, False): "Arabic-Bold"},
+    "Inter": {(False, False): "Inter", (True, False): "Inter-Bold",
+              (False, True): "Inter-Italic", (True, True): "Inter-BoldItalic"},
+    "Poppins": {(False, False): "Poppins", (True, False): "Poppins-Bold",
+                (False, True): "Poppins-Italic", (True, True): "Poppins-BoldItalic"},
+    "Helvetica": {(False, False): "Helvetica", (True, False): "Helvetica-Bold",
+                  (False, True): "Helvetica-Oblique", (True, True): "Helvetica-BoldOblique"},
+    "Times": {(False, False): "Times-Roman", (True, False): "Times-Bold",
+              (False, True): "Times-Italic", (True, True): "Times-BoldItalic"},
+    "Courier": {(False, False): "Courier", (True, False): "Courier-Bold",
+                (False, True): "Courier-Oblique", (True, True): "Courier-BoldOblique"},
+}
+STANDARD_FAMILIES = ("Helvetica", "Times", "Courier")
+STANDARD_FONTS = {name for family in STANDARD_FAMILIES for name in FONT_FAMILIES[family].values()}
+# Standard-14 text is WinAnsi encoded; Symbol and ZapfDingbats take the rest, as reportlab substitutes them
+STANDARD_ENCODINGS = ("cp1252", "symbol", "zapfdingbats")
+# Characters the standard-14 fonts can draw
+STANDARD_COVERAGE = frozenset(ord(char) for encoding in STANDARD_ENCODINGS
+                              for char in bytes(range(32, 256)).decode(encoding, "ignore"))
+# Embedded families tried, in order, for characters the requested family lacks (widest coverage first)
+FALLBACK_FAMILIES = ("Arial", "Inter", "Arabic", "Poppins")
+# Drawn for characters no font covers
+REPLACEMENT_CHARACTER = "?"
+SERIF_HINTS = ("times", "serif", "roman", "georgia", "garamond", "cambria", "minion", "book")
+MONOSPACE_HINTS = ("courier", "mono", "consol", "code")
+
+
+def build_cid_subset(font_data, codepoints):
+    """
+    Subset a font file to the glyphs of the given code points, keeping glyph ids unchanged so
+    Identity-H content streams stay valid. Text is shaped before drawing, so layout tables are dropped.
+    """
+    options = font_subset.Options()
+    options.retain_gids = True
+    options.layout_features = []
+    options.hinting = False
+    options.notdef_outline = True
+    font = FontToolsFont(io.BytesIO(font_data), lazy=True)
+    subsetter = font_subset.Subsetter(options)
+    subsetter.populate(unicodes=codepoints)
+    subsetter.subset(font)
+    output = io.BytesIO()
+    font.save(output)
+    return output.getvalue()
+
+
+def standard_family(source_font=""):
+    """Standard-14 family closest to a source PDF font name (serif, monospace or sans)"""
+    source_font = (source_font or "").lower()
+    if "sans" not in source_font and any(hint in source_font for hint in SERIF_HINTS):
+        return "Times"
+    if any(hint in source_font for hint in MONOSPACE_HINTS):
+        return "Courier"
+    return "Helvetica"
+
+
+class FontChain:
+    """
+    Fonts for one style, best first, with their cmap coverage. Text is split into script runs:
+    letters go to the first font covering them, while spaces, digits, punctuation and combining
+    marks stay in the current run's font when it has them. Each character costs a few set lookups.
+    """
+
+    def __init__(self, registry, coverage, last_resort):
+        self.registry = registry
+        # font name -> covered code points, in preference order
+        self.coverage = coverage
+        # Standard-14 font drawing whatever no font covers (as REPLACEMENT_CHARACTER)
+        self.last_resort = last_resort
+        # glyph text -> (first font drawing it, text to draw); idempotent, so shared across threads unlocked
+        self._picked = {}
+
+    def _draws(self, font_name, text):
+        coverage = self.coverage[font_name]
+        return all(ord(char) in coverage for char in text) and self.registry.load(font_name)
+
+    def pick(self, text, current=None):
+        """(font name, text to draw) for one glyph; characters no font covers become REPLACEMENT_CHARACTER"""
+        if current is not None and not text.isalpha() and self._draws(current, text):
+            return current, text
+        picked = self._picked.get(text)
+        if picked is None:
+            picked = next(((font_name, text) for font_name in self.coverage if self._draws(font_name, text)), None)
+            if picked is None:
+                coverage = self.coverage[self.last_resort]
+                picked = (self.last_resort,
+                          "".join(char if ord(char) in coverage else REPLACEMENT_CHARACTER for char in text))
+            self._picked[text] = picked
+        return picked
+
+    def segment(self, glyphs):
+        """Split [(x, y, text), ...] glyphs into [(font name, glyphs), ...] runs"""
+        runs = []
+        current = None
+        for x, y, text in glyphs:
+            font_name, text = self.pick(text, current)
+            if font_name != current:
+                runs.append((font_name, []))
+                current = font_name
+            runs[-1][1].append((x, y, text))
+        return runs
+
+    def segment_text(self, text):
+        """Split text into [(font name, text), ...] runs"""
+        return [(font_name, "".join(glyph[2] for glyph in glyphs))
+                for font_name, glyphs in self.segment([(0, 0, char) for char in text])]
+
+
+def style_fallbacks(is_bold, is_italic):
+    """Styles to try for a request, best first: exact, keep bold, keep italic, regular"""
+    styles = [(is_bold, is_italic), (is_bold, False), (False, is_italic), (False, False)]
+    return list(dict.fromkeys(styles))
+
+
+class FontRegistry:
+    """
+    Process-wide font registry for reportlab and PyMuPDF.
+    Each face is parsed at most once per process, on first use (or by warm_up), and registered
+    with reportlab's pdfmetrics under a lock; later lookups are plain dictionary reads.
+    Subsets embedded in outputs are cached by glyph set, so repeated jobs skip rebuilding them.
+    """
+
+    def __init__(self, fonts_dir=None, faces=None, families=None, subset_cache_size=None):
+        self.fonts_dir = fonts_dir or FONTS_DIR
+        self.faces = dict(FONT_FACES if faces is None else faces)
+        self.families = FONT_FAMILIES if families is None else families
+        # font name -> True once registered, False if missing or unreadable
+        self._loaded = {name: True for name in STANDARD_FONTS}
+        self._buffers = {}
+        self._resolved = {}
+        self._coverage = {}
+        self._chains = {}
+        self._lock = threading.Lock()
+        self.subset_cache_size = SUBSET_CACHE_SIZE if subset_cache_size is None else subset_cache_size
+        self._subsets = OrderedDict()
+        self._subsets_lock = threading.Lock()
+        self.stats = {"subset_builds": 0, "subset_hits": 0}
+
+    def path(self, font_name):
+        """Font file for a registered name, or None for standard or unknown fonts"""
+        relative_path = self.faces.get(font_name)
+        return os.path.join(self.fonts_dir, relative_path) if relative_path else None
+
+    def load(self, font_name):
+        """Parse and register one face (once); returns whether it is usable"""
+        loaded = self._loaded.get(font_name)
+        if loaded is not None:
+            return loaded
+        with self._lock:
+            if font_name not in self._loaded:
+                self._loaded[font_name] = self._register(font_name)
+            return self._loaded[font_name]
+
+    def _register(self, font_name):
+        font_path = self.path(font_name)
+        if not font_path or not os.path.exists(font_path):
+            return False
+        try:
+            font = TTFont(font_name, font_path)
+            # reportlab builds a subset per 256-glyph chunk on every save; serve repeats from the cache
+            make_subset = font.face.makeSubset
+            font.face.makeSubset = lambda subset: self.subset(
+                (font_name, "reportlab", tuple(subset)), lambda: make_subset(subset))
+            pdfmetrics.registerFont(font)
+            logger.info(f"Registered font {font_name} from {font_path}")
+            return True
+        except Exception as e:
+            logger.warning(f"Error registering font {font_name} from {font_path}: {e}")
+            return False
+
+    def has_style(self, family, is_bold=False, is_italic=False):
+        """Whether the family has its own face for exactly this style"""
+        font_name = self.families.get(family, {}).get((bool(is_bold), bool(is_italic)))
+        return bool(font_name) and self.load(font_name)
+
+    def resolve(self, family, is_bold=False, is_italic=False):
+        """Registered font name for a style: the closest face of the family, else the matching Helvetica"""
+        key = (family, bool(is_bold), bool(is_italic))
+        font_name = self._resolved.get(key)
+        if font_name is None:
+            faces = self.families.get(family, {})
+            font_name = next((faces[style] for style in style_fallbacks(key[1], key[2])
+                              if style in faces and self.load(faces[style])), None)
+            font_name = font_name or self.families["Helvetica"][(key[1], key[2])]
+            self._resolved[key] = font_name
+        return font_name
+
+    def face(self, family, is_bold=False, is_italic=False):
+        """Closest face of an embedded family for a style whose file exists (not parsed yet), or None"""
+        faces = self.families.get(family, {})
+        for style in style_fallbacks(bool(is_bold), bool(is_italic)):
+            font_name = faces.get(style)
+            if (font_name and font_name not in STANDARD_FONTS and self._loaded.get(font_name) is not False
+                    and os.path.exists(self.path(font_name) or "")):
+                return font_name
+        return None
+
+    def coverage(self, font_name):
+        """Code points a font can draw: its cmap (read once, without parsing glyphs) or the standard encodings"""
+        if font_name in STANDARD_FONTS:
+            return STANDARD_COVERAGE
+        coverage = self._coverage.get(font_name)
+        if coverage is None:
+            try:
+                coverage = frozenset(FontToolsFont(self.path(font_name), lazy=True)["cmap"].getBestCmap())
+            except Exception as e:
+                logger.warning(f"Cannot read the cmap of {font_name}: {e}")
+                coverage = frozenset()
+            self._coverage[font_name] = coverage
+        return coverage
+
+    def chain(self, family, is_bold=False, is_italic=False, source_font="", standard_fonts=None):
+        """
+        FontChain for a style: the standard-14 face (unless disabled) so covered text embeds nothing,
+        then the family's own face, then the other embedded families, then the standard face as last resort.
+        """
+        use_standard = USE_STANDARD_FONTS if standard_fonts is None else standard_fonts
+        standard = self.families[standard_family(source_font)][(bool(is_bold), bool(is_italic))]
+        key = (family, bool(is_bold), bool(is_italic), standard, use_standard)
+        chain = self._chains.get(key)
+        if chain is None:
+            font_names = [standard] if use_standard else []
+            font_names += [self.face(name, is_bold, is_italic) for name in (family,) + FALLBACK_FAMILIES]
+            font_names.append(standard)
+            chain = FontChain(self, {name: self.coverage(name) for name in dict.fromkeys(font_names) if name}, standard)
+            self._chains[key] = chain
+        return chain
+
+    def font_buffer(self, font_name):
+        """Font file contents for a loaded face, for engines that embed fonts themselves (None for standard fonts)"""
+        if font_name in STANDARD_FONTS or not self.load(font_name):
+            return None
+        data = self._buffers.get(font_name)
+        if data is None:
+            # reportlab keeps the file it parsed; share those bytes instead of reading the file again
+            data = getattr(pdfmetrics.getFont(font_name).face, "_ttf_data", None)
+            if data is None:
+                with open(self.path(font_name), "rb") as font_file:
+                    data = font_file.read()
+            self._buffers[font_name] = data
+        return data
+
+    def subset(self, key, build):
+        """Cached subset bytes for a (font, kind, glyph set) key; build() runs on a miss, outside the lock"""
+        with self._subsets_lock:
+            data = self._subsets.get(key)
+            if data is not None:
+                self._subsets.move_to_end(key)
+                self.stats["subset_hits"] += 1
+                return data
+        data = build()
+        with self._subsets_lock:
+            self.stats["subset_builds"] += 1
+            if self.subset_cache_size > 0:
+                self._subsets[key] = data
+                while len(self._subsets) > self.subset_cache_size:
+                    self._subsets.popitem(last=False)
+        return data
+
+    def cid_subset(self, font_name, codepoints):
+        """Glyph-id preserving subset of a face for the given code points (cached)"""
+        codepoints = tuple(sorted(set(codepoints)))
+        return self.subset((font_name, "cid", codepoints),
+                           lambda: build_cid_subset(self.font_buffer(font_name), codepoints))
+
+    def clear_subsets(self):
+        with self._subsets_lock:
+            self._subsets.clear()
+
+    def warm_up(self, families=None, background=False):
+        """Load every face of the given families (all by default) so reconstruction never touches font files"""
+        if background:
+            threading.Thread(target=self.warm_up, args=(families,), daemon=True).start()
+            return
+        for family in families or self.families:
+            for font_name in self.families.get(family, {}).values():
+                if self.load(font_name):
+                    self.coverage(font_name)
+
+    def describe(self):
+        """Loaded and missing faces, for status output"""
+        loaded = sorted(name for name, ok in self._loaded.items() if ok and name not in STANDARD_FONTS)
+        missing = sorted(name for name, ok in self._loaded.items() if not ok)
+        return {"fonts_dir": self.fonts_dir, "loaded": loaded, "missing": missing,
+                "cached_subsets": len(self._subsets), **self.stats}
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_font_registry():
+    """Shared registry, so each face is parsed once per process"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = FontRegistry()
+        return _registry
@@ -0,0 +1,203 @@
+import os
+import re
+import json
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Protected terms travel through the model as opaque tokens like __T3__
+PLACEHOLDER_RE = re.compile(r'__T\d+__')
+# Engines sometimes space out or lowercase the token, e.g. "_ _ t 3 _ _"
+RESTORE_RE = re.compile(r'_\s*_\s*[Tt]\s*(\d+)\s*_\s*_')
+
+
+def placeholder(index):
+    return f"__T{index}__"
+
+
+def protect_spans(text, spans):
+    """
+    Replace sorted, non-overlapping (start, end, replacement) spans with placeholders.
+    Returns (protected_text, {placeholder: replacement}).
+    """
+    pieces = []
+    replacements = {}
+    last = 0
+    for number, (start, end, replacement) in enumerate(spans):
+        token = placeholder(number)
+        pieces.append(text[last:start])
+        pieces.append(token)
+        replacements[token] = replacement
+        last = end
+    pieces.append(text[last:])
+    return "".join(pieces), replacements
+
+
+class Glossary:
+    """
+    Term base compiled into an Aho-Corasick automaton.
+    A whole document is scanned in one pass (O(characters + matches), independent of
+    the number of terms); matches are whole words, leftmost-longest and non-overlapping.
+    """
+
+    def __init__(self, terms, case_sensitive=False):
+        self.case_sensitive = case_sensitive
+        # Later entries win when the same source term appears twice
+        normalized = {}
+        for source, target in terms:
+            source = " ".join(source.split())
+            if source and target:
+                normalized[self._fold(source)[0]] = target.strip()
+        self.sources = list(normalized)
+        self.targets = list(normalized.values())
+        self.lengths = [len(source) for source in self.sources]
+        self._build(self.sources)
+
+    def __len__(self):
+        return len(self.sources)
+
+    @classmethod
+    def from_file(cls, path, source_lang="en", target_lang="ar", case_sensitive=False):
+        """Load a glossary from JSON ({"term": "translation"}) or CSV (see tm_io.iter_csv_pairs)"""
+        if os.path.splitext(path)[1].lower() == ".json":
+            with open(path, 'r', encoding='utf-8') as f:
+                terms = list(json.load(f).items())
+        else:
+            from tm_io import iter_csv_pairs
+            terms = iter_csv_pairs(path, source_lang, target_lang)
+        glossary = cls(terms, case_sensitive=case_sensitive)
+        logger.info(f"Loaded glossary with {len(glossary)} terms from {path}")
+        return glossary
+
+    def _fold(self, text):
+        """Case-folded text, plus each folded character's offset in text when folding changed the length"""
+        if self.case_sensitive:
+            return text, None
+        folded, offsets = text.lower(), None
+        if len(folded) != len(text):
+            # A few characters lowercase to two (e.g. 'İ'): fold character by character and map offsets back
+            pieces = [char.lower() for char in text]
+            folded = "".join(pieces)
+            offsets = [index for index, piece in enumerate(pieces) for _ in piece]
+        # Whole-string lowercasing picks final sigma by context, character folding never does
+        return folded.replace("ς", "σ"), offsets
+
+    def _build(self, sources):
+        # Trie as one transition dict per state; out holds the term ending at a state, out_link the
+        # nearest suffix state that also ends a term, so all matches are found without copying lists
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [-1]
+        for term_id, source in enumerate(sources):
+            state = 0
+            for char in source:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(-1)
+                state = next_state
+            self._out[state] = term_id
+
+        self._out_link = [0] * len(self._goto)
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                if state:
+                    fallback = self._fail[state]
+                    while fallback and char not in self._goto[fallback]:
+                        fallback = self._fail[fallback]
+                    self._fail[next_state] = self._goto[fallback].get(char, 0)
+                suffix = self._fail[next_state]
+                self._out_link[next_state] = suffix if self._out[suffix] >= 0 else self._out_link[suffix]
+
+    def _raw_matches(self, text):
+        """Yield (start, end, term_id) for every term occurrence, including overlapping ones"""
+        goto, fail, out, out_link = self._goto, self._fail, self._out, self._out_link
+        lengths = self.lengths
+        folded, offsets = self._fold(text)
+        state = 0
+        for position, char in enumerate(folded):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            match_state = state if out[state] >= 0 else out_link[state]
+            while match_state:
+                term_id = out[match_state]
+                start = position + 1 - lengths[term_id]
+                if offsets is None:
+                    yield start, position + 1, term_id
+                else:
+                    yield offsets[start], offsets[position] + 1, term_id
+                match_state = out_link[match_state]
+
+    def find(self, text):
+        """Whole-word, leftmost-longest, non-overlapping matches as (start, end, term_id)"""
+        candidates = [
+            (start, end, term_id) for start, end, term_id in self._raw_matches(text)
+            if (start == 0 or not text[start - 1].isalnum()) and (end == len(text) or not text[end].isalnum())
+        ]
+        candidates.sort(key=lambda match: (match[0], match[0] - match[1]))
+        matches = []
+        covered = 0
+        for start, end, term_id in candidates:
+            if start >= covered:
+                matches.append((start, end, term_id))
+                covered = end
+        return matches
+
+    def scan(self, texts):
+        """Matches for each of `texts`, found in a single pass over the joined document"""
+        texts = list(texts)
+        # Newlines never occur inside a term, so they reset the automaton between texts
+        document = "\n".join(text.replace("\n", " ") for text in texts)
+        per_text = [[] for _ in texts]
+        starts = []
+        offset = 0
+        for text in texts:
+            starts.append(offset)
+            offset += len(text) + 1
+
+        index = 0
+        for start, end, term_id in self.find(document):
+            while index + 1 < len(starts) and starts[index + 1] <= start:
+                index += 1
+            per_text[index].append((start - starts[index], end - starts[index], term_id))
+        return per_text
+
+    def protect(self, text, matches):
+        """Replace matched terms with placeholders; returns (protected_text, {placeholder: translation})"""
+        return protect_spans(text, [(start, end, self.targets[term_id]) for start, end, term_id in matches])
+
+    @staticmethod
+    def restore(translated, translations):
+        """Substitute approved translations for placeholders; returns (text, placeholders the model dropped)"""
+        found = set()
+
+        def substitute(match):
+            token = placeholder(int(match.group(1)))
+            if token not in translations:
+                return match.group(0)
+            found.add(token)
+            return translations[token]
+
+        restored = RESTORE_RE.sub(substitute, translated)
+        return restored, [token for token in translations if token not in found]
+
+
+_glossaries = {}
+
+
+def load_glossary(path, source_lang="en", target_lang="ar"):
+    """Compiled glossary for a file, rebuilt only when the file changes"""
+    key = (os.path.abspath(path), source_lang, target_lang)
+    mtime = os.path.getmtime(path)
+    cached = _glossaries.get(key)
+    if cached is None or cached[0] != mtime:
+        cached = _glossaries[key] = (mtime, Glossary.from_file(path, source_lang, target_lang))
+    return cached[1]
@@ -0,0 +1,290 @@
+import os
+import re
+import glob
+import gettext
+import logging
+import argparse
+from collections import Counter
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Trigram counts built from a real corpus (see build_profiles); without them only the seed text below is used
+PROFILES_PATH = os.environ.get("LANGUAGE_PROFILES",
+                               os.path.join(os.path.dirname(os.path.abspath(__file__)), "language_profiles.npz"))
+# Add-k smoothing of the trigram counts
+PROFILE_SMOOTHING = 0.5
+# gettext catalogs of names and keyboard layouts rather than sentences
+SKIP_CATALOGS = re.compile(r'^(iso_|xkeyboard)')
+# Words, for the minimum length of a line worth scoring (identifiers and labels are too short to tell apart)
+WORD_RE = re.compile(r'[^\W\d_]{2,}')
+CATALOG_NOISE_RE = re.compile(r'%[-#0-9.*lhzjt]*[a-zA-Z]|\{[^}]*\}|<[^>]*>|&')
+
+# Unicode script of every code point, as sorted (first code point, script) ranges
+SCRIPT_RANGES = [
+    (0x0000, "other"), (0x0030, "digit"), (0x003A, "other"), (0x0041, "latin"), (0x005B, "other"),
+    (0x0061, "latin"), (0x007B, "other"), (0x00C0, "latin"), (0x0250, "other"), (0x0370, "greek"),
+    (0x0400, "cyrillic"), (0x0530, "other"), (0x0590, "hebrew"), (0x0600, "arabic"), (0x0660, "digit"),
+    (0x066A, "arabic"), (0x06F0, "digit"), (0x06FA, "arabic"), (0x0780, "other"), (0x08A0, "arabic"),
+    (0x0900, "indic"), (0x0E00, "thai"), (0x0E80, "other"), (0x1E00, "latin"), (0x1F00, "greek"),
+    (0x2000, "other"), (0x3040, "cjk"), (0x3100, "other"), (0x4E00, "cjk"), (0xA000, "other"),
+    (0xAC00, "hangul"), (0xD7B0, "other"), (0xFB50, "arabic"), (0xFE00, "other"), (0xFE70, "arabic"),
+    (0xFF00, "other"),
+]
+SCRIPTS = sorted({script for _, script in SCRIPT_RANGES})
+_SCRIPT_STARTS = np.array([start for start, _ in SCRIPT_RANGES], dtype=np.uint32)
+_SCRIPT_IDS = np.array([SCRIPTS.index(script) for _, script in SCRIPT_RANGES], dtype=np.int64)
+NON_LETTER_SCRIPTS = {"other", "digit"}
+_NON_LETTER_IDS = [SCRIPTS.index(script) for script in NON_LETTER_SCRIPTS]
+# Non-Latin scripts are identified at script level
+SCRIPT_LANGUAGES = {"arabic": "ar", "cyrillic": "ru", "greek": "el", "hebrew": "he", "cjk": "zh",
+                    "hangul": "ko", "indic": "hi", "thai": "th"}
+
+# Seed text for the Latin-script trigram profiles (added to the corpus counts)
+LATIN_PROFILES = {
+    "en": "The company reported strong results for the year and the board approved the annual report. "
+          "This document describes the terms and conditions of the service agreement between the parties. "
+          "Please read the following instructions carefully before you install the software on your computer. "
+          "We are committed to providing our customers with the highest quality products and services. "
+          "The total amount shown on this invoice should be paid within thirty days of the date of issue. "
+          "Revenue increased compared with the previous quarter, while operating costs remained stable.",
+    "fr": "La société a publié de bons résultats pour l'année et le conseil a approuvé le rapport annuel. "
+          "Ce document décrit les conditions générales du contrat de service entre les parties. "
+          "Veuillez lire attentivement les instructions suivantes avant d'installer le logiciel sur votre ordinateur. "
+          "Nous nous engageons à offrir à nos clients des produits et des services de la plus haute qualité. "
+          "Le montant total indiqué sur cette facture doit être payé dans les trente jours suivant la date d'émission. "
+          "Le chiffre d'affaires a augmenté par rapport au trimestre précédent, tandis que les coûts sont restés stables.",
+    "de": "Das Unternehmen meldete starke Ergebnisse für das Jahr und der Vorstand genehmigte den Jahresbericht. "
+          "Dieses Dokument beschreibt die allgemeinen Bedingungen des Dienstleistungsvertrags zwischen den Parteien. "
+          "Bitte lesen Sie die folgenden Anweisungen sorgfältig durch, bevor Sie die Software auf Ihrem Computer installieren. "
+          "Wir verpflichten uns, unseren Kunden Produkte und Dienstleistungen von höchster Qualität anzubieten. "
+          "Der auf dieser Rechnung angegebene Gesamtbetrag ist innerhalb von dreißig Tagen nach dem Ausstellungsdatum zu zahlen. "
+          "Der Umsatz stieg im Vergleich zum vorherigen Quartal, während die Betriebskosten stabil blieben.",
+    "es": "La empresa presentó buenos resultados para el año y la junta aprobó el informe anual. "
+          "Este documento describe los términos y condiciones del contrato de servicio entre las partes. "
+          "Por favor, lea atentamente las siguientes instrucciones antes de instalar el programa en su ordenador. "
+          "Nos comprometemos a ofrecer a nuestros clientes productos y servicios de la más alta calidad. "
+          "El importe total que figura en esta factura debe pagarse dentro de los treinta días siguientes a la fecha de emisión. "
+          "Los ingresos aumentaron en comparación con el trimestre anterior, mientras que los costes se mantuvieron estables.",
+    "it": "La società ha registrato ottimi risultati per l'anno e il consiglio ha approvato la relazione annuale. "
+          "Questo documento descrive i termini e le condizioni del contratto di servizio tra le parti. "
+          "Si prega di leggere attentamente le seguenti istruzioni prima di installare il software sul proprio computer. "
+          "Ci impegniamo a offrire ai nostri clienti prodotti e servizi della massima qualità. "
+          "L'importo totale indicato in questa fattura deve essere pagato entro trenta giorni dalla data di emissione. "
+          "I ricavi sono aumentati rispetto al trimestre precedente, mentre i costi operativi sono rimasti stabili.",
+    "pt": "A empresa apresentou bons resultados no ano e o conselho aprovou o relatório anual. "
+          "Este documento descreve os termos e condições do contrato de serviço entre as partes. "
+          "Por favor, leia atentamente as seguintes instruções antes de instalar o programa no seu computador. "
+          "Estamos empenhados em oferecer aos nossos clientes produtos e serviços da mais alta qualidade. "
+          "O valor total indicado nesta fatura deve ser pago no prazo de trinta dias a contar da data de emissão. "
+          "As receitas aumentaram em relação ao trimestre anterior, enquanto os custos operacionais se mantiveram estáveis.",
+    "nl": "Het bedrijf rapporteerde sterke resultaten voor het jaar en de raad keurde het jaarverslag goed. "
+          "Dit document beschrijft de algemene voorwaarden van de dienstverleningsovereenkomst tussen de partijen. "
+          "Lees de volgende instructies zorgvuldig door voordat u de software op uw computer installeert. "
+          "Wij streven ernaar onze klanten producten en diensten van de hoogste kwaliteit te bieden. "
+          "Het totaalbedrag op deze factuur moet binnen dertig dagen na de datum van uitgifte worden betaald. "
+          "De omzet steeg ten opzichte van het vorige kwartaal, terwijl de bedrijfskosten stabiel bleven.",
+}
+
+HASH_BUCKETS = 1 << 14
+_TRIGRAM_MIX = np.uint64(0x9E3779B97F4A7C15)
+
+
+def _codepoints(texts):
+    """All texts as one code point array, plus each text's start offset"""
+    lengths = np.fromiter(map(len, texts), dtype=np.int64, count=len(texts))
+    codes = np.frombuffer("".join(texts).encode("utf-32-le"), dtype=np.uint32)
+    return codes, np.cumsum(lengths) - lengths, lengths
+
+
+def _script_ids(codes):
+    return _SCRIPT_IDS[np.searchsorted(_SCRIPT_STARTS, codes, side="right") - 1]
+
+
+def _trigram_buckets(texts):
+    """Hashed character trigrams of lowercased letters (everything else a space), with each text's trigram count"""
+    codes, starts, lengths = _codepoints([f" {text.lower()} " for text in texts])
+    codes = np.where(np.isin(_script_ids(codes), _NON_LETTER_IDS), 32, codes).astype(np.uint64)
+    windows = np.maximum(lengths - 2, 0)
+    if not windows.sum():
+        return np.zeros(0, dtype=np.int64), windows
+    # Windows must not span two texts: take each text's own trigram start positions only
+    positions = np.repeat(starts - (np.cumsum(windows) - windows), windows) + np.arange(windows.sum())
+    packed = (codes[positions] << np.uint64(42)) | (codes[positions + 1] << np.uint64(21)) | codes[positions + 2]
+    return ((packed * _TRIGRAM_MIX) >> np.uint64(50)).astype(np.int64), windows
+
+
+def trigram_counts(texts_by_language):
+    """Hashed trigram counts, one row per language of {language: [text, ...]}, languages sorted"""
+    languages = sorted(texts_by_language)
+    counts = np.zeros((len(languages), HASH_BUCKETS), dtype=np.int64)
+    for row, language in enumerate(languages):
+        buckets, _ = _trigram_buckets(list(texts_by_language[language]))
+        counts[row] = np.bincount(buckets, minlength=HASH_BUCKETS)
+    return languages, counts
+
+
+def _profile_table(path=None):
+    """Log-probability of each hashed trigram per Latin-script language: seed text plus corpus counts, smoothed"""
+    languages, counts = trigram_counts({language: [text] for language, text in LATIN_PROFILES.items()})
+    path = PROFILES_PATH if path is None else path
+    if path and os.path.exists(path):
+        with np.load(path) as stored:
+            for language, row in zip(stored["languages"].tolist(), stored["counts"]):
+                if language in languages:
+                    counts[languages.index(language)] += row
+                else:
+                    languages.append(language)
+                    counts = np.vstack([counts, row])
+    else:
+        # Seed-only profiles can't separate languages reliably; the margin keeps nearly every line as source
+        logger.warning(f"No language profiles at {path}; Latin-script lines will be treated as the source language")
+    table = counts + PROFILE_SMOOTHING
+    return languages, np.log(table / table.sum(axis=1, keepdims=True))
+
+
+class LanguageIdentifier:
+    """
+    Lightweight language ID for routing lines before translation.
+    Scripts are counted for all lines in one vectorized pass; Latin-script lines are then
+    scored against per-language character trigram profiles (naive Bayes over hashed trigrams).
+    Only confident calls leave the source language: short, mixed-script or ambiguous lines
+    are assumed to be in the source language and go to the model.
+    """
+
+    def __init__(self, source_lang="en", target_lang="ar", min_letters=20, min_words=4, margin=0.7,
+                 min_script_share=0.8, profiles_path=None):
+        self.source_lang = source_lang
+        self.target_lang = target_lang
+        self.min_letters = min_letters
+        self.min_words = min_words
+        # Minimum per-trigram log-likelihood advantage before overriding the source language; with the corpus
+        # profiles and min_words, no line of the README, the sample PDF or ~29k stdlib docstring lines is flagged
+        self.margin = margin
+        # Share of a line's letters a non-Latin script needs before the line counts as that script's language
+        self.min_script_share = min_script_share
+        self.languages, self._log_probs = _profile_table(profiles_path)
+
+    def detect(self, texts):
+        """Language code per text: a Latin-script language, a script-level code, or "none" for no letters"""
+        texts = list(texts)
+        if not texts:
+            return []
+        codes, starts, lengths = _codepoints(texts)
+        script_ids = _script_ids(codes)
+        owners = np.repeat(np.arange(len(texts)), lengths)
+        counts = np.zeros((len(texts), len(SCRIPTS)), dtype=np.int64)
+        np.add.at(counts, (owners, script_ids), 1)
+        counts[:, _NON_LETTER_IDS] = 0
+
+        letters = counts.sum(axis=1)
+        dominant = [SCRIPTS[i] for i in counts.argmax(axis=1)]
+        share = counts.max(axis=1) / np.maximum(letters, 1)
+        detected = [("none" if not n else
+                     SCRIPT_LANGUAGES.get(script, self.source_lang) if fraction >= self.min_script_share else
+                     self.source_lang)
+                    for script, n, fraction in zip(dominant, letters, share)]
+
+        # Score only Latin lines long enough to tell apart
+        latin = [i for i, (script, n) in enumerate(zip(dominant, letters))
+                 if script == "latin" and n >= self.min_letters and len(WORD_RE.findall(texts[i])) >= self.min_words]
+        if latin:
+            buckets, windows = _trigram_buckets([texts[i] for i in latin])
+            scores = np.add.reduceat(self._log_probs[:, buckets], np.cumsum(windows) - windows, axis=1)
+            source_index = self.languages.index(self.source_lang) if self.source_lang in self.languages else None
+            for column, i in enumerate(latin):
+                best = int(scores[:, column].argmax())
+                if source_index is None:
+                    detected[i] = self.languages[best]
+                elif (scores[best, column] - scores[source_index, column]) / windows[column] > self.margin:
+                    detected[i] = self.languages[best]
+        return detected
+
+    def route(self, texts):
+        """(language, reason) per text; reason is None when the text should go to the model"""
+        routes = []
+        for language in self.detect(texts):
+            if language == self.source_lang:
+                routes.append((language, None))
+            elif language == "none":
+                routes.append((language, "no_text"))
+            elif language == self.target_lang:
+                routes.append((language, "already_target_language"))
+            else:
+                routes.append((language, "unsupported_language"))
+        return routes
+
+    @staticmethod
+    def summarize(routes):
+        """Per-language and per-route counts for job metadata"""
+        return {
+            "languages": dict(Counter(language for language, _ in routes)),
+            "translated": sum(1 for _, reason in routes if reason is None),
+            "skipped": dict(Counter(reason for _, reason in routes if reason))
+        }
+
+
+def catalog_texts(locale_dirs, language):
+    """
+    Sentences of one language from compiled gettext catalogs (<dir>/<language>*/LC_MESSAGES/*.mo):
+    the translations for a language, or the English source strings of every catalog for "en".
+    """
+    pattern = "*" if language == "en" else f"{language}*"
+    texts = set()
+    for locale_dir in locale_dirs:
+        for path in glob.glob(os.path.join(locale_dir, pattern, "LC_MESSAGES", "*.mo")):
+            if SKIP_CATALOGS.match(os.path.basename(path)):
+                continue
+            try:
+                with open(path, "rb") as f:
+                    catalog = gettext.GNUTranslations(f)._catalog
+            except Exception as e:
+                logger.debug(f"Skipping {path}: {e}")
+                continue
+            for source, translated in catalog.items():
+                text = source[0] if isinstance(source, tuple) else source
+                if language != "en":
+                    text = translated if translated != text else ""
+                text = " ".join(CATALOG_NOISE_RE.sub(" ", text or "").split())
+                if sum(char.isalpha() for char in text) >= 20:
+                    texts.add(text)
+    return sorted(texts)
+
+
+def build_profiles(locale_dirs, languages, path=None):
+    """Count trigrams of gettext catalog text per language and save them where _profile_table loads them"""
+    texts = {language: catalog_texts(locale_dirs, language) for language in languages}
+    for language, sentences in texts.items():
+        logger.info(f"{language}: {len(sentences)} sentences")
+    names, counts = trigram_counts(texts)
+    path = path or PROFILES_PATH
+    np.savez_compressed(path, languages=np.array(names), counts=counts.astype(np.uint32))
+    return path
+
+
+_identifiers = {}
+
+
+def get_language_identifier(source_lang="en", target_lang="ar"):
+    """Shared identifier per language pair (profiles are built once)"""
+    key = (source_lang, target_lang)
+    if key not in _identifiers:
+        _identifiers[key] = LanguageIdentifier(source_lang, target_lang)
+    return _identifiers[key]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the Latin-script trigram profiles from gettext catalogs")
+    parser.add_argument("--locale-dir", action="append", dest="locale_dirs",
+                        help="Directory of <lang>/LC_MESSAGES/*.mo catalogs (repeatable; default /usr/share/locale)")
+    parser.add_argument("--languages", nargs="+", default=sorted(LATIN_PROFILES))
+    parser.add_argument("--output", default=PROFILES_PATH)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    path = build_profiles(args.locale_dirs or ["/usr/share/locale"], args.languages, args.output)
+    logger.info(f"Saved profiles for {len(args.languages)} languages to {path} ({os.path.getsize(path) // 1024} KB)")
+
+
+if __name__ == "__main__":
+    main()
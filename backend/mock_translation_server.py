@@ -0,0 +1,101 @@
+import json
+import time
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+
+def fake_translate(text, target):
+    """Deterministic stand-in translation that is easy to assert on"""
+    return f"[{target}] {text}"
+
+
+class MockTranslationHandler(BaseHTTPRequestHandler):
+    """LibreTranslate-compatible /translate endpoint"""
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/translate":
+            self.send_error(404)
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        texts = payload.get("q", "")
+        target = payload.get("target", "ar")
+        batch = texts if isinstance(texts, list) else [texts]
+
+        server = self.server
+        with server.stats_lock:
+            server.stats["requests"] += 1
+            server.stats["in_flight"] += 1
+            server.stats["max_in_flight"] = max(server.stats["max_in_flight"], server.stats["in_flight"])
+            # Simulated outage: the first fail_requests requests get a 500
+            failing = server.stats["requests"] <= server.fail_requests
+        try:
+            # Simulated model cost: fixed per-request latency, per-item latency, and per padded token
+            # (every item in a batch costs as much as the longest one)
+            padded_tokens = len(batch) * max((len(text) + 3) // 4 for text in batch) if batch else 0
+            time.sleep(server.request_latency + server.item_latency * len(batch) + server.token_latency * padded_tokens)
+        finally:
+            with server.stats_lock:
+                server.stats["in_flight"] -= 1
+        if failing:
+            with server.stats_lock:
+                server.stats["failures"] += 1
+            self.send_error(500, "Simulated failure")
+            return
+        with server.stats_lock:
+            server.stats["items"] += len(batch)
+            server.stats["batch_sizes"].append(len(batch))
+
+        translated = [fake_translate(text, target) for text in batch]
+        body = json.dumps({"translatedText": translated if isinstance(texts, list) else translated[0]},
+                          ensure_ascii=False).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+def start_mock_server(host="127.0.0.1", port=0, request_latency=0.0, item_latency=0.0, token_latency=0.0,
+                      fail_requests=0):
+    """Start the mock server on a background thread and return (server, base_url)"""
+    server = ThreadingHTTPServer((host, port), MockTranslationHandler)
+    server.daemon_threads = True
+    server.request_latency = request_latency
+    server.item_latency = item_latency
+    server.token_latency = token_latency
+    server.fail_requests = fail_requests
+    server.stats = {"requests": 0, "items": 0, "failures": 0, "in_flight": 0, "max_in_flight": 0, "batch_sizes": []}
+    server.stats_lock = threading.Lock()
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = f"http://{server.server_address[0]}:{server.server_address[1]}"
+    logger.info(f"Mock translation server listening on {url}")
+    return server, url
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Local LibreTranslate stand-in for testing")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--request-latency", type=float, default=0.05)
+    parser.add_argument("--item-latency", type=float, default=0.002)
+    parser.add_argument("--token-latency", type=float, default=0.0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+    server, url = start_mock_server(port=args.port, request_latency=args.request_latency,
+                                    item_latency=args.item_latency, token_latency=args.token_latency)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
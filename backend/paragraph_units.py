@@ -0,0 +1,140 @@
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+# A line ending in one of these (optionally followed by closing quotes/brackets)
+# completes a sentence
+SENTENCE_END_RE = re.compile(r'[.!?:;]["\'\)\]”’]*$')
+# Bullets and list numbering always start a new unit
+LIST_MARKER_RE = re.compile(r'^(?:[•▪●–\-\*]|\(?\d{1,3}[.)]|\(?[a-zA-Z][.)])\s')
+
+MAX_UNIT_CHARS = 1200
+
+
+def _line_width(line):
+    x0, _, x1, _ = line["bbox"]
+    return max(x1 - x0, 0.0)
+
+
+def _same_style(a, b):
+    """Check that two lines share font size and weight closely enough to be one paragraph"""
+    size_a = a.get("size") or 12
+    size_b = b.get("size") or 12
+    if abs(size_a - size_b) > max(size_a, size_b) * 0.15:
+        return False
+    return a.get("bold", False) == b.get("bold", False) and a.get("italic", False) == b.get("italic", False)
+
+
+def _continues_unit(unit_lines, line):
+    """Decide whether `line` continues the paragraph formed by `unit_lines`"""
+    prev = unit_lines[-1]
+    if line["page"] != prev["page"] or not _same_style(prev, line):
+        return False
+
+    size = prev.get("size") or 12
+    prev_x0, _, prev_x1, prev_bottom = prev["bbox"]
+    x0, top, x1, _ = line["bbox"]
+
+    # Next line must sit directly below the previous one
+    gap = top - prev_bottom
+    if gap < -0.3 * size or gap > 1.2 * size:
+        return False
+
+    # Left edges aligned (allowing for a first-line indent) or heavy horizontal overlap
+    unit_x0 = min(l["bbox"][0] for l in unit_lines)
+    overlap = min(prev_x1, x1) - max(prev_x0, x0)
+    if abs(x0 - unit_x0) > 2.5 * size and overlap < 0.5 * min(prev_x1 - prev_x0, x1 - x0):
+        return False
+
+    if LIST_MARKER_RE.match(line["text"]):
+        return False
+
+    # A short line that closes a sentence is the last line of its paragraph
+    unit_width = max(_line_width(l) for l in unit_lines)
+    prev_text = prev["text"].rstrip()
+    if SENTENCE_END_RE.search(prev_text) and _line_width(prev) < unit_width * 0.85:
+        return False
+
+    if sum(len(l["text"]) for l in unit_lines) + len(line["text"]) > MAX_UNIT_CHARS:
+        return False
+
+    return True
+
+
+def _join_lines(lines):
+    """Join line texts into one string, undoing end-of-line hyphenation"""
+    text = ""
+    for line in lines:
+        part = line["text"].strip()
+        if not text:
+            text = part
+        elif re.search(r'[a-zA-Z]-$', text) and part[:1].islower():
+            text = text[:-1] + part
+        else:
+            text = f"{text} {part}"
+    return text
+
+
+def group_lines_into_paragraphs(sentences):
+    """Merge consecutive lines from a line DB into paragraph translation units"""
+    units = []
+    current = []
+
+    for line in sentences:
+        if not line["text"].strip():
+            continue
+        if current and _continues_unit(current, line):
+            current.append(line)
+            continue
+        if current:
+            units.append({"text": _join_lines(current), "lines": current})
+        current = [line]
+
+    if current:
+        units.append({"text": _join_lines(current), "lines": current})
+
+    logger.info(f"Grouped {len(sentences)} lines into {len(units)} paragraph units")
+    return units
+
+
+def split_text_across_lines(text, lines):
+    """Split translated text over the original lines in proportion to their widths"""
+    if len(lines) == 1:
+        return [text]
+
+    words = text.split()
+    if not words:
+        return [""] * len(lines)
+
+    widths = [max(_line_width(line), 1.0) for line in lines]
+    total_width = sum(widths)
+
+    # Cumulative character offset at which each word ends (counting one space between words)
+    word_ends = []
+    offset = 0
+    for word in words:
+        offset += len(word) + (1 if word_ends else 0)
+        word_ends.append(offset)
+    total_chars = word_ends[-1]
+
+    chunks = []
+    start = 0
+    cumulative_width = 0.0
+    for i, width in enumerate(widths[:-1]):
+        cumulative_width += width
+        remaining_lines = len(lines) - i - 1
+        target = total_chars * cumulative_width / total_width
+
+        # Word boundary nearest to the target offset, leaving a word for every remaining line
+        end = start + 1
+        limit = max(start + 1, len(words) - remaining_lines)
+        while end < limit and abs(word_ends[end] - target) < abs(word_ends[end - 1] - target):
+            end += 1
+        end = min(end, limit) if start < len(words) else start
+
+        chunks.append(" ".join(words[start:end]))
+        start = end
+
+    chunks.append(" ".join(words[start:]))
+    return chunks
@@ -1,111 +1,134 @@
 from reportlab.pdfgen import canvas
 from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.lib.rl_accel import fp_str
 from reportlab.lib.colors import Color
 from PyPDF2 import PdfReader, PdfWriter
 import io
 import os
 import json
+import fitz  # PyMuPDF
+import tempfile
+import contextlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from font_registry import get_font_registry
 
-def register_arial_font():
-    """Register Arial font for English text"""
-    arial_paths = [
-        'fonts/arial_ms/Arial Unicode MS Bold.otf',
-        'fonts/arial_ms/Arial Unicode MS.otf',
-    ]
-    
-    # Register Regular variant
-    regular_registered = False
-    for font_path in arial_paths:
-        if 'bd' not in font_path and 'bi' not in font_path and os.path.exists(font_path):
-            try:
-                pdfmetrics.registerFont(TTFont('Arial', font_path))
-                print(f"Arial Regular registered from: {font_path}")
-                regular_registered = True
-                break
-            except Exception as e:
-                print(f"Error registering Arial Regular: {e}")
-    
-    # Register Bold variant
-    bold_registered = False
-    for font_path in arial_paths:
-        if 'bd' in font_path and os.path.exists(font_path):
-            try:
-                pdfmetrics.registerFont(TTFont('Arial-Bold', font_path))
-                print(f"Arial Bold registered from: {font_path}")
-                bold_registered = True
-                break
-            except Exception as e:
-                print(f"Error registering Arial Bold: {e}")
-    
-    # Register Italic variant
-    italic_registered = False
-    for font_path in arial_paths:
-        if 'i' in font_path and 'bi' not in font_path and os.path.exists(font_path):
-            try:
-                pdfmetrics.registerFont(TTFont('Arial-Italic', font_path))
-                print(f"Arial Italic registered from: {font_path}")
-                italic_registered = True
-                break
-            except Exception as e:
-                print(f"Error registering Arial Italic: {e}")
-    
-    # Register BoldItalic variant
-    bolditalic_registered = False
-    for font_path in arial_paths:
-        if 'bi' in font_path and os.path.exists(font_path):
-            try:
-                pdfmetrics.registerFont(TTFont('Arial-BoldItalic', font_path))
-                print(f"Arial BoldItalic registered from: {font_path}")
-                bolditalic_registered = True
-                break
-            except Exception as e:
-                print(f"Error registering Arial BoldItalic: {e}")
-    
-    if not any([regular_registered, bold_registered, italic_registered, bolditalic_registered]):
-        print("Arial fonts not found. Using Helvetica fallback")
-    
-    return regular_registered, bold_registered, italic_registered, bolditalic_registered
-
-def get_font_variant(is_bold, is_italic, regular_available, bold_available, italic_available, bolditalic_available):
-    """Get appropriate font variant"""
-    if not any([regular_available, bold_available, italic_available, bolditalic_available]):
-        if is_bold and is_italic:
-            return "Helvetica-BoldOblique"
-        elif is_bold:
-            return "Helvetica-Bold"
-        elif is_italic:
-            return "Helvetica-Oblique"
-        else:
-            return "Helvetica"
-    
-    if is_bold and is_italic and bolditalic_available:
-        return "Arial-BoldItalic"
-    elif is_bold and bold_available:
-        return "Arial-Bold"
-    elif is_italic and italic_available:
-        return "Arial-Italic"
-    elif regular_available:
-        return "Arial"
-    else:
-        return "Helvetica"
+# Glyphs whose baselines differ by less than this (points) share a text object
+BASELINE_TOLERANCE = 0.01
+# Worker processes rendering overlay page ranges (reportlab is pure Python, so threads would serialize)
+OVERLAY_WORKERS = int(os.environ.get("OVERLAY_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Fewest pages worth a worker process; shorter documents render serially
+OVERLAY_MIN_PAGES = int(os.environ.get("OVERLAY_MIN_PAGES", "25"))
+# How worker processes start. Forking the API process would copy locks its other threads hold (batch collector,
+# dispatch monitor, font warm-up) into children that can then deadlock, so workers start from a clean process
+PROCESS_START_METHOD = os.environ.get(
+    "PROCESS_START_METHOD", "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
 
-def set_font_and_color(c, is_bold, is_italic, font_size, color, regular_available, bold_available, italic_available, bolditalic_available):
-    """Set font and color with proper variant"""
+@contextlib.contextmanager
+def atomic_output(output_path):
+    """Yield a unique temporary path next to output_path; it replaces output_path only once fully written"""
+    directory = os.path.dirname(os.path.abspath(output_path))
+    fd, temp_path = tempfile.mkstemp(prefix=f".{os.path.basename(output_path)}.", suffix=".tmp", dir=directory)
+    os.close(fd)
     try:
-        font_variant = get_font_variant(is_bold, is_italic, regular_available, bold_available, italic_available, bolditalic_available)
-        c.setFont(font_variant, font_size)
-    except Exception:
-        if is_bold and is_italic:
-            c.setFont("Helvetica-BoldOblique", font_size)
-        elif is_bold:
-            c.setFont("Helvetica-Bold", font_size)
-        elif is_italic:
-            c.setFont("Helvetica-Oblique", font_size)
-        else:
-            c.setFont("Helvetica", font_size)
-    
-    # Set text color
+        yield temp_path
+        os.replace(temp_path, output_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+def process_pool(max_workers):
+    """ProcessPoolExecutor whose workers don't inherit this process's threads or the locks they hold"""
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context(PROCESS_START_METHOD))
+
+def overlay_page_ranges(page_count, workers=None):
+    """Contiguous (start, stop) page ranges, one per overlay worker; a single range means render serially"""
+    workers = OVERLAY_WORKERS if workers is None else workers
+    if multiprocessing.parent_process() is not None:
+        # Already a worker (e.g. one output of the multi-language fan-out): don't nest pools
+        workers = 1
+    workers = max(1, min(workers, page_count // max(1, OVERLAY_MIN_PAGES)))
+    bounds = [page_count * i // workers for i in range(workers + 1)]
+    return list(zip(bounds, bounds[1:]))
+
+def render_overlay(draw_pages, pages, page_sizes, workers=None, **options):
+    """
+    Overlay PDF fragments (bytes) for pages, in page order. draw_pages(pages, page_sizes, **options)
+    renders one fragment; long documents are split into page ranges rendered in a process pool.
+    """
+    ranges = overlay_page_ranges(len(pages), workers)
+    if len(ranges) == 1:
+        return [draw_pages(pages, page_sizes, **options)]
+    with process_pool(len(ranges)) as pool:
+        jobs = [pool.submit(draw_pages, pages[start:stop], page_sizes[start:stop], **options)
+                for start, stop in ranges]
+        return [job.result() for job in jobs]
+
+def join_overlay(fragments, overlay_pdf_path=None):
+    """One in-memory overlay PDF from fragments; also written to overlay_pdf_path unless that is None"""
+    if len(fragments) == 1:
+        overlay_packet = io.BytesIO(fragments[0])
+    else:
+        writer = PdfWriter()
+        for fragment in fragments:
+            for page in PdfReader(io.BytesIO(fragment)).pages:
+                writer.add_page(page)
+        overlay_packet = io.BytesIO()
+        writer.write(overlay_packet)
+    overlay_packet.seek(0)
+    if overlay_pdf_path is not None:
+        with atomic_output(overlay_pdf_path) as temp_path, open(temp_path, 'wb') as overlay_file:
+            overlay_file.write(overlay_packet.getvalue())
+        print(f"Text overlay created: {overlay_pdf_path}")
+    return overlay_packet
+
+def merge_page_range(base_pdf_path, start, stop, draw_pages, pages, page_sizes, keep_overlay=False, **options):
+    """Render the overlay of base pages [start, stop) and merge it onto them: (merged PDF bytes, overlay bytes or None)"""
+    overlay = draw_pages(pages, page_sizes, **options) if pages else None
+    base_pages = PdfReader(base_pdf_path).pages[start:stop]
+    output_writer = _merged_writer(base_pages, PdfReader(io.BytesIO(overlay)).pages if overlay else [])
+    merged = io.BytesIO()
+    output_writer.write(merged)
+    return merged.getvalue(), overlay if keep_overlay else None
+
+def assemble_pdf(fragments, output_pdf_path):
+    """
+    Concatenate PDF fragments in order (PyMuPDF copies the pages without re-parsing their content).
+    Each fragment carries its own copy of the fonts and images its pages share with other ranges, so
+    duplicate objects and streams are merged on save.
+    """
+    with fitz.open() as doc:
+        for fragment in fragments:
+            with fitz.open("pdf", fragment) as part:
+                doc.insert_pdf(part)
+        with atomic_output(output_pdf_path) as temp_path:
+            doc.save(temp_path, garbage=4, deflate=True)
+
+def reconstruct_overlaid(draw_pages, pages, page_sizes, base_pdf_path, output_pdf_path, overlay_pdf_path=None,
+                         workers=None, **options):
+    """
+    Draw pages with draw_pages and merge them onto the base PDF. Long documents are split into page ranges
+    that worker processes render and merge on their own; the merged ranges are assembled in order in one step.
+    """
+    ranges = overlay_page_ranges(len(PdfReader(base_pdf_path).pages), workers)
+    if len(ranges) == 1:
+        fragments = [draw_pages(pages, page_sizes, **options)]
+        if overlay_pdf_path is not None:
+            join_overlay(fragments, overlay_pdf_path)
+        merge_pdf_layers(base_pdf_path, io.BytesIO(fragments[0]), output_pdf_path)
+        return
+    with process_pool(len(ranges)) as pool:
+        jobs = [pool.submit(merge_page_range, base_pdf_path, start, stop, draw_pages, pages[start:stop],
+                            page_sizes[start:stop], overlay_pdf_path is not None, **options)
+                for start, stop in ranges]
+        results = [job.result() for job in jobs]
+    if overlay_pdf_path is not None:
+        join_overlay([overlay for _, overlay in results if overlay], overlay_pdf_path)
+    assemble_pdf([merged for merged, _ in results], output_pdf_path)
+    print(f"Merged PDF saved: {output_pdf_path}")
+
+def set_fill_color(c, color):
+    """Set the fill color from an RGB or CMYK tuple, falling back to black"""
     try:
         if color and len(color) >= 3:
             if len(color) == 3:
@@ -119,100 +142,150 @@ def set_font_and_color(c, is_bold, is_italic, font_size, color, regular_availabl
     except Exception:
         c.setFillColorRGB(0, 0, 0)
 
-def create_text_overlay(json_path, overlay_pdf_path, base_pdf_path):
-    """Create text overlay PDF"""
+def _encode_glyph(c, font, text):
+    """(PDF font resource, encoded bytes) for one glyph in a registered font"""
+    if font._dynamicFont:
+        subset, encoded = font.splitString(text, c._doc)[0]
+        return font.getSubsetInternalName(subset, c._doc), encoded
+    for substitute, encoded in pdfmetrics.unicode2T1(text, [font] + font.substitutionFonts):
+        return c._doc.getInternalFontName(substitute.fontName), encoded
+    raise ValueError(f"Cannot encode {text!r}")
+
+def draw_glyph_run(c, font_name, font_size, glyphs):
+    """
+    Draw consecutive glyphs sharing a style and baseline as one text object.
+    glyphs is [(x, y, text), ...], all drawable in the font (see FontChain.segment); each glyph lands
+    exactly on its x through the positioning numbers of a TJ array instead of a text matrix per character.
+    """
+    font = pdfmetrics.getFont(font_name)
+    x0, y0 = glyphs[0][0], glyphs[0][1]
+    code = [f"BT 1 0 0 1 {fp_str(x0)} {fp_str(y0)} Tm"]
+    current_resource = None
+    items = []
+    pen = x0
+    for x, _, text in glyphs:
+        resource, encoded = _encode_glyph(c, font, text)
+        if resource != current_resource:
+            if items:
+                code.append(f"[{' '.join(items)}] TJ")
+                items = []
+            code.append(f"{resource} {fp_str(font_size)} Tf")
+            current_resource = resource
+        # TJ numbers are thousandths of the font size, subtracted from the pen position
+        adjustment = round((pen - x) * 1000 / font_size, 2)
+        if adjustment:
+            items.append(fp_str(adjustment))
+            pen -= adjustment * font_size / 1000
+        items.append(f"({c._escape(encoded)})")
+        pen += pdfmetrics.stringWidth(text, font_name, font_size)
+    code.append(f"[{' '.join(items)}] TJ ET")
+    c._code.append(" ".join(code))
+
+def load_character_pages(json_path, base_pdf_path):
+    """Extracted pages and their (width, height), taken from the base PDF where it has the page"""
     with open(json_path, 'r', encoding='utf-8') as json_file:
         pages_data = json.load(json_file)
     
     base_pdf = PdfReader(base_pdf_path)
-    regular_available, bold_available, italic_available, bolditalic_available = register_arial_font()
-    
-    overlay_packet = io.BytesIO()
-    c = canvas.Canvas(overlay_packet)
-    
+    page_sizes = []
     for i, page_data in enumerate(pages_data):
         if i < len(base_pdf.pages):
             base_page = base_pdf.pages[i]
-            page_width = float(base_page.mediabox[2])
-            page_height = float(base_page.mediabox[3])
+            page_sizes.append((float(base_page.mediabox[2]), float(base_page.mediabox[3])))
         else:
-            page_width = page_data['page_width']
-            page_height = page_data['page_height']
-        
+            page_sizes.append((page_data['page_width'], page_data['page_height']))
+    
+    return pages_data, page_sizes
+
+def create_text_overlay(json_path, overlay_pdf_path, base_pdf_path, standard_fonts=None, workers=None):
+    """
+    Create text overlay PDF and return it in memory; it is also written to overlay_pdf_path unless that is None.
+    Glyph runs the standard-14 fonts cover are drawn with them unless standard_fonts is False (default: STANDARD_FONTS).
+    """
+    pages_data, page_sizes = load_character_pages(json_path, base_pdf_path)
+    fragments = render_overlay(draw_character_pages, pages_data, page_sizes, workers, standard_fonts=standard_fonts)
+    return join_overlay(fragments, overlay_pdf_path)
+
+def draw_character_pages(pages_data, page_sizes, standard_fonts=None):
+    """Overlay PDF bytes for a range of extracted pages"""
+    overlay_packet = io.BytesIO()
+    c = canvas.Canvas(overlay_packet)
+    
+    for page_data, (page_width, page_height) in zip(pages_data, page_sizes):
         c.setPageSize((page_width, page_height))
-        
-        current_bold = current_italic = current_size = current_color = None
-        
-        for char_data in page_data['characters']:
-            text = char_data['text']
-            if not text.strip():
-                continue
-                
-            x = char_data['x0']
-            y = page_height - char_data['bottom']
-            font_size = char_data.get('size', 12)
-            is_bold = char_data.get('bold', False)
-            is_italic = char_data.get('italic', False)
-            color = char_data.get('color', (0, 0, 0))
-            
-            if (is_bold != current_bold or is_italic != current_italic or 
-                font_size != current_size or color != current_color):
-                
-                set_font_and_color(c, is_bold, is_italic, font_size, color, regular_available, bold_available, italic_available, bolditalic_available)
-                current_bold, current_italic, current_size, current_color = is_bold, is_italic, font_size, color
-            
-            try:
-                c.drawString(x, y, text)
-            except:
-                try:
-                    safe_text = text.encode('ascii', 'ignore').decode('ascii')
-                    c.drawString(x, y, safe_text)
-                except:
-                    c.drawString(x, y, '?')
-        
+        draw_page_glyph_runs(c, page_data['characters'], page_height, standard_fonts)
         c.showPage()
     
     c.save()
-    overlay_packet.seek(0)
-    overlay_pdf = PdfReader(overlay_packet)
+    return overlay_packet.getvalue()
+
+def draw_page_glyph_runs(c, characters, page_height, standard_fonts=None):
+    """
+    Group a page's characters into same-style, same-baseline runs and draw each as one text object
+    per font: the registry's font chain splits a run where the standard-14 font (or Arial) lacks a glyph.
+    """
+    registry = get_font_registry()
     
-    with open(overlay_pdf_path, 'wb') as overlay_file:
-        overlay_writer = PdfWriter()
-        for page in overlay_pdf.pages:
-            overlay_writer.add_page(page)
-        overlay_writer.write(overlay_file)
+    def draw_run(run, style):
+        is_bold, is_italic, source_font, font_size, _ = style
+        chain = registry.chain("Arial", is_bold, is_italic, source_font, standard_fonts)
+        for font_name, glyphs in chain.segment(run):
+            draw_glyph_run(c, font_name, font_size, glyphs)
     
-    print(f"Text overlay created: {overlay_pdf_path}")
+    run = []
+    run_style = None
+    current_color = None
+    for char_data in characters:
+        text = char_data['text']
+        # Zero-size glyphs were invisible before and cannot be positioned with TJ
+        if not text.strip() or not char_data.get('size', 12):
+            continue
+        
+        y = page_height - char_data['bottom']
+        color = char_data.get('color', (0, 0, 0))
+        style = (bool(char_data.get('bold', False)), bool(char_data.get('italic', False)),
+                 char_data.get('original_font', ''), char_data.get('size', 12), tuple(color) if color else None)
+        if run and (style != run_style or abs(y - run[0][1]) > BASELINE_TOLERANCE):
+            draw_run(run, run_style)
+            run = []
+        if not run:
+            run_style = style
+            if color != current_color:
+                set_fill_color(c, color)
+                current_color = color
+        run.append((char_data['x0'], y, text))
+    if run:
+        draw_run(run, run_style)
 
 def merge_pdf_layers(base_pdf_path, overlay_pdf_path, output_pdf_path):
-    """Merge base PDF with text overlay"""
+    """Merge base PDF with text overlay (a path or an in-memory file)"""
     base_pdf = PdfReader(base_pdf_path)
     overlay_pdf = PdfReader(overlay_pdf_path)
+    output_writer = _merged_writer(base_pdf.pages, overlay_pdf.pages)
     
-    output_writer = PdfWriter()
-    
-    for i in range(len(base_pdf.pages)):
-        base_page = base_pdf.pages[i]
-        if i < len(overlay_pdf.pages):
-            base_page.merge_page(overlay_pdf.pages[i])
-        output_writer.add_page(base_page)
-    
-    with open(output_pdf_path, 'wb') as output_file:
+    with atomic_output(output_pdf_path) as temp_path, open(temp_path, 'wb') as output_file:
         output_writer.write(output_file)
     
     print(f"Merged PDF saved: {output_pdf_path}")
 
-def reconstruct_pdf(json_path, text_removed_pdf_path, output_pdf_path):
-    """Main reconstruction function"""
-    overlay_pdf_path = "temp_overlay.pdf"
-    
-    create_text_overlay(json_path, overlay_pdf_path, text_removed_pdf_path)
-    merge_pdf_layers(text_removed_pdf_path, overlay_pdf_path, output_pdf_path)
+def _merged_writer(base_pages, overlay_pages):
+    """PdfWriter holding the base pages, each with the overlay page of the same index merged on top"""
+    output_writer = PdfWriter()
     
-    try:
-        os.remove(overlay_pdf_path)
-        print("Temporary overlay removed")
-    except:
-        pass
+    for i, base_page in enumerate(base_pages):
+        if i < len(overlay_pages):
+            base_page.merge_page(overlay_pages[i])
+        output_writer.add_page(base_page)
+    return output_writer
+
+def reconstruct_pdf(json_path, text_removed_pdf_path, output_pdf_path, overlay_pdf_path=None, standard_fonts=None,
+                    workers=None):
+    """
+    Main reconstruction function; the overlay stays in memory unless overlay_pdf_path is given.
+    Long documents are rendered and merged in page ranges by up to `workers` processes (default OVERLAY_WORKERS).
+    """
+    pages_data, page_sizes = load_character_pages(json_path, text_removed_pdf_path)
+    reconstruct_overlaid(draw_character_pages, pages_data, page_sizes, text_removed_pdf_path, output_pdf_path,
+                         overlay_pdf_path, workers, standard_fonts=standard_fonts)
     
     print(f"PDF reconstructed: {output_pdf_path}")
\ No newline at end of file
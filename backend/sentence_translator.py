@@ -1,52 +1,132 @@
 import json
-from deep_translator import GoogleTranslator
+import time
+import random
 import logging
+import textwrap
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from translation_backends import TranslationBackend, get_backend
+from translation_batcher import length_bucketed_batches
 
 logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+logger = logging.getLogger(__name__)
 
-def translate_sentences(sentences_json_path, output_json_path, target_lang='ar'):
+
+class _JSONArrayWriter:
+    """Write a JSON array one element at a time, matching json.dump(indent=4) output"""
+
+    def __init__(self, f):
+        self.f = f
+        self.count = 0
+        self.f.write("[")
+
+    def write(self, item):
+        self.f.write(",\n" if self.count else "\n")
+        self.f.write(textwrap.indent(json.dumps(item, indent=4, ensure_ascii=False), "    "))
+        self.count += 1
+
+    def close(self):
+        self.f.write("\n]" if self.count else "]")
+        self.f.flush()
+
+
+def _translate_batch_with_backoff(translator, texts, source_lang, target_lang, max_retries, backoff_base, backoff_max):
+    """Translate one batch, retrying with jittered exponential backoff; None if every attempt failed"""
+    for attempt in range(max_retries + 1):
+        try:
+            return translator.translate_batch(texts, source_lang, target_lang)
+        except Exception as e:
+            if attempt == max_retries:
+                logger.error(f"Batch of {len(texts)} sentences failed after {attempt + 1} attempts: {e}")
+                return None
+            delay = min(backoff_max, backoff_base * 2 ** attempt) * random.uniform(0.5, 1.5)
+            logger.warning(f"Batch translation failed (attempt {attempt + 1}), retrying in {delay:.1f}s: {e}")
+            time.sleep(delay)
+
+
+def translate_sentences(sentences_json_path, output_json_path, target_lang='ar', backend='google',
+                        batch_size=25, max_in_flight=None, max_retries=4, backoff_base=0.5, backoff_max=30.0,
+                        length_bucketing=True, source_lang='en'):
     """
-    Translate sentences and prepare for reconstruction
+    Translate sentences from source_lang and prepare for reconstruction.
+    Sentences are sent in batches through the backend's batch API with at most
+    `max_in_flight` batches outstanding; results are streamed to the output JSON in input order.
+    With `length_bucketing`, each batch holds sentences of similar length to minimise padding.
     """
     with open(sentences_json_path, 'r', encoding='utf-8') as f:
         sentences = json.load(f)
     
-    translator = GoogleTranslator(source='auto', target=target_lang)
+    translator = backend if isinstance(backend, TranslationBackend) else get_backend(backend)
+    max_in_flight = max_in_flight or translator.max_concurrency
     is_rtl = target_lang in ['ar', 'he', 'fa', 'ur']
     
+    # Blank sentences never need a model call
+    translatable = [i for i, sentence in enumerate(sentences) if sentence['text'].strip()]
+    texts = [sentences[i]['text'] for i in translatable]
+    if length_bucketing:
+        # Sort within a few rounds of in-flight batches so output still streams steadily
+        index_batches = length_bucketed_batches(texts, batch_size, chunk_size=batch_size * max_in_flight * 4)
+    else:
+        index_batches = (range(i, min(i + batch_size, len(texts))) for i in range(0, len(texts), batch_size))
+    batches = ([translatable[j] for j in batch] for batch in index_batches)
+    
     translated_sentences = []
+    translated = {}
+    failed = 0
+    completed_batches = 0
+    start_time = time.time()
     
-    for i, sentence in enumerate(sentences):
-        print(f"Translating sentence {i + 1}/{len(sentences)}")
-        print(f"  Original: '{sentence['text'][:80]}...'")
-        
-        try:
-            translated_text = translator.translate(sentence['text'])
-            print(f"  Translated: '{translated_text[:80]}...'")
-            
-            translated_sentences.append({
+    def submit(executor, batch):
+        future = executor.submit(_translate_batch_with_backoff, translator, [sentences[i]['text'] for i in batch],
+                                 source_lang, target_lang, max_retries, backoff_base, backoff_max)
+        return batch, future
+    
+    def write_ready(writer):
+        # Emit the longest finished prefix in document order
+        while len(translated_sentences) < len(sentences):
+            i = len(translated_sentences)
+            sentence = sentences[i]
+            if sentence['text'].strip() and i not in translated:
+                return
+            record = {
                 "original_text": sentence['text'],
-                "translated_text": translated_text,
+                "translated_text": translated.pop(i, sentence['text']),
                 "page": sentence['page'],
                 "is_rtl": is_rtl
-            })
+            }
+            translated_sentences.append(record)
+            writer.write(record)
+    
+    with open(output_json_path, 'w', encoding='utf-8') as out, \
+            ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        writer = _JSONArrayWriter(out)
+        in_flight = deque(submit(executor, batch) for _, batch in zip(range(max_in_flight), batches))
+        
+        while in_flight:
+            batch, future = in_flight.popleft()
+            translations = future.result()
+            if translations is None:
+                failed += len(batch)
+                translations = []
+            for position, i in enumerate(batch):
+                # Keep original text if translation fails
+                translated[i] = translations[position] if position < len(translations) else sentences[i]['text']
+            write_ready(writer)
+            out.flush()
             
-        except Exception as e:
-            print(f"Error translating sentence: {e}")
-            # Keep original text if translation fails
-            translated_sentences.append({
-                "original_text": sentence['text'],
-                "translated_text": sentence['text'],  # Fallback to original
-                "page": sentence['page'],
-                "is_rtl": is_rtl
-            })
+            next_batch = next(batches, None)
+            if next_batch is not None:
+                in_flight.append(submit(executor, next_batch))
+            
+            completed_batches += 1
+            if completed_batches % 10 == 0:
+                logger.info(f"Translated {len(translated_sentences)}/{len(sentences)} sentences")
         
-        print()  # Empty line for readability
-    
-    with open(output_json_path, 'w', encoding='utf-8') as f:
-        json.dump(translated_sentences, f, indent=4, ensure_ascii=False)
+        write_ready(writer)
+        writer.close()
     
-    print(f"Translation complete! Saved to {output_json_path}")
+    elapsed = time.time() - start_time
+    logger.info(f"Translation complete in {elapsed:.2f}s ({failed} kept untranslated). Saved to {output_json_path}")
     return translated_sentences
 
 def reconstruct_pdf_from_sentences(translated_sentences_json, text_removed_pdf_path, output_pdf_path):
@@ -1,31 +1,16 @@
-import subprocess
 import sys
+from entity_protector import EntityProtector
 
-# Ensure spaCy model is installed
-def install_spacy_model(model="en_core_web_lg"):
-    try:
-        import spacy
-        spacy.load(model)
-    except OSError:
-        print(f"Downloading spaCy model '{model}'...")
-        subprocess.check_call([sys.executable, "-m", "spacy", "download", model])
-    except ImportError:
-        print("spaCy is not installed. Installing...")
-        subprocess.check_call([sys.executable, "-m", "pip", "install", "spacy"])
-        subprocess.check_call([sys.executable, "-m", "spacy", "download", model])
+# Needs spaCy and the model installed beforehand, e.g.:
+#   pip install spacy && python -m spacy download en_core_web_sm
+# Pass another installed model (e.g. en_core_web_lg) as the first argument.
+protector = EntityProtector(sys.argv[1] if len(sys.argv) > 1 else None)
+if not protector.available:
+    sys.exit(protector.describe()["error"])
 
-# Run installer before use
-install_spacy_model()
-
-import spacy
-nlp = spacy.load("en_core_web_lg")
 
 def is_name(text: str) -> bool:
-    doc = nlp(text)
-    for ent in doc.ents:
-        if ent.label_ == "PERSON" and ent.text.lower() == text.lower():
-            return True
-    return False
+    return protector.is_name(text)
 
 
 # ---- Test cases ----
@@ -34,4 +19,10 @@ print(is_name("michael coffee"))      # True
 print(is_name("apple"))               # True
 print(is_name("this is a test"))      # False
 print(is_name("effixly"))      # True
-print(is_name("efficia"))      # True
\ No newline at end of file
+print(is_name("efficia"))      # True
+
+# Batched: one nlp.pipe call for all lines, memoised afterwards
+lines = ["Saad Abdur Razzaq", "Michael Coffee works at Apple.", "this is a test", "Saad Abdur Razzaq"]
+for line, spans in zip(lines, protector.entities(lines)):
+    print(line, "->", [(line[start:end], label) for start, end, label in spans])
+print(protector.describe())
@@ -0,0 +1,24 @@
+import os
+import sys
+import pytest
+
+# Backend modules import each other as top-level modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_translation_server import start_mock_server
+
+
+@pytest.fixture
+def mock_server():
+    """Start a mock LibreTranslate server; call with start_mock_server's options, get (server, url)"""
+    servers = []
+
+    def start(**options):
+        server, url = start_mock_server(**options)
+        servers.append(server)
+        return server, url
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
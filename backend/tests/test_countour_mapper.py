@@ -0,0 +1,72 @@
+import threading
+import fitz
+import pytest
+from countour_mapper import PDFLineExtractor
+from translation_backends import TranslationBackend
+
+LINES = [f"Line number {number} of the quarterly report" for number in range(8)]
+
+
+class CountingBackend(TranslationBackend):
+    """Records every text it is asked to translate"""
+
+    name = "counting"
+
+    def __init__(self):
+        super().__init__(max_concurrency=2)
+        self.texts = []
+        self._lock = threading.Lock()
+
+    def _translate_batch(self, texts, source, target):
+        with self._lock:
+            self.texts.extend(texts)
+        return [f"[{target}] {text}" for text in texts]
+
+
+@pytest.fixture
+def pdf_path(tmp_path):
+    path = tmp_path / "report.pdf"
+    with fitz.open() as doc:
+        page = doc.new_page()
+        for number, text in enumerate(LINES):
+            page.insert_text((72, 72 + 24 * number), text, fontsize=11)
+        doc.save(path)
+    return str(path)
+
+
+def test_rerun_after_a_crash_translates_only_the_missing_lines(tmp_path, pdf_path):
+    output_path = tmp_path / "ar_line_db.json"
+    checkpoint_path = tmp_path / "ar_line_db.checkpoint.json"
+
+    backend = CountingBackend()
+    extractor = PDFLineExtractor(backend=backend)
+    first_db = extractor.extract_lines_from_pdf(pdf_path, str(tmp_path / "first.json"))
+    assert len(first_db["sentences"]) == len(LINES)
+    stream = extractor.translate_to_arabic_stream(first_db, str(checkpoint_path), max_workers=1, checkpoint_every=1)
+    done = [next(stream) for _ in range(3)]
+    # The job dies here; the checkpoint holds the lines finished so far
+    stream.close()
+    assert checkpoint_path.exists()
+
+    # A rerun extracts the PDF again, so every line gets a new random ID
+    backend = CountingBackend()
+    extractor = PDFLineExtractor(backend=backend)
+    second_db = extractor.extract_lines_from_pdf(pdf_path, str(tmp_path / "second.json"))
+    assert {line["id"] for line in second_db["sentences"]}.isdisjoint(line_id for line_id, _ in done)
+    result = extractor.translate_lines(second_db, str(output_path), max_workers=1)
+
+    assert len(backend.texts) == len(LINES) - len(done)
+    assert [sentence["id"] for sentence in result["sentences"]] == [line["id"] for line in second_db["sentences"]]
+    assert ([sentence["original_text"] for sentence in result["sentences"]]
+            == [line["text"] for line in second_db["sentences"]])
+    assert not checkpoint_path.exists()
+
+
+def test_stream_takes_the_adaptive_concurrency_options(tmp_path, pdf_path):
+    extractor = PDFLineExtractor(backend=CountingBackend())
+    line_db = extractor.extract_lines_from_pdf(pdf_path, str(tmp_path / "lines.json"))
+
+    translated = list(extractor.translate_to_arabic_stream(line_db, max_workers=1, adaptive_concurrency=True,
+                                                           max_workers_limit=3))
+
+    assert [sentence["original_text"] for _, sentence in translated] == [line["text"] for line in line_db["sentences"]]
@@ -0,0 +1,58 @@
+import os
+import json
+from glossary import Glossary, load_glossary, protect_spans
+
+TERMS = [("Acme Corp", "أكمي"), ("net revenue", "صافي الإيرادات"), ("revenue", "الإيرادات"),
+         ("İstanbul office", "مكتب إسطنبول")]
+
+
+def matched(glossary, texts):
+    return [[text[start:end] for start, end, _ in matches] for text, matches in zip(texts, glossary.scan(texts))]
+
+
+def test_whole_word_leftmost_longest_matches():
+    glossary = Glossary(TERMS)
+    assert matched(glossary, ["Net revenue and revenues of acme corp.", "Prerevenue ACME CORPORATION"]) == [
+        ["Net revenue", "acme corp"], []]
+
+
+def test_case_insensitive_despite_length_changing_characters():
+    glossary = Glossary(TERMS)
+    # 'İ' lowercases to two characters; matches elsewhere in the document must still fold case
+    texts = ["Visit the İSTANBUL OFFICE today.", "ACME CORP reported NET REVENUE.", "İİ then acme corp"]
+    assert matched(glossary, texts) == [["İSTANBUL OFFICE"], ["ACME CORP", "NET REVENUE"], ["acme corp"]]
+
+
+def test_case_sensitive_glossary():
+    glossary = Glossary(TERMS, case_sensitive=True)
+    assert matched(glossary, ["ACME CORP and Acme Corp"]) == [["Acme Corp"]]
+
+
+def test_greek_final_sigma_folds_with_sigma():
+    glossary = Glossary([("ΟΔΟΣ", "طريق")])
+    assert matched(glossary, ["Οδος and ΟΔΟΣ"]) == [["Οδος", "ΟΔΟΣ"]]
+
+
+def test_protect_and_restore_round_trip():
+    glossary = Glossary(TERMS)
+    text = "Acme Corp grew net revenue."
+    protected, translations = glossary.protect(text, glossary.find(text))
+    assert protected == "__T0__ grew __T1__."
+    # Engines sometimes mangle the tokens; a dropped token is reported
+    restored, dropped = Glossary.restore("_ _ t0 _ _ نمت", translations)
+    assert restored == "أكمي نمت" and dropped == ["__T1__"]
+
+
+def test_protect_spans_without_spans():
+    assert protect_spans("plain text", []) == ("plain text", {})
+
+
+def test_load_glossary_rebuilds_when_the_file_changes(tmp_path):
+    path = tmp_path / "terms.json"
+    path.write_text(json.dumps({"Acme Corp": "أكمي"}), encoding="utf-8")
+    first = load_glossary(str(path))
+    assert load_glossary(str(path)) is first
+
+    path.write_text(json.dumps({"Acme Corp": "أكمي", "Globex": "جلوبكس"}), encoding="utf-8")
+    os.utime(path, (os.path.getatime(path), os.path.getmtime(path) + 5))
+    assert len(load_glossary(str(path))) == 2
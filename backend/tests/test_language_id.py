@@ -0,0 +1,51 @@
+import pytest
+from language_id import LanguageIdentifier
+
+
+@pytest.fixture(scope="module")
+def identifier():
+    return LanguageIdentifier("en", "ar")
+
+
+def test_english_lines_go_to_the_model(identifier):
+    # Lines from the sample PDF and README that the seed-only profiles used to label es/it/pt/fr
+    lines = ["Fasterclientconfidence: Delivercompsandscenarios", "DocumentAI: clauseextractionfrom",
+             "deploymentofEffixlyAIR ™.", "Extract Lines │ ← contour_mapper.py", "memos slows client decision-making.",
+             "Data freshness: Always up-to-date, continuously", "A parcel in Midtown East files a",
+             "Secure client dashboards (interactive", "* Parses PDF’s `/Contents` stream.",
+             "The board approved the annual report and the revised dividend policy."]
+    assert [reason for _, reason in identifier.route(lines)] == [None] * len(lines)
+
+
+@pytest.mark.parametrize("language, text", [
+    ("fr", "Le conseil d'administration a validé le budget prévisionnel pour l'exercice suivant."),
+    ("de", "Die Geschäftsleitung hat den Haushaltsplan für das kommende Geschäftsjahr genehmigt."),
+    ("es", "La dirección ha aprobado el presupuesto para el próximo ejercicio fiscal de la empresa."),
+    ("it", "La direzione ha approvato il bilancio di previsione per il prossimo esercizio della società."),
+    ("pt", "A direção aprovou o orçamento previsto para o próximo exercício financeiro da empresa."),
+    ("nl", "De directie heeft de begroting voor het komende boekjaar van het bedrijf goedgekeurd."),
+])
+def test_confident_non_english_lines_are_skipped(identifier, language, text):
+    assert identifier.route([text]) == [(language, "unsupported_language")]
+
+
+def test_script_routes(identifier):
+    routes = identifier.route(["تمت الموافقة على الميزانية السنوية", "Совет директоров утвердил бюджет",
+                               "12,500.00 – 15%", "Revenue (الإيرادات) grew 12% this year", ""])
+    assert routes == [("ar", "already_target_language"), ("ru", "unsupported_language"), ("none", "no_text"),
+                      ("en", None), ("none", "no_text")]
+
+
+def test_short_latin_lines_stay_in_the_source_language(identifier):
+    assert identifier.detect(["Miscellaneous utilities.", "Résumé annuel", "Test Possessive Quantifiers"]) == ["en"] * 3
+
+
+def test_without_corpus_profiles_latin_lines_stay_in_the_source_language(tmp_path):
+    identifier = LanguageIdentifier(profiles_path=str(tmp_path / "missing.npz"))
+    assert identifier.detect(["Le conseil d'administration a validé le budget prévisionnel pour l'exercice suivant."]) == ["en"]
+
+
+def test_summarize_counts_routes(identifier):
+    routes = identifier.route(["The quarterly figures are attached below for review.", "تقرير", "42"])
+    assert LanguageIdentifier.summarize(routes) == {"languages": {"en": 1, "ar": 1, "none": 1}, "translated": 1,
+                                                    "skipped": {"already_target_language": 1, "no_text": 1}}
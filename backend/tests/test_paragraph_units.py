@@ -0,0 +1,57 @@
+from paragraph_units import group_lines_into_paragraphs, split_text_across_lines
+
+
+def line(text, x0, top, x1, page=1, size=10, bold=False):
+    return {"text": text, "bbox": [x0, top, x1, top + size], "page": page, "size": size, "bold": bold}
+
+
+def test_groups_wrapped_lines_into_paragraphs():
+    lines = [
+        line("Quarterly Results", 72, 60, 200, size=14, bold=True),
+        line("Revenue grew steadily across every region during the", 72, 90, 500),
+        line("third quarter, driven by new contracts and a strong", 72, 102, 498),
+        line("services pipeline.", 72, 114, 170),
+        line("Costs stayed flat while head-", 72, 130, 500),
+        line("count grew by four percent.", 72, 142, 300),
+        line("• Europe led the growth", 72, 158, 250),
+        line("Notes continue on the next page", 72, 60, 400, page=2),
+    ]
+
+    units = group_lines_into_paragraphs(lines)
+
+    assert [len(unit["lines"]) for unit in units] == [1, 3, 2, 1, 1]
+    assert units[1]["text"] == ("Revenue grew steadily across every region during the third quarter, "
+                                "driven by new contracts and a strong services pipeline.")
+    # End-of-line hyphenation is undone when the next line continues the word
+    assert units[2]["text"] == "Costs stayed flat while headcount grew by four percent."
+    assert units[3]["lines"][0]["text"].startswith("•")
+
+
+def test_blank_lines_are_skipped():
+    units = group_lines_into_paragraphs([line("  ", 72, 60, 400), line("Only text", 72, 72, 140)])
+    assert [unit["text"] for unit in units] == ["Only text"]
+
+
+def test_split_follows_line_widths_on_word_boundaries():
+    text = "alpha bravo delta gamma omega sigma kappa theta"
+    lines = [line("", 0, 0, 300), line("", 0, 12, 100)]
+
+    chunks = split_text_across_lines(text, lines)
+
+    assert chunks == ["alpha bravo delta gamma omega sigma", "kappa theta"]
+    assert " ".join(chunks) == text
+
+
+def test_split_leaves_a_word_for_every_line():
+    text = "one two three four five six seven eight nine"
+    chunks = split_text_across_lines(text, [line("", 0, 0, 400), line("", 0, 12, 400), line("", 0, 24, 5)])
+
+    assert all(chunk for chunk in chunks)
+    assert " ".join(chunks) == text
+
+
+def test_single_word_translation_stays_on_the_first_line():
+    lines = [line("", 0, 0, 300), line("", 0, 12, 300), line("", 0, 24, 300)]
+    assert split_text_across_lines("Revenue", lines) == ["Revenue", "", ""]
+    assert split_text_across_lines("Revenue grew", [line("", 0, 0, 300)]) == ["Revenue grew"]
+    assert split_text_across_lines("   ", lines) == ["", "", ""]
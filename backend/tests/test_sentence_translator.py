@@ -0,0 +1,179 @@
+import json
+import threading
+from sentence_translator import translate_sentences, _JSONArrayWriter
+from translation_backends import HTTPBackend, TranslationBackend
+from mock_translation_server import fake_translate
+
+
+def write_sentences(path, texts):
+    sentences = [{"text": text, "page": i // 10 + 1} for i, text in enumerate(texts)]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(sentences, f)
+    return sentences
+
+
+def test_batches_sentences_and_keeps_document_order(tmp_path, mock_server):
+    server, url = mock_server()
+    texts = [f"Sentence {i}." for i in range(23)]
+    texts[4] = "   "
+    write_sentences(tmp_path / "in.json", texts)
+
+    result = translate_sentences(tmp_path / "in.json", tmp_path / "out.json", backend=HTTPBackend(url=url),
+                                 batch_size=5, max_in_flight=2, length_bucketing=False)
+
+    # 22 non-blank sentences in batches of 5; the blank one never reaches the server
+    assert server.stats["requests"] == 5
+    assert sorted(server.stats["batch_sizes"]) == [2, 5, 5, 5, 5]
+    assert [r["original_text"] for r in result] == texts
+    assert [r["translated_text"] for r in result] == [text if not text.strip() else fake_translate(text, "ar")
+                                                      for text in texts]
+    assert all(r["is_rtl"] for r in result)
+
+
+def test_length_bucketing_translates_every_sentence(tmp_path, mock_server):
+    server, url = mock_server()
+    texts = [("word " * (i % 7 + 1)).strip() + f" {i}" for i in range(40)]
+    write_sentences(tmp_path / "in.json", texts)
+
+    result = translate_sentences(tmp_path / "in.json", tmp_path / "out.json", target_lang="fr",
+                                 backend=HTTPBackend(url=url), batch_size=8, max_in_flight=2)
+
+    assert [r["translated_text"] for r in result] == [fake_translate(text, "fr") for text in texts]
+    assert not any(r["is_rtl"] for r in result)
+    assert server.stats["items"] == 40
+
+
+def test_retries_failed_batches_with_backoff(tmp_path, mock_server):
+    server, url = mock_server(fail_requests=2)
+    texts = [f"Sentence {i}." for i in range(6)]
+    write_sentences(tmp_path / "in.json", texts)
+
+    result = translate_sentences(tmp_path / "in.json", tmp_path / "out.json", backend=HTTPBackend(url=url),
+                                 batch_size=3, max_in_flight=1, max_retries=3, backoff_base=0.01, backoff_max=0.02)
+
+    assert server.stats["failures"] == 2
+    assert [r["translated_text"] for r in result] == [fake_translate(text, "ar") for text in texts]
+
+
+def test_keeps_original_text_when_retries_run_out(tmp_path, mock_server):
+    server, url = mock_server(fail_requests=100)
+    texts = [f"Sentence {i}." for i in range(4)]
+    write_sentences(tmp_path / "in.json", texts)
+
+    result = translate_sentences(tmp_path / "in.json", tmp_path / "out.json", backend=HTTPBackend(url=url),
+                                 batch_size=2, max_in_flight=1, max_retries=1, backoff_base=0.01, backoff_max=0.01)
+
+    # Two batches, two attempts each
+    assert server.stats["failures"] == 4
+    assert [r["translated_text"] for r in result] == texts
+
+
+def test_bounds_requests_in_flight(tmp_path, mock_server):
+    server, url = mock_server(request_latency=0.03)
+    write_sentences(tmp_path / "in.json", [f"Sentence {i}." for i in range(40)])
+
+    translate_sentences(tmp_path / "in.json", tmp_path / "out.json", backend=HTTPBackend(url=url, max_concurrency=16),
+                        batch_size=2, max_in_flight=3, length_bucketing=False)
+
+    assert server.stats["requests"] == 20
+    assert 1 < server.stats["max_in_flight"] <= 3
+
+
+def test_streamed_output_matches_json_dump(tmp_path, mock_server):
+    _, url = mock_server()
+    texts = ["First line.", "", "Ünïcödé — line.", "Last line."]
+    write_sentences(tmp_path / "in.json", texts)
+
+    result = translate_sentences(tmp_path / "in.json", tmp_path / "out.json", backend=HTTPBackend(url=url),
+                                 batch_size=2, max_in_flight=2)
+
+    with open(tmp_path / "out.json", encoding="utf-8") as f:
+        written = f.read()
+    assert written == json.dumps(result, indent=4, ensure_ascii=False)
+
+
+def test_json_array_writer_empty_and_single(tmp_path):
+    for items in ([], [{"a": 1}], [{"a": 1}, {"b": [1, 2]}]):
+        path = tmp_path / "array.json"
+        with open(path, "w", encoding="utf-8") as f:
+            writer = _JSONArrayWriter(f)
+            for item in items:
+                writer.write(item)
+            writer.close()
+        assert path.read_text(encoding="utf-8") == json.dumps(items, indent=4)
+
+
+class GatedBackend(TranslationBackend):
+    """Holds back every batch containing the last sentence until released"""
+
+    name = "gated"
+
+    def __init__(self, last_text):
+        super().__init__(max_concurrency=4)
+        self.last_text = last_text
+        self.release = threading.Event()
+
+    def _translate_batch(self, texts, source, target):
+        if self.last_text in texts:
+            assert self.release.wait(5)
+        return [fake_translate(text, target) for text in texts]
+
+
+def test_writes_finished_prefix_before_the_job_ends(tmp_path):
+    texts = [f"Sentence {i}." for i in range(6)]
+    write_sentences(tmp_path / "in.json", texts)
+    backend = GatedBackend(texts[-1])
+    out = tmp_path / "out.json"
+
+    job = threading.Thread(target=translate_sentences, args=(tmp_path / "in.json", out),
+                           kwargs={"backend": backend, "batch_size": 2, "max_in_flight": 2, "length_bucketing": False})
+    job.start()
+    try:
+        # The first two batches are flushed while the last one is still outstanding
+        for _ in range(500):
+            if out.exists() and fake_translate(texts[3], "ar") in out.read_text(encoding="utf-8"):
+                break
+            job.join(0.01)
+        partial = out.read_text(encoding="utf-8")
+        assert fake_translate(texts[3], "ar") in partial
+        assert texts[5] not in partial
+    finally:
+        backend.release.set()
+        job.join()
+    assert json.loads(out.read_text(encoding="utf-8"))[-1]["translated_text"] == fake_translate(texts[5], "ar")
+
+
+class LocalModelBackend(TranslationBackend):
+    """Stands in for argos/ctranslate2: one installed model per concrete language pair, no 'auto' source"""
+
+    name = "local"
+
+    def __init__(self, pairs):
+        super().__init__(max_concurrency=2)
+        self.pairs = pairs
+        self.calls = []
+
+    def supports(self, source, target):
+        return (source, target) in self.pairs
+
+    def _translate_batch(self, texts, source, target):
+        self.calls.append((source, target))
+        if not self.supports(source, target):
+            raise RuntimeError(f"No model installed for {source}->{target}")
+        return [fake_translate(text, target) for text in texts]
+
+
+def test_sends_the_source_language_to_pair_model_backends(tmp_path):
+    texts = [f"Sentence {i}." for i in range(5)]
+    write_sentences(tmp_path / "in.json", texts)
+    backend = LocalModelBackend({("en", "ar"), ("fr", "ar")})
+
+    result = translate_sentences(tmp_path / "in.json", tmp_path / "out.json", backend=backend, batch_size=2,
+                                 max_retries=0)
+    assert [r["translated_text"] for r in result] == [fake_translate(text, "ar") for text in texts]
+    assert set(backend.calls) == {("en", "ar")}
+
+    backend.calls.clear()
+    translate_sentences(tmp_path / "in.json", tmp_path / "out.json", backend=backend, batch_size=5, max_retries=0,
+                        source_lang="fr")
+    assert backend.calls == [("fr", "ar")]
@@ -0,0 +1,99 @@
+import pytest
+from reportlab.pdfbase import pdfmetrics
+from text_layout import TextLayout, BASELINE, LINE_SPACING, MIN_FIT_SCALE, RTL_LETTER
+
+
+class StandInChain:
+    """Measures right-to-left letters as 'x' in Helvetica, so widths don't depend on installed Arabic fonts"""
+
+    def segment_text(self, text):
+        return [("Helvetica", RTL_LETTER.sub("x", text))]
+
+
+def width(text, size):
+    return pdfmetrics.stringWidth(RTL_LETTER.sub("x", text), "Helvetica", size)
+
+
+def sentence(text, x0, top, x1, bottom, size=12):
+    return {"text": text, "size": size,
+            "coordinates": {"top_left": {"x": x0, "y": top}, "bottom_right": {"x": x1, "y": bottom}}}
+
+
+@pytest.fixture(scope="module")
+def layout():
+    return TextLayout()
+
+
+def place(layout, sentences, mode="shrink"):
+    return layout.layout_page(sentences, lambda text: text, lambda sentence: StandInChain(), mode=mode)
+
+
+def test_ltr_line_that_fits_keeps_its_size_and_position(layout):
+    [(size, lines)] = place(layout, [sentence("Revenue grew", 50, 100, 400, 114)])
+    assert size == 12
+    assert [(x, baseline) for x, baseline, _ in lines] == [(50, 100 + 12 * BASELINE)]
+
+
+def test_ltr_line_shrinks_to_its_box_on_the_source_baseline(layout):
+    text = "Revenue grew strongly across all regions"
+    box_width = width(text, 12) * 0.8
+    [(size, lines)] = place(layout, [sentence(text, 50, 100, 50 + box_width, 114)])
+
+    assert size == pytest.approx(12 * 0.8)
+    [(x, baseline, segments)] = lines
+    assert x == 50
+    assert baseline == pytest.approx(100 + 12 * BASELINE)
+    assert segments == [("Helvetica", text)]
+
+
+def test_off_mode_keeps_the_source_size(layout):
+    text = "Revenue grew strongly across all regions"
+    [(size, _)] = place(layout, [sentence(text, 50, 100, 60, 114)], mode="off")
+    assert size == 12
+
+
+def test_rtl_line_is_right_aligned_to_its_box(layout):
+    text = "نما الإيراد"
+    [(size, [(x, _, _)])] = place(layout, [sentence(text, 50, 100, 400, 114)])
+    assert size == 12
+    assert x == pytest.approx(400 - width(text, 12))
+
+
+def test_rtl_line_shrunk_to_fit_ends_at_the_box_edge(layout):
+    text = "نما الإيراد في كل المناطق"
+    box_width = width(text, 12) * 0.75
+    [(size, [(x, _, _)])] = place(layout, [sentence(text, 50, 100, 50 + box_width, 114)])
+    assert size == pytest.approx(12 * 0.75)
+    assert x == pytest.approx(50)
+
+
+def test_rtl_line_overflowing_at_the_size_floor_starts_inside_its_box(layout):
+    text = "نما الإيراد في كل المناطق خلال الربع الثالث"
+    box_width = width(text, 12) * MIN_FIT_SCALE / 2
+    # One row high, so there is no room to wrap
+    [(size, lines)] = place(layout, [sentence(text, 5, 100, 5 + box_width, 112)])
+
+    assert size == pytest.approx(12 * MIN_FIT_SCALE)
+    assert [x for x, _, _ in lines] == [5]
+
+
+@pytest.mark.parametrize("mode", ["shrink", "wrap"])
+def test_line_overflowing_at_the_size_floor_wraps_in_a_tall_box(layout, mode):
+    text = "نما الإيراد في كل المناطق خلال الربع الثالث"
+    box_width = width(text, 12) * MIN_FIT_SCALE / 2
+    [(size, lines)] = place(layout, [sentence(text, 5, 100, 5 + box_width, 300)], mode=mode)
+
+    assert len(lines) > 1
+    assert size >= 12 * MIN_FIT_SCALE
+    assert " ".join(segments[0][1] for _, _, segments in lines) == RTL_LETTER.sub("x", text)
+    for row, (x, baseline, segments) in enumerate(lines):
+        assert x >= 5
+        assert baseline == pytest.approx(100 + size * (BASELINE + LINE_SPACING * row))
+    assert len(lines) * size * LINE_SPACING <= 200
+
+
+def test_shrink_mode_does_not_wrap_lines_that_fit_at_a_smaller_size(layout):
+    text = "Revenue grew strongly across all regions"
+    [(size, lines)] = place(layout, [sentence(text, 50, 100, 50 + width(text, 12) * 0.8, 300)])
+    assert len(lines) == 1
+    assert size == pytest.approx(12 * 0.8)
@@ -0,0 +1,69 @@
+import tracemalloc
+import pytest
+from translation_memory import TranslationMemory
+from tm_io import export_file, import_file, iter_csv_pairs, iter_tmx_pairs
+
+PAIRS = [("Revenue grew 12% in 2023.", "نما الإيراد 12% في 2023."),
+         ('Quotes "and" <tags> & ampersands', 'علامات "و" <وسوم> & رموز'),
+         ("Comma, separated, text", "نص، مفصول، بفواصل")]
+
+
+@pytest.fixture
+def memory(tmp_path):
+    memory = TranslationMemory(str(tmp_path / "tm.sqlite"))
+    yield memory
+    memory.close()
+
+
+@pytest.mark.parametrize("file_format", ["tmx", "csv"])
+def test_export_import_round_trip(tmp_path, memory, file_format):
+    memory.add_many(PAIRS)
+    path = tmp_path / f"export.{file_format}"
+    assert export_file(memory, str(path)) == len(PAIRS)
+
+    copy = TranslationMemory(str(tmp_path / "copy.sqlite"))
+    try:
+        assert import_file(copy, str(path)) == len(PAIRS)
+        assert sorted(copy.iter_segments()) == sorted(PAIRS)
+    finally:
+        copy.close()
+
+
+def test_tmx_language_codes_match_regional_variants(tmp_path):
+    path = tmp_path / "corpus.tmx"
+    path.write_text('<?xml version="1.0" encoding="UTF-8"?><tmx version="1.1"><body>'
+                    '<tu><tuv lang="EN-US"><seg>Hello</seg></tuv><tuv lang="ar_SA"><seg>مرحبا</seg></tuv></tu>'
+                    '<tu><tuv lang="en"><seg>No target</seg></tuv></tu>'
+                    '</body></tmx>', encoding="utf-8")
+    assert list(iter_tmx_pairs(str(path))) == [("Hello", "مرحبا")]
+
+
+def test_csv_columns_by_header_or_position(tmp_path):
+    with_header = tmp_path / "header.csv"
+    with_header.write_text("id,AR,EN\n1,مرحبا,Hello\n2,,Empty\n", encoding="utf-8")
+    assert list(iter_csv_pairs(str(with_header))) == [("Hello", "مرحبا")]
+
+    positional = tmp_path / "plain.csv"
+    positional.write_text("Hello,مرحبا\nBye,وداعا\n", encoding="utf-8")
+    assert list(iter_csv_pairs(str(positional))) == [("Hello", "مرحبا"), ("Bye", "وداعا")]
+
+
+def test_tmx_streaming_memory_stays_flat(tmp_path):
+    path = tmp_path / "large.tmx"
+    segments = 20000
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?><tmx version="1.4"><header/><body>\n')
+        for number in range(segments):
+            f.write(f'<tu><tuv xml:lang="en"><seg>Segment {number} of a large corpus</seg></tuv>'
+                    f'<tuv xml:lang="ar"><seg>المقطع {number}</seg></tuv></tu>\n')
+        f.write('</body></tmx>\n')
+
+    tracemalloc.start()
+    try:
+        count = sum(1 for _ in iter_tmx_pairs(str(path)))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert count == segments
+    # Parsed units are released as they are read; keeping them would cost about 1.2 KB each (~24 MB here)
+    assert peak < 2 * 1024 * 1024
@@ -0,0 +1,43 @@
+import pytest
+from translation_backends import HTTPBackend, TranslationBackend
+from translation_batcher import BatchingBackend
+from mock_translation_server import fake_translate
+
+
+class ShortBackend(TranslationBackend):
+    """Drops the last translation of every batch"""
+
+    name = "short"
+
+    def _translate_batch(self, texts, source, target):
+        return [fake_translate(text, target) for text in texts[:-1]]
+
+
+def test_merges_concurrent_calls_into_one_engine_batch(mock_server):
+    server, url = mock_server(request_latency=0.05)
+    batcher = BatchingBackend(HTTPBackend(url=url, max_concurrency=1), window_ms=20)
+
+    futures = [batcher.submit(f"Line {i % 5}.", "en", "fr") for i in range(12)]
+
+    assert [future.result(timeout=5) for future in futures] == [fake_translate(f"Line {i % 5}.", "fr")
+                                                                 for i in range(12)]
+    # Duplicates are translated once
+    assert server.stats["items"] == 5
+    assert server.stats["requests"] <= 2
+
+
+def test_short_engine_result_fails_every_future():
+    batcher = BatchingBackend(ShortBackend(), window_ms=20)
+
+    futures = [batcher.submit(text) for text in ("one", "two", "three")]
+
+    for future in futures:
+        with pytest.raises(RuntimeError, match="returned 2 translations for 3 texts"):
+            future.result(timeout=5)
+
+
+def test_native_batching_only_for_batch_engines():
+    from translation_backends import ArgosBackend, CTranslate2Backend, GoogleBackend
+
+    assert HTTPBackend.native_batching and CTranslate2Backend.native_batching
+    assert not ArgosBackend.native_batching and not GoogleBackend.native_batching
@@ -0,0 +1,131 @@
+import threading
+import pytest
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from translation_dispatch import AdaptiveConcurrency, HedgedDispatcher
+
+
+def warm_up(dispatcher, count):
+    """Finish `count` quick items so the dispatcher has latency samples to hedge against"""
+    for number in range(count):
+        assert dispatcher.submit(f"fast {number}").result(timeout=2) == f"primary:fast {number}"
+
+
+def test_straggler_is_hedged_and_the_hedge_wins():
+    release = threading.Event()
+
+    def work(payload):
+        if payload == "slow":
+            release.wait(5)
+        return f"primary:{payload}"
+
+    dispatcher = HedgedDispatcher(work, hedge_fn=lambda payload: f"hedge:{payload}", min_samples=3,
+                                  hedge_percentile=50, tick_seconds=0.01)
+    try:
+        warm_up(dispatcher, 3)
+        assert dispatcher.submit("slow").result(timeout=2) == "hedge:slow"
+        assert dispatcher.stats["hedges"] == 1
+        assert dispatcher.stats["hedge_wins"] == 1
+    finally:
+        release.set()
+        dispatcher.close()
+
+
+def test_item_times_out_at_its_deadline():
+    release = threading.Event()
+    dispatcher = HedgedDispatcher(lambda payload: release.wait(5), deadline_seconds=0.2, tick_seconds=0.01)
+    try:
+        future = dispatcher.submit("stuck")
+        with pytest.raises(FutureTimeoutError):
+            future.result(timeout=2)
+        assert dispatcher.stats["timeouts"] == 1
+    finally:
+        release.set()
+        dispatcher.close()
+
+
+def test_every_failed_attempt_fails_the_item():
+    def work(payload):
+        raise RuntimeError(f"engine down for {payload}")
+
+    with HedgedDispatcher(work, tick_seconds=0.01) as dispatcher:
+        with pytest.raises(RuntimeError, match="engine down"):
+            dispatcher.submit("line").result(timeout=2)
+        assert dispatcher.stats["errors"] == 1
+
+
+class DelayedHedgeDispatcher(HedgedDispatcher):
+    """Holds each hedge back until the primary's failure has been handled, widening the start-up window"""
+
+    def __init__(self, *args, **kwargs):
+        self.hedge_chosen = threading.Event()
+        self.primary_failed = threading.Event()
+        super().__init__(*args, **kwargs)
+
+    def _start_attempt(self, item, pool, fn, hedge):
+        if hedge:
+            self.hedge_chosen.set()
+            assert self.primary_failed.wait(2)
+        super()._start_attempt(item, pool, fn, hedge)
+
+    def _on_attempt_done(self, item, attempt, hedge):
+        super()._on_attempt_done(item, attempt, hedge)
+        if not hedge and attempt.exception() is not None:
+            self.primary_failed.set()
+
+
+def test_primary_failing_before_its_hedge_starts_leaves_the_item_to_the_hedge():
+    dispatcher = None
+
+    def work(payload):
+        if payload == "flaky":
+            assert dispatcher.hedge_chosen.wait(2)
+            raise RuntimeError("primary failed")
+        return f"primary:{payload}"
+
+    dispatcher = DelayedHedgeDispatcher(work, hedge_fn=lambda payload: f"hedge:{payload}", min_samples=3,
+                                        hedge_percentile=50, tick_seconds=0.01)
+    try:
+        warm_up(dispatcher, 3)
+        assert dispatcher.submit("flaky").result(timeout=3) == "hedge:flaky"
+        assert dispatcher.stats["errors"] == 0
+    finally:
+        dispatcher.close()
+
+
+def complete(controller, count, latency=0.01, ok=True):
+    for _ in range(count):
+        controller.acquire()
+        controller.release(latency, ok)
+
+
+def test_aimd_limit_rises_on_healthy_windows_and_drops_on_errors():
+    # CPU load on the test machine must not decide the outcome
+    controller = AdaptiveConcurrency(initial=2, max_limit=6, window=5, cpu_saturation=float("inf"))
+
+    complete(controller, 5)
+    complete(controller, 5)
+    assert int(controller.limit) == 4
+
+    complete(controller, 5, ok=False)
+    assert controller.limit == pytest.approx(4 * 0.7)
+    assert controller.history[-1]["decrease_reason"] == "errors"
+
+    complete(controller, 5 * 10)
+    assert int(controller.limit) == 6
+    assert controller.snapshot()["bounds"] == [1, 6]
+
+
+def test_aimd_limit_drops_when_latency_degrades():
+    controller = AdaptiveConcurrency(initial=4, max_limit=8, window=5, cpu_saturation=float("inf"))
+    complete(controller, 5, latency=0.01)
+    complete(controller, 5, latency=0.05)
+    assert controller.limit == pytest.approx(5 * 0.7)
+    assert controller.history[-1]["decrease_reason"] == "latency"
+
+
+def test_try_acquire_respects_the_current_limit():
+    controller = AdaptiveConcurrency(initial=2, window=100)
+    assert controller.try_acquire() and controller.try_acquire()
+    assert not controller.try_acquire()
+    controller.release(0.01)
+    assert controller.try_acquire()
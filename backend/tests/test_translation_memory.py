@@ -0,0 +1,100 @@
+import sqlite3
+import pytest
+from translation_memory import TranslationMemory, mask_numbers, minhash_signatures, lsh_keys
+
+REPORT = ("Revenue grew 12% in 2023.", "نما الإيراد 12% في 2023.")
+HANDOFF = ("Please send the quarterly file to the Contoso support team before Friday.",
+           "يرجى إرسال الملف الفصلي إلى فريق دعم Contoso قبل يوم الجمعة.")
+
+
+@pytest.fixture
+def memory(tmp_path):
+    memory = TranslationMemory(str(tmp_path / "tm.sqlite"))
+    memory.add_many([REPORT, HANDOFF])
+    yield memory
+    memory.close()
+
+
+def test_mask_numbers_masks_every_numeric_form():
+    assert mask_numbers("Paid  1,250.50 on 12/05/2024 at 10:30 (15%).") == "Paid <#> on <#> at <#> (<#>)."
+
+
+def test_exact_match_ignores_whitespace(memory):
+    assert memory.lookup("Revenue  grew 12%\tin 2023.") == (REPORT[1], "exact")
+
+
+def test_masked_match_substitutes_new_numbers(memory):
+    assert memory.lookup("Revenue grew 15% in 2024.") == ("نما الإيراد 15% في 2024.", "masked")
+
+
+def test_fuzzy_match_swaps_tokens_copied_verbatim(memory):
+    translated, match = memory.lookup("Please send the quarterly file to the Fabrikam support team before Friday.")
+    assert translated == HANDOFF[1].replace("Contoso", "Fabrikam")
+    assert match.startswith("fuzzy:")
+
+
+def test_changed_words_the_translation_does_not_copy_miss(memory):
+    assert memory.lookup("Please send the quarterly file to the Contoso sales team before Friday.") == (None, None)
+    assert memory.lookup("Revenue fell 12% in 2023.") == (None, None)
+    assert memory.stats == {"exact": 0, "masked": 0, "fuzzy": 0, "misses": 2}
+
+
+def test_language_pairs_are_separate(memory):
+    assert memory.lookup(REPORT[0], "en", "fr") == (None, None)
+    assert memory.count() == 2 and memory.count("en", "fr") == 0
+
+
+def test_add_many_updates_existing_segments(memory):
+    assert memory.add_many([(REPORT[0], "first"), (REPORT[0], "second"), ("", "ignored")]) == 1
+    assert memory.lookup(REPORT[0]) == ("second", "exact")
+    assert memory.count() == 2
+
+
+def test_iter_segments_pages_through_everything(memory):
+    memory.add_many([(f"Segment {i} text.", f"ترجمة {i}") for i in range(7)])
+    assert len(list(memory.iter_segments(batch_size=3))) == 9
+
+
+def test_lsh_keys_match_for_identical_texts_only():
+    keys = lsh_keys(minhash_signatures(["the board approved the plan", "the board approved the plan",
+                                        "completely different words entirely"]))
+    assert (keys[0] == keys[1]).all()
+    assert (keys[0] != keys[2]).sum() > 0
+
+
+def test_fuzzy_lookup_is_not_crowded_out_by_other_language_pairs(tmp_path):
+    memory = TranslationMemory(str(tmp_path / "fan_out.sqlite"))
+    try:
+        # A fan-out stores the same English source once per target language; those rows share LSH buckets
+        for number in range(60):
+            memory.add(HANDOFF[0], f"translation {number} of Contoso", target_lang=f"x{number}")
+        memory.add(*HANDOFF, target_lang="ar")
+
+        translated, match = memory.lookup(HANDOFF[0].replace("Contoso", "Fabrikam"), target_lang="ar")
+        assert translated == HANDOFF[1].replace("Contoso", "Fabrikam")
+        assert match.startswith("fuzzy:")
+    finally:
+        memory.close()
+
+
+def test_opening_a_database_with_unscoped_lsh_keeps_fuzzy_matches(tmp_path):
+    path = str(tmp_path / "old.sqlite")
+    TranslationMemory(path).close()
+    with sqlite3.connect(path) as conn:
+        conn.executescript("""
+            DROP TABLE lsh;
+            CREATE TABLE lsh (band INTEGER NOT NULL, bucket INTEGER NOT NULL, segment_id INTEGER NOT NULL,
+                              PRIMARY KEY (band, bucket, segment_id)) WITHOUT ROWID;
+        """)
+        conn.execute("INSERT INTO segments VALUES (1, 'en', 'ar', ?, ?, ?, '2024-01-01')",
+                     (HANDOFF[0], mask_numbers(HANDOFF[0]), HANDOFF[1]))
+        keys = lsh_keys(minhash_signatures([mask_numbers(HANDOFF[0])]))[0].tolist()
+        conn.executemany("INSERT INTO lsh VALUES (?, ?, 1)", list(enumerate(keys)))
+
+    memory = TranslationMemory(path)
+    try:
+        translated, match = memory.lookup(HANDOFF[0].replace("Contoso", "Fabrikam"))
+        assert translated == HANDOFF[1].replace("Contoso", "Fabrikam")
+        assert match.startswith("fuzzy:")
+    finally:
+        memory.close()
@@ -0,0 +1,210 @@
+"""
+Fit-to-box layout for translated lines.
+
+Translations are rarely as wide as the text they replace. Line widths come from
+per-font glyph advance arrays (built once per process from the registry's fonts),
+gathered for all of a page's lines at once, so fitted sizes need no stringWidth
+search. Right-to-left lines are right-aligned to their original box.
+"""
+import os
+import re
+import logging
+import threading
+import numpy as np
+from reportlab.pdfbase import pdfmetrics
+from font_registry import get_font_registry
+
+logger = logging.getLogger(__name__)
+
+# shrink: scale a line down until it fits its box (wrapping it only if it still overflows at the size floor);
+# wrap: also break lines over taller boxes whenever that beats shrinking; off: source size
+TEXT_FIT = os.environ.get("TEXT_FIT", "shrink")
+# Fitted sizes never go below this fraction of the source size
+MIN_FIT_SCALE = float(os.environ.get("TEXT_FIT_MIN_SCALE", "0.5"))
+# Baseline below the box top, in font sizes (where the overlays always put it)
+BASELINE = 0.8
+# Baseline-to-baseline distance of wrapped lines, in font sizes
+LINE_SPACING = 1.2
+# Share of the box width a wrapped line is assumed to fill when estimating the row count
+WRAP_FILL = 0.9
+# Candidate wrap sizes, as fractions of the source size
+WRAP_SCALES = 16
+RTL_LETTER = re.compile('[\u0590-\u08FF\uFB1D-\uFDFF\uFE70-\uFEFF]')
+
+
+def _codepoints(texts):
+    """All texts as one code point array, plus each text's length"""
+    lengths = np.fromiter(map(len, texts), dtype=np.int64, count=len(texts))
+    return np.frombuffer("".join(texts).encode("utf-32-le"), dtype=np.uint32).astype(np.int64), lengths
+
+
+class TextLayout:
+    """Glyph advance arrays per font (thousandths of the font size, by code point) and page-at-a-time fitting"""
+
+    def __init__(self, registry=None):
+        self.registry = registry or get_font_registry()
+        self._advances = {}
+        self._lock = threading.Lock()
+
+    def advances(self, font_name):
+        """Advance of every code point the font covers; the last slot (default width) serves anything beyond"""
+        table = self._advances.get(font_name)
+        if table is None:
+            with self._lock:
+                table = self._advances.get(font_name)
+                if table is None:
+                    table = self._advances[font_name] = self._build(font_name)
+        return table
+
+    def _build(self, font_name):
+        self.registry.load(font_name)
+        font = pdfmetrics.getFont(font_name)
+        coverage = self.registry.coverage(font_name)
+        size = max(coverage, default=0) + 2
+        if font._dynamicFont:
+            # Same widths reportlab's stringWidth sums for TrueType fonts
+            face = font.face
+            table = np.full(size, float(face.defaultWidth))
+            codes = np.fromiter(face.charWidths, dtype=np.int64, count=len(face.charWidths))
+            keep = codes < size
+            table[codes[keep]] = np.fromiter(face.charWidths.values(), dtype=np.float64, count=len(codes))[keep]
+        else:
+            # Standard-14 widths, including the Symbol/ZapfDingbats substitutes reportlab draws them with
+            table = np.zeros(size)
+            codes = sorted(coverage)
+            table[codes] = [pdfmetrics.stringWidth(chr(code), font_name, 1000) for code in codes]
+        logger.debug(f"Advance table for {font_name}: {len(coverage)} glyphs")
+        return table
+
+    def widths(self, runs):
+        """Width at size 1 of each [(font name, text), ...] run, in one gather per font"""
+        owners, font_names, texts = [], [], []
+        for owner, segments in enumerate(runs):
+            for font_name, text in segments:
+                owners.append(owner)
+                font_names.append(font_name)
+                texts.append(text)
+        if not texts:
+            return np.zeros(len(runs))
+        codes, lengths = _codepoints(texts)
+        fonts = sorted(set(font_names))
+        code_fonts = np.repeat(np.array([fonts.index(name) for name in font_names]), lengths)
+        advance = np.empty(len(codes))
+        for font_id, font_name in enumerate(fonts):
+            table = self.advances(font_name)
+            mask = code_fonts == font_id
+            advance[mask] = table[np.minimum(codes[mask], len(table) - 1)]
+        return np.bincount(np.repeat(np.array(owners), lengths), weights=advance, minlength=len(runs)) / 1000
+
+    def layout_page(self, sentences, shape, chain_of, mode=None):
+        """
+        Place a page's line database sentences in their boxes. shape turns a logical line into its display
+        string and chain_of gives a sentence's FontChain. Returns, per sentence, (font size,
+        [(x, baseline from the page top, [(font name, text), ...]), ...]).
+        """
+        mode = TEXT_FIT if mode is None else mode
+        texts = [shape(sentence['text']) for sentence in sentences]
+        chains = [chain_of(sentence) for sentence in sentences]
+        segments = [chain.segment_text(text) for chain, text in zip(chains, texts)]
+        sizes = np.array([float(sentence.get('size', 12) or 0) for sentence in sentences])
+        boxes = np.array([_box(sentence) for sentence in sentences]).reshape(-1, 4)
+        box_widths = boxes[:, 2] - boxes[:, 0]
+        unit = self.widths(segments)
+        rtl = np.array([bool(RTL_LETTER.search(text)) for text in texts], dtype=bool)
+
+        fitted = sizes.copy()
+        wrap = np.full(len(sentences), mode == "wrap")
+        if mode != "off":
+            overflow = (unit * sizes > box_widths) & (unit > 0)
+            fitted = np.where(overflow, np.maximum(box_widths / np.maximum(unit, 1e-9), sizes * MIN_FIT_SCALE), sizes)
+            # Lines still too wide at the size floor are wrapped where their box is tall enough, even in shrink mode
+            wrap |= unit * fitted > box_widths * (1 + 1e-9)
+        wrapped = self._wrap(sentences, shape, chains, sizes, fitted, boxes, unit, wrap) if wrap.any() else {}
+
+        placements = []
+        for i, sentence in enumerate(sentences):
+            if not sentence['text'].strip() or not sizes[i]:
+                placements.append((sizes[i], []))
+            elif i in wrapped:
+                placements.append(wrapped[i])
+            else:
+                x = boxes[i, 0]
+                if mode != "off" and rtl[i] and np.isfinite(box_widths[i]):
+                    # Right-aligned, unless the line overflows anyway: then it starts at the box like LTR text
+                    x = max(boxes[i, 2] - unit[i] * fitted[i], boxes[i, 0])
+                # Single lines keep the source baseline, so shrunk text stays in line with its neighbours
+                placements.append((fitted[i], [(x, boxes[i, 1] + sizes[i] * BASELINE, segments[i])]))
+        return placements
+
+    def _wrap(self, sentences, shape, chains, sizes, fitted, boxes, unit, allowed):
+        """Multi-row placements for overflowing allowed lines whose box holds several rows at a larger size than shrinking"""
+        box_widths, box_heights = boxes[:, 2] - boxes[:, 0], boxes[:, 3] - boxes[:, 1]
+        scales = np.linspace(1, MIN_FIT_SCALE, WRAP_SCALES)
+        candidate_sizes = sizes[:, None] * scales[None, :]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rows = np.floor(box_heights[:, None] / (candidate_sizes * LINE_SPACING))
+            needed = np.ceil(unit[:, None] * candidate_sizes / (np.maximum(box_widths, 1e-9)[:, None] * WRAP_FILL))
+        fits = (needed <= rows) & (rows >= 2)
+        # Largest candidate size whose estimated row count fits the box height, where it beats shrinking
+        wrap_sizes = np.where(fits.any(axis=1), candidate_sizes[np.arange(len(sizes)), fits.argmax(axis=1)], 0)
+        # Lines overflowing at the size floor wrap at any size that fits, even the floor itself
+        better = (wrap_sizes > fitted) | ((unit * fitted > box_widths * (1 + 1e-9)) & (wrap_sizes > 0))
+        candidates = [i for i in np.flatnonzero(allowed & better & (fitted < sizes)) if sentences[i]['text'].strip()]
+        if not candidates:
+            return {}
+
+        words = {i: sentences[i]['text'].split() for i in candidates}
+        word_texts = [shape(word) for i in candidates for word in words[i]]
+        word_chains = [chains[i] for i in candidates for _ in words[i]]
+        word_widths = iter(self.widths([chain.segment_text(text) for chain, text in zip(word_chains, word_texts)]))
+        space = self.widths([chains[i].segment_text(" ") for i in candidates])
+
+        rows_by_sentence = {}
+        for number, i in enumerate(candidates):
+            capacity = box_widths[i] / wrap_sizes[i]
+            rows, row, width = [], [], 0.0
+            for word in words[i]:
+                advance = next(word_widths)
+                if row and width + space[number] + advance > capacity:
+                    rows.append(" ".join(row))
+                    row, width = [], 0.0
+                width += (space[number] if row else 0.0) + advance
+                row.append(word)
+            rows.append(" ".join(row))
+            if len(rows) * wrap_sizes[i] * LINE_SPACING <= box_heights[i]:
+                rows_by_sentence[i] = rows
+
+        lines = [(i, text) for i, rows in rows_by_sentence.items() for text in rows]
+        display = [shape(text) for _, text in lines]
+        line_segments = [chains[i].segment_text(text) for (i, _), text in zip(lines, display)]
+        line_widths = self.widths(line_segments)
+        wrapped = {}
+        for (i, _), text, segments, width in zip(lines, display, line_segments, line_widths):
+            font_size = wrap_sizes[i]
+            placed = wrapped.setdefault(i, (font_size, []))[1]
+            x = max(boxes[i, 2] - width * font_size, boxes[i, 0]) if RTL_LETTER.search(text) else boxes[i, 0]
+            placed.append((x, boxes[i, 1] + font_size * (BASELINE + LINE_SPACING * len(placed)), segments))
+        return wrapped
+
+
+def _box(sentence):
+    """(x0, top, x1, bottom) of a sentence; boxes without a bottom-right corner are unbounded"""
+    coordinates = sentence['coordinates']
+    x0, top = coordinates['top_left']['x'], coordinates['top_left']['y']
+    bottom_right = coordinates.get('bottom_right')
+    if not bottom_right:
+        return x0, top, np.inf, np.inf
+    return x0, top, bottom_right['x'], bottom_right['y']
+
+
+_layout = None
+_layout_lock = threading.Lock()
+
+
+def get_text_layout():
+    """Process-wide layout engine (advance tables are built once per font)"""
+    global _layout
+    with _layout_lock:
+        if _layout is None:
+            _layout = TextLayout()
+        return _layout
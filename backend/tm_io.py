@@ -0,0 +1,177 @@
+"""
+Bulk import/export of translation memory in TMX and CSV.
+
+Usage:
+    python tm_io.py import corpus.tmx
+    python tm_io.py import corpus.csv --source-lang en --target-lang ar
+    python tm_io.py export memory.tmx
+"""
+import os
+import csv
+import time
+import logging
+import argparse
+import itertools
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
+from xml.sax.saxutils import escape, quoteattr
+from translation_memory import get_translation_memory
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = os.path.join("storage", "translation_memory.sqlite")
+XML_LANG = "{http://www.w3.org/XML/1998/namespace}lang"
+IMPORT_BATCH_SIZE = 5000
+
+
+def _lang_matches(code, lang):
+    """'en-US' and 'EN_us' both match 'en'"""
+    return (code or "").lower().replace("_", "-").split("-")[0] == lang
+
+
+def iter_tmx_pairs(path, source_lang="en", target_lang="ar"):
+    """Stream (source, target) pairs from a TMX file; memory use stays flat regardless of file size"""
+    # Open elements, innermost last: a unit's parent (<body>) is still being built while its units are read
+    open_elements = []
+    for event, elem in ET.iterparse(path, events=("start", "end")):
+        if event == "start":
+            open_elements.append(elem)
+            continue
+        open_elements.pop()
+        if elem.tag != "tu":
+            continue
+        texts = {}
+        for tuv in elem.iter("tuv"):
+            # TMX 1.4 uses xml:lang, 1.1 used a plain lang attribute
+            code = tuv.get(XML_LANG) or tuv.get("lang")
+            seg = tuv.find("seg")
+            if seg is not None:
+                for lang in (source_lang, target_lang):
+                    if _lang_matches(code, lang) and lang not in texts:
+                        texts[lang] = "".join(seg.itertext()).strip()
+        if texts.get(source_lang) and texts.get(target_lang):
+            yield texts[source_lang], texts[target_lang]
+        # Drop the parsed unit from its parent too, or every finished unit stays attached to <body>
+        elem.clear()
+        if open_elements:
+            open_elements[-1].remove(elem)
+
+
+def iter_csv_pairs(path, source_lang="en", target_lang="ar", source_column=None, target_column=None):
+    """
+    Stream (source, target) pairs from a CSV file.
+    Columns are picked by name from a header row (defaulting to the language codes),
+    otherwise the first two columns are used.
+    """
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f)
+        first = next(reader, None)
+        if first is None:
+            return
+
+        header = [cell.strip().lower() for cell in first]
+        source_name = (source_column or source_lang).lower()
+        target_name = (target_column or target_lang).lower()
+        if source_name in header and target_name in header:
+            source_index, target_index = header.index(source_name), header.index(target_name)
+            rows = reader
+        else:
+            source_index, target_index = 0, 1
+            rows = itertools.chain([first], reader)
+
+        width = max(source_index, target_index)
+        for row in rows:
+            if len(row) > width and row[source_index].strip() and row[target_index].strip():
+                yield row[source_index], row[target_index]
+
+
+def import_pairs(memory, pairs, source_lang="en", target_lang="ar", batch_size=IMPORT_BATCH_SIZE):
+    """Insert pairs into the memory in batched transactions; returns the number of segments stored"""
+    imported = 0
+    started = time.monotonic()
+    batch = []
+    for pair in pairs:
+        batch.append(pair)
+        if len(batch) >= batch_size:
+            imported += memory.add_many(batch, source_lang, target_lang)
+            batch = []
+            logger.info(f"Imported {imported} segments ({imported / (time.monotonic() - started):.0f}/s)")
+    imported += memory.add_many(batch, source_lang, target_lang)
+    return imported
+
+
+def import_file(memory, path, source_lang="en", target_lang="ar", file_format=None, **options):
+    """Import a TMX or CSV file (format taken from the extension unless given)"""
+    file_format = (file_format or os.path.splitext(path)[1].lstrip(".")).lower()
+    if file_format == "tmx":
+        pairs = iter_tmx_pairs(path, source_lang, target_lang)
+    elif file_format == "csv":
+        pairs = iter_csv_pairs(path, source_lang, target_lang, **options)
+    else:
+        raise ValueError(f"Unsupported translation memory format '{file_format}'. Use tmx or csv.")
+    return import_pairs(memory, pairs, source_lang, target_lang)
+
+
+def export_tmx(memory, path, source_lang="en", target_lang="ar"):
+    """Write the memory for one language pair as TMX 1.4, streaming from the database"""
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<tmx version="1.4">\n')
+        f.write(f'  <header creationtool="EffiLayouter" creationtoolversion="1.0" segtype="sentence" '
+                f'o-tmf="sqlite" adminlang="en" srclang={quoteattr(source_lang)} datatype="plaintext" '
+                f'creationdate="{datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")}"/>\n  <body>\n')
+        for source, target in memory.iter_segments(source_lang, target_lang):
+            f.write(f'    <tu>\n'
+                    f'      <tuv xml:lang={quoteattr(source_lang)}><seg>{escape(source)}</seg></tuv>\n'
+                    f'      <tuv xml:lang={quoteattr(target_lang)}><seg>{escape(target)}</seg></tuv>\n'
+                    f'    </tu>\n')
+            count += 1
+        f.write('  </body>\n</tmx>\n')
+    return count
+
+
+def export_csv(memory, path, source_lang="en", target_lang="ar"):
+    """Write the memory for one language pair as a two-column CSV with a language-code header"""
+    count = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow([source_lang, target_lang])
+        for source, target in memory.iter_segments(source_lang, target_lang):
+            writer.writerow([source, target])
+            count += 1
+    return count
+
+
+def export_file(memory, path, source_lang="en", target_lang="ar", file_format=None):
+    """Export to TMX or CSV (format taken from the extension unless given)"""
+    file_format = (file_format or os.path.splitext(path)[1].lstrip(".")).lower()
+    if file_format == "tmx":
+        return export_tmx(memory, path, source_lang, target_lang)
+    if file_format == "csv":
+        return export_csv(memory, path, source_lang, target_lang)
+    raise ValueError(f"Unsupported translation memory format '{file_format}'. Use tmx or csv.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import or export translation memory (TMX/CSV)")
+    parser.add_argument("command", choices=["import", "export"])
+    parser.add_argument("path", help="TMX or CSV file")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="Translation memory database")
+    parser.add_argument("--source-lang", default="en")
+    parser.add_argument("--target-lang", default="ar")
+    parser.add_argument("--format", choices=["tmx", "csv"], help="Override the format implied by the extension")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    memory = get_translation_memory(args.db)
+    started = time.monotonic()
+    if args.command == "import":
+        count = import_file(memory, args.path, args.source_lang, args.target_lang, args.format)
+        logger.info(f"Imported {count} segments into {args.db} in {time.monotonic() - started:.1f}s")
+    else:
+        count = export_file(memory, args.path, args.source_lang, args.target_lang, args.format)
+        logger.info(f"Exported {count} segments to {args.path} in {time.monotonic() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+import os
+import re
+import logging
+import threading
+import time
+from collections import OrderedDict
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+# Engine selection is configuration, not code: override per node with env vars
+DEFAULT_BACKEND = os.environ.get("TRANSLATION_BACKEND", "argos")
+DEFAULT_HTTP_URL = os.environ.get("TRANSLATION_BACKEND_URL", "http://127.0.0.1:5000")
+# Loaded Argos language-pair models kept in memory; the least recently used one is dropped beyond this
+ARGOS_MAX_LOADED_MODELS = int(os.environ.get("ARGOS_MAX_LOADED_MODELS", "4"))
+# Seconds before a language pair whose install failed is tried again (index or download errors are often transient)
+ARGOS_INSTALL_RETRY_SECONDS = float(os.environ.get("ARGOS_INSTALL_RETRY_SECONDS", "300"))
+# CTranslate2 engine settings for the Argos models: int8 weights, greedy decoding and one
+# worker per concurrency slot suit bulk jobs; CT2_BEAM_SIZE=4 matches Argos' own decoding
+CT2_DEVICE = os.environ.get("CT2_DEVICE", "cpu")
+CT2_COMPUTE_TYPE = os.environ.get("CT2_COMPUTE_TYPE", "int8")
+CT2_INTER_THREADS = int(os.environ.get("CT2_INTER_THREADS", "1"))
+CT2_INTRA_THREADS = int(os.environ.get("CT2_INTRA_THREADS", "0"))
+CT2_BEAM_SIZE = int(os.environ.get("CT2_BEAM_SIZE", "1"))
+CT2_MAX_BATCH_SIZE = int(os.environ.get("CT2_MAX_BATCH_SIZE", "32"))
+SENTENCE_SPLIT_RE = re.compile(r'(?<=[.!?])\s+(?=\S)')
+
+
+class TranslationBackend:
+    """Base class for translation engines with a per-backend concurrency limit"""
+
+    name = "base"
+    service_name = "base"
+    default_concurrency = 4
+    # Random pause (seconds) around each request; only rate-limited public services need it
+    request_delay = (0.0, 0.0)
+    # Whether translate_batch runs a whole batch in one engine call; only then does cross-job batching pay off
+    native_batching = False
+
+    def __init__(self, max_concurrency=None):
+        self.max_concurrency = max_concurrency or self.default_concurrency
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+
+    @property
+    def available(self):
+        """Whether the engine can translate on this node"""
+        return True
+
+    def supports(self, source, target):
+        """Whether the engine can translate this language pair"""
+        return self.available
+
+    @property
+    def engine_concurrency(self):
+        """Calls the engine itself runs at once; fronts that only queue calls report their engine's limit"""
+        return self.max_concurrency
+
+    def describe(self):
+        """Engine summary for job metadata"""
+        return {"name": self.name, "service": self.service_name, "max_concurrency": self.max_concurrency}
+
+    def translate(self, text, source="en", target="ar"):
+        """Translate a single string"""
+        return self.translate_batch([text], source, target)[0]
+
+    def translate_batch(self, texts, source="en", target="ar"):
+        """Translate a list of strings, holding one concurrency slot for the whole batch"""
+        if not texts:
+            return []
+        with self._slots:
+            return self._translate_batch(list(texts), source, target)
+
+    def _translate_batch(self, texts, source, target):
+        raise NotImplementedError
+
+
+class ArgosBackend(TranslationBackend):
+    """Local Argos Translate (CTranslate2) models"""
+
+    name = "argos"
+    service_name = "ArgosTranslate"
+    default_concurrency = max(2, (os.cpu_count() or 2) // 2)
+
+    def __init__(self, max_concurrency=None, max_loaded_models=None):
+        super().__init__(max_concurrency)
+        self.max_loaded_models = max_loaded_models or ARGOS_MAX_LOADED_MODELS
+        self._lock = threading.Lock()
+        # LRU of language-pair models; a multi-language job only keeps its recent pairs loaded
+        self._translations = OrderedDict()
+        # Installs download packages, so they run under a lock per pair rather than the LRU lock
+        self._pair_locks = {}
+        # When each pair's last install failed; it is retried after ARGOS_INSTALL_RETRY_SECONDS
+        self._failed = {}
+
+    @property
+    def available(self):
+        return self.supports("en", "ar")
+
+    def supports(self, source, target):
+        return self._get_translation(source, target) is not None
+
+    def describe(self):
+        with self._lock:
+            loaded = [f"{source}->{target}" for source, target in self._translations]
+        return dict(super().describe(), loaded_models=loaded)
+
+    def _get_translation(self, source, target):
+        """Return the installed language-pair model, installing and loading it on first use"""
+        key = (source, target)
+        with self._lock:
+            found, translation = self._cached(key)
+            if found:
+                return translation
+            pair_lock = self._pair_locks.setdefault(key, threading.Lock())
+        with pair_lock:
+            with self._lock:
+                # Another caller may have installed (or failed to install) the pair while we waited
+                found, translation = self._cached(key)
+                if found:
+                    return translation
+            package = self._install_package(source, target)
+            translation = self._load_model(package, source, target) if package is not None else None
+            with self._lock:
+                if translation is None:
+                    self._failed[key] = time.monotonic()
+                    return None
+                self._failed.pop(key, None)
+                self._translations[key] = translation
+                while len(self._translations) > self.max_loaded_models:
+                    evicted, _ = self._translations.popitem(last=False)
+                    # Jobs still holding the evicted model finish with it; it is reloaded on next use
+                    logger.info(f"Unloading Argos model {evicted[0]}->{evicted[1]}")
+            return translation
+
+    def _cached(self, key):
+        """(found, model) for a loaded pair or one whose install failed recently; call with the lock held"""
+        if key in self._translations:
+            self._translations.move_to_end(key)
+            return True, self._translations[key]
+        failed_at = self._failed.get(key)
+        if failed_at is not None and time.monotonic() - failed_at < ARGOS_INSTALL_RETRY_SECONDS:
+            return True, None
+        return False, None
+
+    def _install_package(self, source, target):
+        """Install an Argos Translate package for the pair if it is missing and return it"""
+        try:
+            import argostranslate.package
+
+            installed = argostranslate.package.get_installed_packages()
+            package = next((p for p in installed if p.from_code == source and p.to_code == target), None)
+            if package is None:
+                logger.info(f"Installing Argos Translate {source}->{target} package...")
+                argostranslate.package.update_package_index()
+                package_to_install = next(
+                    filter(
+                        lambda x: x.from_code == source and x.to_code == target,
+                        argostranslate.package.get_available_packages()
+                    ),
+                    None
+                )
+                if package_to_install is None:
+                    logger.warning(f"Argos package {source}->{target} not found. Translation will be disabled.")
+                    return None
+                argostranslate.package.install_from_path(package_to_install.download())
+                logger.info("Translation package installed successfully!")
+                package = next(p for p in argostranslate.package.get_installed_packages()
+                               if p.from_code == source and p.to_code == target)
+            return package
+        except Exception as e:
+            logger.error(f"Failed to install translation package: {e}")
+            return None
+
+    def _load_model(self, package, source, target):
+        """Load the translator for an installed package"""
+        import argostranslate.translate
+        return argostranslate.translate.get_translation_from_codes(source, target)
+
+    def _translate_batch(self, texts, source, target):
+        translation = self._get_translation(source, target)
+        if translation is None:
+            raise RuntimeError(f"No Argos model installed for {source}->{target}")
+        return [translation.translate(text) for text in texts]
+
+
+class CTranslate2Backend(ArgosBackend):
+    """
+    The Argos models run directly on CTranslate2 with its performance knobs exposed:
+    compute type (int8 quantization), inter/intra-op threads, beam size and batch size.
+    Whole batches go through one translate_batch call instead of Argos' per-sentence loop.
+    """
+
+    name = "ctranslate2"
+    service_name = "CTranslate2"
+    native_batching = True
+
+    def __init__(self, max_concurrency=None, max_loaded_models=None, device=None, compute_type=None,
+                 inter_threads=None, intra_threads=None, beam_size=None, max_batch_size=None):
+        self.device = device or CT2_DEVICE
+        self.compute_type = compute_type or CT2_COMPUTE_TYPE
+        self.inter_threads = inter_threads or CT2_INTER_THREADS
+        # 0 lets CTranslate2 pick (all physical cores divided among inter_threads)
+        self.intra_threads = CT2_INTRA_THREADS if intra_threads is None else intra_threads
+        self.beam_size = beam_size or CT2_BEAM_SIZE
+        self.max_batch_size = max_batch_size or CT2_MAX_BATCH_SIZE
+        # Each in-flight batch occupies one CTranslate2 worker; more slots would only queue inside it
+        super().__init__(max_concurrency or self.inter_threads, max_loaded_models)
+
+    def describe(self):
+        return dict(super().describe(), device=self.device, compute_type=self.compute_type,
+                    inter_threads=self.inter_threads, intra_threads=self.intra_threads,
+                    beam_size=self.beam_size, max_batch_size=self.max_batch_size)
+
+    def _load_model(self, package, source, target):
+        import ctranslate2
+        import sentencepiece
+
+        model_dir = os.path.join(str(package.package_path), "model")
+        translator = ctranslate2.Translator(model_dir, device=self.device, compute_type=self.compute_type,
+                                            inter_threads=self.inter_threads, intra_threads=self.intra_threads)
+        tokenizer = sentencepiece.SentencePieceProcessor(
+            model_file=os.path.join(str(package.package_path), "sentencepiece.model"))
+        logger.info(f"Loaded CTranslate2 model {source}->{target} ({self.compute_type}, {self.device}, "
+                    f"inter_threads={self.inter_threads}, intra_threads={self.intra_threads})")
+        return translator, tokenizer
+
+    def _translate_batch(self, texts, source, target):
+        model = self._get_translation(source, target)
+        if model is None:
+            raise RuntimeError(f"No Argos model installed for {source}->{target}")
+        translator, tokenizer = model
+
+        # The models are trained on sentences: split units, translate all sentences as one batch, rejoin
+        sentences, owners = [], []
+        for index, text in enumerate(texts):
+            for sentence in SENTENCE_SPLIT_RE.split(text.strip()):
+                sentences.append(sentence)
+                owners.append(index)
+        results = translator.translate_batch(tokenizer.encode(sentences, out_type=str), beam_size=self.beam_size,
+                                             max_batch_size=self.max_batch_size, return_scores=False)
+        pieces = [[] for _ in texts]
+        for owner, result in zip(owners, results):
+            pieces[owner].append(tokenizer.decode(result.hypotheses[0]))
+        return [" ".join(parts) for parts in pieces]
+
+
+class GoogleBackend(TranslationBackend):
+    """Google Translate through deep-translator"""
+
+    name = "google"
+    service_name = "GoogleTranslator"
+    default_concurrency = 4
+    request_delay = (0.1, 0.5)
+
+    def _translate_batch(self, texts, source, target):
+        from deep_translator import GoogleTranslator
+
+        translator = GoogleTranslator(source="auto" if source in (None, "auto") else source, target=target)
+        if len(texts) == 1:
+            return [translator.translate(texts[0])]
+        return translator.translate_batch(texts)
+
+
+class HTTPBackend(TranslationBackend):
+    """LibreTranslate-compatible HTTP API with a pooled keep-alive session"""
+
+    name = "http"
+    service_name = "LibreTranslate"
+    default_concurrency = 16
+    native_batching = True
+
+    def __init__(self, max_concurrency=None, url=None, api_key=None, timeout=30):
+        super().__init__(max_concurrency)
+        self.url = (url or DEFAULT_HTTP_URL).rstrip("/")
+        self.api_key = api_key or os.environ.get("TRANSLATION_BACKEND_API_KEY")
+        self.timeout = timeout
+        self.session = requests.Session()
+        # One pooled connection per concurrency slot; retries cover transient 5xx/connection resets
+        retry = Retry(total=3, backoff_factor=0.2, status_forcelist=(502, 503, 504), allowed_methods=None)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_concurrency, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _translate_batch(self, texts, source, target):
+        payload = {"q": texts, "source": source or "auto", "target": target, "format": "text"}
+        if self.api_key:
+            payload["api_key"] = self.api_key
+        response = self.session.post(f"{self.url}/translate", json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        translated = response.json()["translatedText"]
+        return translated if isinstance(translated, list) else [translated]
+
+
+BACKENDS = {
+    ArgosBackend.name: ArgosBackend,
+    CTranslate2Backend.name: CTranslate2Backend,
+    GoogleBackend.name: GoogleBackend,
+    HTTPBackend.name: HTTPBackend,
+}
+
+_instances = {}
+_instances_lock = threading.Lock()
+
+
+def get_backend(name=None, **options):
+    """Return the shared backend instance for `name`, so pools and limits are process-wide"""
+    name = (name or DEFAULT_BACKEND).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown translation backend '{name}'. Available: {sorted(BACKENDS)}")
+
+    if "max_concurrency" not in options and os.environ.get("TRANSLATION_BACKEND_CONCURRENCY"):
+        options["max_concurrency"] = int(os.environ["TRANSLATION_BACKEND_CONCURRENCY"])
+
+    key = (name, tuple(sorted(options.items())))
+    with _instances_lock:
+        if key not in _instances:
+            _instances[key] = BACKENDS[name](**options)
+        return _instances[key]
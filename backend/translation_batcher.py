@@ -0,0 +1,180 @@
+import os
+import time
+import queue
+import logging
+import threading
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from translation_backends import TranslationBackend
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WINDOW_MS = float(os.environ.get("TRANSLATION_BATCH_WINDOW_MS", "2"))
+DEFAULT_MAX_BATCH_SIZE = int(os.environ.get("TRANSLATION_MAX_BATCH_SIZE", "64"))
+
+
+def estimate_tokens(text):
+    """Rough subword token count (about four characters per token)"""
+    return max(1, (len(text) + 3) // 4)
+
+
+def length_bucketed_batches(texts, batch_size, chunk_size=None):
+    """
+    Yield batches of indices into `texts` whose token lengths are similar.
+    Sorting happens within chunks of `chunk_size` items so callers streaming
+    results in document order only ever buffer one chunk.
+    """
+    chunk_size = chunk_size or len(texts) or 1
+    for start in range(0, len(texts), chunk_size):
+        order = sorted(range(start, min(start + chunk_size, len(texts))), key=lambda i: estimate_tokens(texts[i]))
+        for offset in range(0, len(order), batch_size):
+            yield order[offset:offset + batch_size]
+
+
+def padding_efficiency(batches):
+    """Share of real tokens among the padded tokens a model computes for these batches of texts"""
+    useful = padded = 0
+    for batch in batches:
+        lengths = [estimate_tokens(text) for text in batch]
+        useful += sum(lengths)
+        padded += max(lengths, default=0) * len(lengths)
+    return useful / padded if padded else 1.0
+
+
+class BatchingBackend(TranslationBackend):
+    """
+    Process-wide batching front for a backend.
+    translate() calls from every concurrent job are queued; a collector thread gathers
+    them for up to `window_ms` (and for as long as the engine has no free slot) into one
+    translate_batch() call, then routes each result back to its caller.
+    """
+
+    name = "batched"
+
+    def __init__(self, inner, window_ms=DEFAULT_WINDOW_MS, max_batch_size=DEFAULT_MAX_BATCH_SIZE):
+        # Callers only wait on futures here, so allow enough of them to fill every engine slot's batch
+        super().__init__(max_concurrency=inner.max_concurrency * max_batch_size)
+        self.inner = inner
+        self.service_name = inner.service_name
+        self.request_delay = inner.request_delay
+        self.window_seconds = window_ms / 1000.0
+        self.max_batch_size = max_batch_size
+
+        self._queue = queue.Queue()
+        self._engine_slots = threading.Semaphore(inner.max_concurrency)
+        self._pool = ThreadPoolExecutor(max_workers=inner.max_concurrency, thread_name_prefix="translate-batch")
+        self._stats_lock = threading.Lock()
+        self.stats = {"requests": 0, "batches": 0, "largest_batch": 0}
+
+        self._collector = threading.Thread(target=self._collector_loop, daemon=True)
+        self._collector.start()
+
+    @property
+    def available(self):
+        return self.inner.available
+
+    def supports(self, source, target):
+        return self.inner.supports(source, target)
+
+    @property
+    def engine_concurrency(self):
+        return self.inner.engine_concurrency
+
+    def describe(self):
+        with self._stats_lock:
+            stats = dict(self.stats)
+        mean_batch = stats["requests"] / stats["batches"] if stats["batches"] else 0
+        return dict(self.inner.describe(), batching={
+            "window_ms": self.window_seconds * 1000,
+            "max_batch_size": self.max_batch_size,
+            "mean_batch_size": round(mean_batch, 2),
+            **stats
+        })
+
+    def submit(self, text, source="en", target="ar"):
+        """Queue one string for the next batch and return a Future for its translation"""
+        future = Future()
+        self._queue.put((source, target, text, future))
+        return future
+
+    def translate_batch(self, texts, source="en", target="ar"):
+        futures = [self.submit(text, source, target) for text in texts]
+        return [future.result() for future in futures]
+
+    def _collector_loop(self):
+        while True:
+            pending = [self._queue.get()]
+            deadline = time.monotonic() + self.window_seconds
+            while len(pending) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    pending.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            # Wait for engine capacity; whatever queues up in the meantime joins this batch
+            self._engine_slots.acquire()
+            while len(pending) < self.max_batch_size:
+                try:
+                    pending.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            with self._stats_lock:
+                self.stats["requests"] += len(pending)
+                self.stats["batches"] += 1
+                self.stats["largest_batch"] = max(self.stats["largest_batch"], len(pending))
+            self._pool.submit(self._run_batch, pending)
+
+    def _run_batch(self, pending):
+        try:
+            groups = defaultdict(list)
+            for request in pending:
+                groups[(request[0], request[1])].append(request)
+
+            for (source, target), requests in groups.items():
+                # Identical strings from different jobs are translated once; length order lets
+                # engines that split batches internally pad each sub-batch as little as possible
+                unique_texts = sorted(dict.fromkeys(request[2] for request in requests), key=estimate_tokens)
+                try:
+                    results = self.inner.translate_batch(unique_texts, source, target)
+                    if len(results) != len(unique_texts):
+                        raise RuntimeError(f"{self.inner.name} returned {len(results)} translations "
+                                           f"for {len(unique_texts)} texts")
+                except Exception as e:
+                    _fail(requests, e)
+                    continue
+                translated = dict(zip(unique_texts, results))
+                for request in requests:
+                    request[3].set_result(translated[request[2]])
+        except Exception as e:
+            # Every caller is waiting on its future: never leave one unresolved
+            logger.error(f"Batch of {len(pending)} translations failed: {e}")
+            _fail(pending, e)
+        finally:
+            self._engine_slots.release()
+
+
+def _fail(requests, error):
+    """Fail the futures of queued requests that have no result yet"""
+    for request in requests:
+        if not request[3].done():
+            request[3].set_exception(error)
+
+
+_batchers = {}
+_batchers_lock = threading.Lock()
+
+
+def get_batching_backend(inner, window_ms=None, max_batch_size=None):
+    """Return the shared batching front for `inner`, so all jobs using that backend batch together"""
+    with _batchers_lock:
+        if id(inner) not in _batchers:
+            _batchers[id(inner)] = BatchingBackend(
+                inner,
+                window_ms=DEFAULT_WINDOW_MS if window_ms is None else window_ms,
+                max_batch_size=max_batch_size or DEFAULT_MAX_BATCH_SIZE
+            )
+        return _batchers[id(inner)]
@@ -0,0 +1,312 @@
+import os
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+logger = logging.getLogger(__name__)
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty sequence"""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD concurrency limit for translation workers.
+    Every `window` completions the limit grows by one while latency, CPU and error rate
+    are healthy, and is cut multiplicatively when any of them degrades.
+    """
+
+    def __init__(self, initial=2, min_limit=1, max_limit=None, window=20, latency_tolerance=1.5,
+                 max_error_rate=0.1, cpu_saturation=0.9, decrease_factor=0.7):
+        self.min_limit = min_limit
+        self.max_limit = max_limit or max(initial, (os.cpu_count() or 2) * 2)
+        self.limit = float(min(max(initial, min_limit), self.max_limit))
+        self.initial = int(self.limit)
+        self.window = window
+        self.latency_tolerance = latency_tolerance
+        self.max_error_rate = max_error_rate
+        self.cpu_saturation = cpu_saturation
+        self.decrease_factor = decrease_factor
+
+        self._cond = threading.Condition()
+        self._in_use = 0
+        self._latencies = []
+        self._errors = 0
+        self._baseline_latency = None
+        self._cpu_mark = (time.monotonic(), time.process_time())
+        self.history = []
+
+    def acquire(self):
+        """Block until a concurrency slot is free under the current limit"""
+        with self._cond:
+            while self._in_use >= int(self.limit):
+                self._cond.wait()
+            self._in_use += 1
+
+    def try_acquire(self):
+        """Take a concurrency slot if one is free under the current limit, without waiting"""
+        with self._cond:
+            if self._in_use >= int(self.limit):
+                return False
+            self._in_use += 1
+            return True
+
+    def release(self, latency, ok=True):
+        """Return a slot and record the outcome of the work it ran (ok=None records nothing)"""
+        with self._cond:
+            self._in_use -= 1
+            if ok:
+                self._latencies.append(latency)
+            elif ok is False:
+                self._errors += 1
+            if len(self._latencies) + self._errors >= self.window:
+                self._adjust()
+            self._cond.notify_all()
+
+    def cpu_utilization(self):
+        """Busiest of this process's CPU share since the last call and the system load average"""
+        now, cpu = time.monotonic(), time.process_time()
+        last_now, last_cpu = self._cpu_mark
+        self._cpu_mark = (now, cpu)
+        cpus = os.cpu_count() or 1
+        utilization = (cpu - last_cpu) / max(now - last_now, 1e-6) / cpus
+        try:
+            utilization = max(utilization, os.getloadavg()[0] / cpus)
+        except (AttributeError, OSError):
+            # No load average on Windows
+            pass
+        return utilization
+
+    def _adjust(self):
+        total = len(self._latencies) + self._errors
+        error_rate = self._errors / total
+        latency = percentile(self._latencies, 50) if self._latencies else None
+        cpu = self.cpu_utilization()
+
+        if latency is not None:
+            # Baseline tracks the best latency seen, drifting up slowly so it can recover from a lucky window
+            if self._baseline_latency is None or latency < self._baseline_latency:
+                self._baseline_latency = latency
+            else:
+                self._baseline_latency = self._baseline_latency * 0.95 + latency * 0.05
+
+        if error_rate > self.max_error_rate:
+            reason = "errors"
+        elif cpu > self.cpu_saturation:
+            reason = "cpu"
+        elif latency is not None and latency > self._baseline_latency * self.latency_tolerance:
+            reason = "latency"
+        else:
+            reason = None
+
+        if reason:
+            self.limit = max(float(self.min_limit), self.limit * self.decrease_factor)
+        else:
+            self.limit = min(float(self.max_limit), self.limit + 1)
+
+        self.history.append({
+            "limit": int(self.limit),
+            "p50_latency": round(latency, 4) if latency is not None else None,
+            "error_rate": round(error_rate, 3),
+            "cpu": round(cpu, 3),
+            "decrease_reason": reason
+        })
+        self._latencies = []
+        self._errors = 0
+
+    def snapshot(self):
+        """Concurrency summary for job metadata"""
+        with self._cond:
+            limits = [entry["limit"] for entry in self.history] or [int(self.limit)]
+            return {
+                "mode": "adaptive",
+                "initial": self.initial,
+                "final": int(self.limit),
+                "min": min(limits),
+                "max": max(limits),
+                "bounds": [self.min_limit, self.max_limit],
+                "adjustments": len(self.history),
+                "history": self.history[-50:]
+            }
+
+
+class _DispatchItem:
+    """One unit of work and all attempts racing to complete it"""
+
+    __slots__ = ("payload", "future", "attempts", "started", "hedges_pending")
+
+    def __init__(self, payload):
+        self.payload = payload
+        self.future = Future()
+        self.attempts = []
+        self.started = None
+        # Hedges the monitor has chosen to start but not yet added to attempts
+        self.hedges_pending = 0
+
+
+class HedgedDispatcher:
+    """
+    Run work items on a thread pool with per-item deadlines.
+    An item still running after the observed latency percentile is re-dispatched
+    to a separate hedge pool (optionally with a different function, e.g. another
+    backend); whichever attempt finishes first wins. A finished result is never discarded.
+    """
+
+    def __init__(self, work_fn, max_workers=2, deadline_seconds=120, hedge_fn=None, hedge_percentile=95,
+                 min_samples=20, max_hedges=1, hedge_workers=None, tick_seconds=0.05, controller=None):
+        self.work_fn = work_fn
+        # With an adaptive controller, primaries wait in a queue until the controller admits them, so
+        # the pool only starts threads as the current limit needs them (never more than its ceiling)
+        self.controller = controller
+        if controller is not None:
+            max_workers = controller.max_limit
+        self.hedge_fn = hedge_fn or work_fn
+        self.deadline_seconds = deadline_seconds
+        self.hedge_percentile = hedge_percentile
+        self.min_samples = min_samples
+        self.max_hedges = max_hedges
+        self.tick_seconds = tick_seconds
+
+        self._primary = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="translate")
+        self._hedge = ThreadPoolExecutor(max_workers=hedge_workers or max(1, max_workers // 2),
+                                         thread_name_prefix="translate-hedge")
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._queued = deque()
+        self._latencies = deque(maxlen=500)
+        self._closed = threading.Event()
+        self.stats = {"items": 0, "hedges": 0, "hedge_wins": 0, "timeouts": 0, "errors": 0}
+
+        self._monitor = threading.Thread(target=self._monitor_loop, daemon=True)
+        self._monitor.start()
+
+    def submit(self, payload):
+        """Schedule a work item and return a Future that resolves with its first successful result"""
+        item = _DispatchItem(payload)
+        with self._lock:
+            self._pending.add(item)
+            self.stats["items"] += 1
+        if self.controller is None:
+            self._start_attempt(item, self._primary, self.work_fn, hedge=False)
+        else:
+            with self._lock:
+                self._queued.append(item)
+            self._start_admitted()
+        return item.future
+
+    def _start_admitted(self):
+        """Start queued primaries while the controller has free slots"""
+        while True:
+            with self._lock:
+                if not self._queued or not self.controller.try_acquire():
+                    return
+                item = self._queued.popleft()
+            self._start_attempt(item, self._primary, self.work_fn, hedge=False)
+
+    def hedge_threshold(self):
+        """Latency after which a running item is hedged, or None until enough samples exist"""
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return None
+            samples = list(self._latencies)
+        return percentile(samples, self.hedge_percentile)
+
+    def close(self):
+        """Stop the monitor and release the pools without waiting for abandoned stragglers"""
+        self._closed.set()
+        self._monitor.join()
+        with self._lock:
+            self._queued.clear()
+        self._primary.shutdown(wait=False, cancel_futures=True)
+        self._hedge.shutdown(wait=False, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _start_attempt(self, item, pool, fn, hedge):
+        attempt = pool.submit(self._run_attempt, item, fn, hedge)
+        with self._lock:
+            item.attempts.append(attempt)
+            if hedge:
+                item.hedges_pending -= 1
+        attempt.add_done_callback(lambda f: self._on_attempt_done(item, f, hedge))
+
+    def _run_attempt(self, item, fn, hedge):
+        # Gated primaries already hold the controller slot _start_admitted took for them
+        gated = self.controller is not None and not hedge
+        # Deadlines and hedging count from when work actually starts, not from queueing
+        started = time.monotonic()
+        outcome = None
+        try:
+            with self._lock:
+                if item.future.done():
+                    # A queued attempt whose item already won (or expired) has nothing to do
+                    return None, 0.0
+                if item.started is None:
+                    item.started = started
+            outcome = False
+            result = fn(item.payload)
+            outcome = True
+            return result, time.monotonic() - started
+        finally:
+            if gated:
+                self.controller.release(time.monotonic() - started, outcome)
+                self._start_admitted()
+
+    def _on_attempt_done(self, item, attempt, hedge):
+        if attempt.cancelled():
+            return
+        error = attempt.exception()
+        # Item futures are resolved under the lock so a late attempt and the deadline can't both settle one
+        with self._lock:
+            if item.future.done():
+                return
+            if error is None:
+                result, latency = attempt.result()
+                self._latencies.append(latency)
+                self._pending.discard(item)
+                if hedge:
+                    self.stats["hedge_wins"] += 1
+                item.future.set_result(result)
+            elif not item.hedges_pending and all(a.done() for a in item.attempts):
+                # Only fail once every racing attempt, including a hedge about to start, has failed
+                self._pending.discard(item)
+                self.stats["errors"] += 1
+                item.future.set_exception(error)
+
+    def _monitor_loop(self):
+        while not self._closed.wait(self.tick_seconds):
+            threshold = self.hedge_threshold()
+            now = time.monotonic()
+            expired = []
+            to_hedge = []
+            with self._lock:
+                for item in self._pending:
+                    if item.started is None:
+                        continue
+                    elapsed = now - item.started
+                    if elapsed > self.deadline_seconds:
+                        expired.append(item)
+                    elif (threshold is not None and elapsed > threshold
+                          and len(item.attempts) + item.hedges_pending <= self.max_hedges):
+                        to_hedge.append(item)
+                        # Counted now, so a primary failing before the hedge starts doesn't fail the item
+                        item.hedges_pending += 1
+                for item in expired:
+                    self._pending.discard(item)
+                    self.stats["timeouts"] += 1
+                    item.future.set_exception(FutureTimeoutError(f"no result within {self.deadline_seconds}s"))
+                self.stats["hedges"] += len(to_hedge)
+
+            for item in to_hedge:
+                logger.info(f"Hedging straggler after {now - item.started:.2f}s (threshold {threshold:.2f}s)")
+                self._start_attempt(item, self._hedge, self.hedge_fn, hedge=True)
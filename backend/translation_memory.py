@@ -0,0 +1,316 @@
+import os
+import re
+import sqlite3
+import logging
+import threading
+import difflib
+from datetime import datetime
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Numbers (with thousands separators, decimals, dates, times, percentages) are masked before matching
+MASK_RE = re.compile(r'\d+(?:[.,:/\-]\d+)*%?')
+MASK_TOKEN = "<#>"
+ARABIC_INDIC_DIGITS = str.maketrans("0123456789", "٠١٢٣٤٥٦٧٨٩")
+
+# Keeps IN (...) lookups under SQLite's bound-parameter limit on older builds
+SQL_CHUNK = 500
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 3
+_rng = np.random.RandomState(1)
+# Multiply-shift hash family: (a * h + b) mod 2^64, keeping the high 32 bits; a must be odd
+PERM_A = _rng.randint(0, np.iinfo(np.int64).max, size=(NUM_PERM, 1), dtype=np.int64).astype(np.uint64) | np.uint64(1)
+PERM_B = _rng.randint(0, np.iinfo(np.int64).max, size=(NUM_PERM, 1), dtype=np.int64).astype(np.uint64)
+SIGNATURE_CHUNK = 256
+SHINGLE_MIX = np.uint64(0x9E3779B97F4A7C15)
+BAND_MIX = _rng.randint(1, 1 << 62, size=ROWS, dtype=np.uint64) | np.uint64(1)
+
+
+def normalize_source(text):
+    """Whitespace-normalized source text used as the memory key"""
+    return " ".join(text.split())
+
+
+def mask_numbers(text):
+    """Replace every number with a placeholder so revisions that only change figures share a key"""
+    return MASK_RE.sub(MASK_TOKEN, normalize_source(text))
+
+
+def _shingles(masked):
+    text = masked.lower()
+    if len(text) <= SHINGLE_SIZE:
+        return {text}
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def minhash_signatures(masked_texts):
+    """MinHash signatures of each masked text's character shingles, one row per text"""
+    signatures = np.empty((len(masked_texts), NUM_PERM), dtype=np.uint64)
+    for start in range(0, len(masked_texts), SIGNATURE_CHUNK):
+        texts = [text.lower().ljust(SHINGLE_SIZE, "\0") for text in masked_texts[start:start + SIGNATURE_CHUNK]]
+        # The whole chunk is hashed as one code point array; windows spanning two texts are skipped below
+        codes = np.frombuffer("".join(texts).encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+        windows = len(codes) - SHINGLE_SIZE + 1
+        # Code points fit in 21 bits, so a shingle packs losslessly into 63 bits
+        packed = np.zeros(windows, dtype=np.uint64)
+        for offset in range(SHINGLE_SIZE):
+            packed = (packed << np.uint64(21)) | codes[offset:offset + windows]
+        hashes = packed * SHINGLE_MIX
+
+        lengths = np.fromiter(map(len, texts), dtype=np.int64, count=len(texts))
+        counts = lengths - SHINGLE_SIZE + 1
+        first_shingle = np.cumsum(counts) - counts
+        text_offsets = np.cumsum(lengths) - lengths
+        positions = np.repeat(text_offsets - first_shingle, counts) + np.arange(counts.sum())
+
+        # All permutations at once, one row each; uint64 arithmetic wraps, which is the mod 2^64
+        permuted = (PERM_A * hashes[positions] + PERM_B) >> np.uint64(32)
+        signatures[start:start + len(texts)] = np.minimum.reduceat(permuted, first_shingle, axis=1).T
+    return signatures
+
+
+def minhash_signature(masked):
+    """MinHash signature of one masked text"""
+    return minhash_signatures([masked])[0]
+
+
+def lsh_keys(signatures):
+    """One bucket key per LSH band for each signature row, as signed 64-bit ints for SQLite"""
+    return (signatures.reshape(-1, BANDS, ROWS) * BAND_MIX).sum(axis=2).view(np.int64)
+
+
+def jaccard(a, b):
+    sa, sb = _shingles(a), _shingles(b)
+    return len(sa & sb) / len(sa | sb) if sa | sb else 1.0
+
+
+def _replace_tokens(target, replacements):
+    """Swap old tokens for new ones in the stored translation; None if any old token can't be located"""
+    spans = []
+    for old, new in replacements:
+        for old_form, new_form in ((old, new), (old.translate(ARABIC_INDIC_DIGITS), new.translate(ARABIC_INDIC_DIGITS))):
+            pattern = re.compile(rf'(?<![\w٠-٩]){re.escape(old_form)}(?![\w٠-٩])')
+            taken = [m for m in pattern.finditer(target) if not any(s < m.end() and m.start() < e for s, e, _ in spans)]
+            if taken:
+                spans.append((taken[0].start(), taken[0].end(), new_form))
+                break
+        else:
+            return None
+
+    for start, end, new in sorted(spans, reverse=True):
+        target = target[:start] + new + target[end:]
+    return target
+
+
+class TranslationMemory:
+    """
+    Persistent translation memory with exact, masked and near-duplicate (MinHash/LSH) lookup.
+    A stored translation is reused only when the new source differs from the stored one
+    in masked tokens (numbers) or in tokens the stored translation copies verbatim.
+    """
+
+    def __init__(self, db_path, similarity_threshold=0.75):
+        self.db_path = db_path
+        self.similarity_threshold = similarity_threshold
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        # LSH keys are random, so inserts touch pages all over the index; keep more of it in memory
+        self._conn.execute("PRAGMA cache_size=-131072")
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(lsh)")]
+        unscoped = columns and "source_lang" not in columns
+        if unscoped:
+            self._conn.execute("ALTER TABLE lsh RENAME TO lsh_unscoped")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS segments (
+                id INTEGER PRIMARY KEY,
+                source_lang TEXT NOT NULL,
+                target_lang TEXT NOT NULL,
+                source TEXT NOT NULL,
+                masked TEXT NOT NULL,
+                target TEXT NOT NULL,
+                created TEXT NOT NULL,
+                UNIQUE (source_lang, target_lang, source)
+            );
+            CREATE INDEX IF NOT EXISTS idx_segments_masked ON segments (source_lang, target_lang, masked);
+            CREATE TABLE IF NOT EXISTS lsh (
+                source_lang TEXT NOT NULL,
+                target_lang TEXT NOT NULL,
+                band INTEGER NOT NULL,
+                bucket INTEGER NOT NULL,
+                segment_id INTEGER NOT NULL,
+                PRIMARY KEY (source_lang, target_lang, band, bucket, segment_id)
+            ) WITHOUT ROWID;
+        """)
+        if unscoped:
+            # Buckets used to be shared by every language pair; scope the old entries by their segment's pair
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO lsh SELECT s.source_lang, s.target_lang, l.band, l.bucket, l.segment_id "
+                    "FROM lsh_unscoped l JOIN segments s ON s.id = l.segment_id")
+                self._conn.execute("DROP TABLE lsh_unscoped")
+        self.stats = {"exact": 0, "masked": 0, "fuzzy": 0, "misses": 0}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def count(self, source_lang=None, target_lang=None):
+        """Number of stored segments, optionally for one language pair"""
+        query, params = "SELECT COUNT(*) FROM segments", ()
+        if source_lang and target_lang:
+            query, params = query + " WHERE source_lang = ? AND target_lang = ?", (source_lang, target_lang)
+        with self._lock:
+            return self._conn.execute(query, params).fetchone()[0]
+
+    def add(self, source, target, source_lang="en", target_lang="ar"):
+        """Store one translated segment"""
+        self.add_many([(source, target)], source_lang, target_lang)
+
+    def add_many(self, pairs, source_lang="en", target_lang="ar"):
+        """Store (source, target) pairs in a single transaction"""
+        latest = {}
+        for source, target in pairs:
+            source = normalize_source(source)
+            if source and target:
+                latest[source] = target
+        if not latest:
+            return 0
+        sources = list(latest)
+        masked = [mask_numbers(source) for source in sources]
+        keys = lsh_keys(minhash_signatures(masked))
+
+        created = datetime.now().isoformat()
+        with self._lock, self._conn:
+            # Take the write lock up front so ids assigned below can't collide with another process
+            self._conn.execute("BEGIN IMMEDIATE")
+            existing = {}
+            for start in range(0, len(sources), SQL_CHUNK):
+                chunk = sources[start:start + SQL_CHUNK]
+                existing.update(self._conn.execute(
+                    f"SELECT source, id FROM segments WHERE source_lang = ? AND target_lang = ? "
+                    f"AND source IN ({','.join('?' * len(chunk))})",
+                    (source_lang, target_lang, *chunk)
+                ).fetchall())
+            self._conn.executemany("UPDATE segments SET target = ?, created = ? WHERE id = ?",
+                                   [(latest[source], created, existing[source]) for source in existing])
+
+            new = [i for i, source in enumerate(sources) if source not in existing]
+            if new:
+                next_id = self._conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM segments").fetchone()[0]
+                ids = np.arange(next_id, next_id + len(new), dtype=np.int64)
+                self._conn.executemany(
+                    "INSERT INTO segments (id, source_lang, target_lang, source, masked, target, created) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(segment_id, source_lang, target_lang, sources[i], masked[i], latest[sources[i]], created)
+                     for segment_id, i in zip(ids.tolist(), new)]
+                )
+                lsh_rows = np.column_stack((np.tile(np.arange(BANDS), len(new)), keys[new].ravel(),
+                                            np.repeat(ids, BANDS)))
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO lsh (source_lang, target_lang, band, bucket, segment_id) "
+                    "VALUES (?, ?, ?, ?, ?)", [(source_lang, target_lang, *row) for row in lsh_rows.tolist()])
+        return len(sources)
+
+    def iter_segments(self, source_lang="en", target_lang="ar", batch_size=5000):
+        """Yield stored (source, target) pairs for a language pair without loading them all at once"""
+        last_id = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT id, source, target FROM segments WHERE source_lang = ? AND target_lang = ? AND id > ? "
+                    "ORDER BY id LIMIT ?", (source_lang, target_lang, last_id, batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            last_id = rows[-1][0]
+            for _, source, target in rows:
+                yield source, target
+
+    def lookup(self, source, source_lang="en", target_lang="ar"):
+        """Return (translation, match_type) for a reusable stored segment, or (None, None)"""
+        source = normalize_source(source)
+        masked = mask_numbers(source)
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT target FROM segments WHERE source_lang = ? AND target_lang = ? AND source = ?",
+                (source_lang, target_lang, source)
+            ).fetchone()
+            if row:
+                self.stats["exact"] += 1
+                return row[0], "exact"
+
+            # Same text apart from numbers: substitute the new figures into the stored translation
+            for stored_source, stored_target in self._conn.execute(
+                    "SELECT source, target FROM segments WHERE source_lang = ? AND target_lang = ? AND masked = ? "
+                    "LIMIT 5", (source_lang, target_lang, masked)):
+                translated = self._substitute(stored_source, stored_target, source)
+                if translated is not None:
+                    self.stats["masked"] += 1
+                    return translated, "masked"
+
+            candidates = self._lsh_candidates(masked, source_lang, target_lang)
+
+        for score, stored_source, stored_target in candidates:
+            translated = self._substitute(stored_source, stored_target, source)
+            if translated is not None:
+                with self._lock:
+                    self.stats["fuzzy"] += 1
+                return translated, f"fuzzy:{score:.2f}"
+
+        with self._lock:
+            self.stats["misses"] += 1
+        return None, None
+
+    def _lsh_candidates(self, masked, source_lang, target_lang, limit=5):
+        """Near-duplicate stored segments of the language pair sharing an LSH band, best Jaccard similarity first"""
+        buckets = list(enumerate(lsh_keys(minhash_signatures([masked]))[0].tolist()))
+        # Candidates are capped per language pair, so other pairs' copies of a source never crowd them out
+        clause = " OR ".join(["(source_lang = ? AND target_lang = ? AND band = ? AND bucket = ?)"] * len(buckets))
+        params = [value for band, bucket in buckets for value in (source_lang, target_lang, band, bucket)]
+        rows = self._conn.execute(
+            f"SELECT s.source, s.masked, s.target FROM segments s JOIN "
+            f"(SELECT DISTINCT segment_id FROM lsh WHERE {clause} LIMIT 50) c ON c.segment_id = s.id",
+            params
+        ).fetchall()
+        scored = [(jaccard(masked, stored_masked), source, target) for source, stored_masked, target in rows]
+        scored = [item for item in scored if item[0] >= self.similarity_threshold]
+        return sorted(scored, reverse=True)[:limit]
+
+    def _substitute(self, stored_source, stored_target, source):
+        """Adapt a stored translation to `source` when every differing token can be swapped verbatim"""
+        old_tokens = stored_source.split()
+        new_tokens = source.split()
+        replacements = []
+        for op, i1, i2, j1, j2 in difflib.SequenceMatcher(a=old_tokens, b=new_tokens, autojunk=False).get_opcodes():
+            if op == "equal":
+                continue
+            if op != "replace" or i2 - i1 != j2 - j1:
+                return None
+            replacements.extend(zip(old_tokens[i1:i2], new_tokens[j1:j2]))
+
+        # Only numbers or tokens the translation copied untranslated (codes, names, URLs) can be swapped
+        for old, new in replacements:
+            if not (MASK_RE.fullmatch(old.strip(".,;:()")) or old in stored_target):
+                return None
+        return _replace_tokens(stored_target, [(o.strip(".,;:()"), n.strip(".,;:()")) for o, n in replacements])
+
+
+_memories = {}
+_memories_lock = threading.Lock()
+
+
+def get_translation_memory(db_path):
+    """Shared TranslationMemory per database file"""
+    db_path = os.path.abspath(db_path)
+    with _memories_lock:
+        if db_path not in _memories:
+            _memories[db_path] = TranslationMemory(db_path)
+        return _memories[db_path]